@@ -4,7 +4,7 @@ from .models import Club
 
 @admin.register(Club)
 class ClubAdmin(admin.ModelAdmin):
-    list_display = ('name', 'city', 'founded_year')
+    list_display = ('name', 'city', 'founded_year', 'is_loan_pool')
     search_fields = ('name', 'city')
-    list_filter = ('city',)
+    list_filter = ('city', 'is_loan_pool')
     ordering = ('name',)
@@ -4,25 +4,30 @@ from django.shortcuts import get_object_or_404
 from django.db.models import Case, When
 from players.models import Player
 from players.serializers import PlayerSerializer
-from .models import Club
+from players.views import apply_player_fieldset, cache_player_detail, cache_player_response
+from core.fieldsets import SparseFieldsetViewMixin
 
 
 from rest_framework.permissions import AllowAny
 
-class ClubPlayersViewSet(viewsets.ReadOnlyModelViewSet):
+class ClubPlayersViewSet(SparseFieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for listing players belonging to a specific club.
     """
     serializer_class = PlayerSerializer
     permission_classes = [AllowAny]
 
+    @cache_player_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_player_detail
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def get_queryset(self):
         club_id = self.kwargs.get('club_pk')
-        # Check if the club is "Loan" - if so, return empty queryset
-        club = Club.objects.filter(id=club_id).first()
-        if club and club.name == 'Loan':
-            return Player.objects.none()
-            
+        # Zawodnicy klubu "Loan" mają is_public=False, więc lista jest wtedy pusta
         # Order by position in the sequence: GK, DF, MF, FW, and then by name
         position_order = Case(
             When(position='GK', then=1),
@@ -31,4 +36,7 @@ class ClubPlayersViewSet(viewsets.ReadOnlyModelViewSet):
             When(position='FW', then=4),
             default=5
         )
-        return Player.objects.filter(club_id=club_id).order_by(position_order, 'name')
+        queryset = apply_player_fieldset(
+            Player.objects.filter(club_id=club_id, is_public=True), self.get_response_field_names()
+        )
+        return queryset.order_by(position_order, 'name')
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+def mark_loan_pool(apps, schema_editor):
+    Club = apps.get_model("clubs", "Club")
+    Club.objects.filter(name="Loan").update(is_loan_pool=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("clubs", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="club",
+            name="is_loan_pool",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_loan_pool, migrations.RunPython.noop),
+    ]
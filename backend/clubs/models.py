@@ -1,21 +1,51 @@
 from django.db import models
-from django.db.models.signals import pre_delete
+from django.db.models.signals import post_save, pre_delete
 from django.dispatch import receiver
 
 # Create your models here.
 
+# Klub-worek na zawodników wypożyczonych: istnieją w bazie, ale nie są publiczni.
+LOAN_POOL_CLUB_NAME = "Loan"
+
+
 class Club(models.Model):
     name = models.CharField(max_length=100)
     city = models.CharField(max_length=100)
     founded_year = models.IntegerField(null=True, blank=True)
     logo = models.ImageField(upload_to='clubs/logos/', null=True, blank=True)
-    
+    is_loan_pool = models.BooleanField(default=False)
+
+    def save(self, *args, **kwargs):
+        if self.name == LOAN_POOL_CLUB_NAME:
+            self.is_loan_pool = True
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
     
     class Meta:
         ordering = ['name']
 
+@receiver(post_save, sender=Club)
+def sync_player_visibility(sender, instance, created, raw=False, **kwargs):
+    """
+    Przepisuje Player.is_public zawodnikom klubu, gdy klub został (lub
+    przestał być) workiem na wypożyczonych.
+    """
+    if created or raw:
+        return
+    from core.response_cache import PLAYER, PLAYERS, bump_versions, entity_keys
+    from players.leaderboard import update_leaderboard
+    from players.models import Player
+
+    players = Player.objects.filter(club=instance).exclude(is_public=not instance.is_loan_pool)
+    player_ids = list(players.values_list('id', flat=True))
+    if player_ids:
+        Player.objects.filter(id__in=player_ids).update(is_public=not instance.is_loan_pool)
+        update_leaderboard(player_ids)
+        bump_versions(PLAYERS, *entity_keys(PLAYER, player_ids))
+
+
 @receiver(pre_delete, sender=Club)
 def delete_club_logo(sender, instance, **kwargs):
     # Delete the file from S3 if it exists
@@ -1,8 +1,11 @@
 
 from django.shortcuts import render
+from django.utils.decorators import method_decorator
 from rest_framework import viewsets
 from rest_framework.permissions import AllowAny
 
+from core.response_cache import CLUB, CLUBS, PLAYERS, cache_response
+
 from .models import Club
 from .serializers import ClubSerializer, ClubDetailSerializer
 
@@ -10,10 +13,18 @@ from .serializers import ClubSerializer, ClubDetailSerializer
 
 
 class ClubViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Club.objects.exclude(name='Loan')
+    queryset = Club.objects.filter(is_loan_pool=False)
     permission_classes = [AllowAny]
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return ClubDetailSerializer
         return ClubSerializer
+
+    @method_decorator(cache_response(CLUBS, PLAYERS))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @method_decorator(cache_response(entity=(CLUB, "pk")))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Comment
+from .models import AIReplyJob, Comment
 
 # Register Comment model in the admin panel
 @admin.register(Comment)
@@ -9,3 +9,11 @@ class CommentAdmin(admin.ModelAdmin):
     search_fields = ('content', 'player__name', 'user__username')
     readonly_fields = ('created_at', 'updated_at')
     raw_id_fields = ('player', 'user')
+
+
+@admin.register(AIReplyJob)
+class AIReplyJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'comment', 'status', 'attempts', 'available_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'last_error')
+    raw_id_fields = ('comment',)
@@ -0,0 +1,150 @@
+"""
+Asynchronous AI replies to comments.
+
+Posting a comment only enqueues an AIReplyJob next to it; the reply is
+written to Comment.ai_response later by the process_ai_replies worker, so a
+slow or failing LLM never holds a web worker. The worker claims due jobs with
+SELECT ... FOR UPDATE SKIP LOCKED (several workers can share the queue) and
+packs up to AI_REPLY_BATCH_SIZE comments into one LLM call, with at most
+AI_REPLY_CONCURRENCY calls running at a time. A failed attempt is
+retried with exponential backoff until AI_REPLY_MAX_ATTEMPTS; a job left
+running by a crashed worker is claimed again after
+AI_REPLY_JOB_TIMEOUT_SECONDS.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.ai import ReplyRequest, generate_comment_responses
+from core.response_cache import COMMENTS, PLAYER, bump_versions, entity_keys
+
+from .models import AIReplyJob, Comment
+
+# Tyle wcześniejszych komentarzy o piłkarzu trafia do promptu jako tło dyskusji.
+AI_REPLY_CONTEXT_COMMENTS = 3
+
+
+def enqueue_ai_reply(comment):
+    return AIReplyJob.objects.create(comment=comment)
+
+
+def claim_ai_reply_jobs(limit):
+    """Marks up to ``limit`` due jobs as running for this worker and returns them."""
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.AI_REPLY_JOB_TIMEOUT_SECONDS)
+    with transaction.atomic():
+        job_ids = list(
+            AIReplyJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=AIReplyJob.STATUS_PENDING, available_at__lte=now)
+                | Q(status=AIReplyJob.STATUS_RUNNING, started_at__lt=stale)
+            )
+            .order_by('available_at', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        AIReplyJob.objects.filter(pk__in=job_ids).update(
+            status=AIReplyJob.STATUS_RUNNING, started_at=now, attempts=F('attempts') + 1
+        )
+    return list(AIReplyJob.objects.filter(pk__in=job_ids).select_related('comment__player', 'comment__user'))
+
+
+def recent_comments_for(comment):
+    """The discussion the comment was posted into: the player's comments just before it."""
+    return list(
+        Comment.objects.filter(player_id=comment.player_id, id__lt=comment.id)
+        .order_by('-created_at', '-id')
+        .values_list('content', flat=True)[:AI_REPLY_CONTEXT_COMMENTS]
+    )
+
+
+def complete_ai_reply_job(job, text):
+    with transaction.atomic():
+        # update(), bo komentarz mógł zostać w międzyczasie usunięty
+        player_id = Comment.objects.filter(pk=job.comment_id).values_list('player_id', flat=True).first()
+        Comment.objects.filter(pk=job.comment_id).update(ai_response=text)
+        job.status = AIReplyJob.STATUS_COMPLETED
+        job.last_error = ''
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'last_error', 'finished_at'])
+        bump_versions(COMMENTS, *entity_keys(PLAYER, [player_id]))
+
+
+def fail_ai_reply_job(job, error):
+    """Schedules the next attempt with exponential backoff, or gives up after the last one."""
+    now = timezone.now()
+    job.last_error = str(error)
+    if job.attempts >= settings.AI_REPLY_MAX_ATTEMPTS:
+        job.status = AIReplyJob.STATUS_FAILED
+        job.finished_at = now
+    else:
+        job.status = AIReplyJob.STATUS_PENDING
+        delay = settings.AI_REPLY_RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+        job.available_at = now + timedelta(seconds=delay)
+    job.save(update_fields=['status', 'last_error', 'finished_at', 'available_at'])
+
+
+def run_ai_reply_jobs(jobs):
+    """
+    Generates replies for ``jobs`` with one backend call (a batch prompt when
+    there are several); returns how many replies were stored.
+    """
+    requests = [
+        ReplyRequest(
+            user_comment=job.comment.content,
+            player_name=job.comment.player.name,
+            user_name=job.comment.user.username,
+            recent_comments=tuple(recent_comments_for(job.comment)),
+            player_id=job.comment.player_id,
+        )
+        for job in jobs
+    ]
+    try:
+        results = generate_comment_responses(requests, batch_size=len(requests))
+    except Exception as exc:
+        results = [exc] * len(jobs)
+    completed = 0
+    for job, result in zip(jobs, results):
+        if isinstance(result, Exception):
+            fail_ai_reply_job(job, result)
+        else:
+            complete_ai_reply_job(job, result)
+            completed += 1
+    return completed
+
+
+def _run_in_worker_thread(jobs):
+    try:
+        return run_ai_reply_jobs(jobs)
+    finally:
+        # Każdy wątek puli ma własne połączenie z bazą.
+        connection.close()
+
+
+def process_ai_reply_jobs(limit=10, concurrency=None, batch_size=None):
+    """
+    Claims up to ``limit`` due jobs, packs them ``batch_size`` (default
+    settings.AI_REPLY_BATCH_SIZE) per LLM call and runs the calls on at most
+    ``concurrency`` threads (default settings.AI_REPLY_CONCURRENCY).
+    Returns (completed, failed).
+    """
+    if concurrency is None:
+        concurrency = settings.AI_REPLY_CONCURRENCY
+    if batch_size is None:
+        batch_size = settings.AI_REPLY_BATCH_SIZE
+    jobs = claim_ai_reply_jobs(limit)
+    if not jobs:
+        return 0, 0
+    batch_size = max(batch_size, 1)
+    batches = [jobs[start:start + batch_size] for start in range(0, len(jobs), batch_size)]
+    if concurrency <= 1:
+        results = [run_ai_reply_jobs(batch) for batch in batches]
+    else:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(batches)), thread_name_prefix='ai-reply') as pool:
+            results = list(pool.map(_run_in_worker_thread, batches))
+    completed = sum(results)
+    return completed, len(jobs) - completed
@@ -0,0 +1,70 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from comments.ai_replies import process_ai_reply_jobs
+
+
+class Command(BaseCommand):
+    help = "Worker: generuje odpowiedzi AI do komentarzy z kolejki (comments.AIReplyJob)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=None,
+            help="Maksymalna liczba równoległych wywołań LLM (domyślnie AI_REPLY_CONCURRENCY).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10,
+            help="Maksymalna liczba zadań pobieranych w jednym przebiegu.",
+        )
+        parser.add_argument(
+            "--prompt-batch-size",
+            type=int,
+            default=None,
+            help="Ile komentarzy trafia do jednego wywołania LLM (domyślnie AI_REPLY_BATCH_SIZE).",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Przerwa w sekundach, gdy kolejka jest pusta.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Wykonaj jeden przebieg i zakończ (np. z crona).",
+        )
+
+    def handle(self, *args, **options):
+        concurrency = options["concurrency"] or settings.AI_REPLY_CONCURRENCY
+        batch_size = options["batch_size"]
+        prompt_batch_size = options["prompt_batch_size"] or settings.AI_REPLY_BATCH_SIZE
+
+        if options["once"]:
+            completed, failed = process_ai_reply_jobs(
+                limit=batch_size, concurrency=concurrency, batch_size=prompt_batch_size
+            )
+            self.stdout.write(f"[process_ai_replies] completed: {completed}, failed: {failed}")
+            return
+
+        self.stdout.write(
+            f"[process_ai_replies] started, concurrency={concurrency}, prompt batch={prompt_batch_size}"
+        )
+        try:
+            while True:
+                close_old_connections()
+                completed, failed = process_ai_reply_jobs(
+                    limit=batch_size, concurrency=concurrency, batch_size=prompt_batch_size
+                )
+                if completed or failed:
+                    self.stdout.write(f"[process_ai_replies] completed: {completed}, failed: {failed}")
+                else:
+                    time.sleep(options["poll_interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("[process_ai_replies] stopped")
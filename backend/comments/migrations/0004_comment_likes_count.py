@@ -0,0 +1,38 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_likes_count(apps, schema_editor):
+    Comment = apps.get_model("comments", "Comment")
+    counts = (
+        Comment.likes.through.objects.filter(comment_id=OuterRef("pk"))
+        .order_by()
+        .values("comment_id")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    Comment.objects.update(likes_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("comments", "0003_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="likes_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_likes_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["player", "-likes_count", "-created_at", "-id"],
+                name="comment_player_likes_idx",
+            ),
+        ),
+    ]
@@ -2,6 +2,11 @@ from django.db import models
 from django.contrib.auth.models import User
 from players.models import Player
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
 
 class Comment(models.Model):
     player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='comments')
@@ -9,15 +14,88 @@ class Comment(models.Model):
     content = models.TextField()
     ai_response = models.TextField(blank=True, null=True, help_text="Humorous AI response to the comment")
     likes = models.ManyToManyField(User, related_name='liked_comments', blank=True)
+    # Licznik polubień utrzymywany przy zapisie (CommentViewSet.like, sync_likes_count).
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Kolejność kursora paginacji (CommentCursorPagination), globalnie i per piłkarz
+            models.Index(fields=['-created_at', '-id'], name='comment_created_id_idx'),
+            models.Index(fields=['player', '-created_at', '-id'], name='comment_player_created_id_idx'),
+            # Najczęściej lubiane komentarze piłkarza
+            models.Index(fields=['player', '-likes_count', '-created_at', '-id'], name='comment_player_likes_idx'),
+        ]
     
     def __str__(self):
         return f"Comment by {self.user.username} on {self.player.name}"
-    
-    @property
-    def likes_count(self):
-        return self.likes.count()
+
+
+class AIReplyJob(models.Model):
+    """
+    Odpowiedź AI do komentarza czekająca na wygenerowanie (worker: manage.py process_ai_replies).
+    """
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    comment = models.OneToOneField(Comment, on_delete=models.CASCADE, related_name='ai_reply_job')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)  # Najwcześniejsza kolejna próba
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['available_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='ai_reply_job_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"AI reply for comment #{self.comment_id} ({self.status})"
+
+
+def recount_likes(comment_ids):
+    """Przelicza likes_count podanych komentarzy z tabeli polubień."""
+    counts = (
+        Comment.likes.through.objects.filter(comment_id=OuterRef('pk'))
+        .order_by()
+        .values('comment_id')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    Comment.objects.filter(pk__in=comment_ids).update(likes_count=Coalesce(Subquery(counts), 0))
+
+
+@receiver(m2m_changed, sender=Comment.likes.through)
+def sync_likes_count(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Polubienia dodane przez comment.likes / user.liked_comments (admin, skrypty)
+    przeliczają licznik; CommentViewSet.like zmienia go sam, przez F().
+    """
+    if action == 'pre_clear' and reverse:
+        instance._cleared_comment_ids = list(instance.liked_comments.values_list('id', flat=True))
+    if action not in {'post_add', 'post_remove', 'post_clear'}:
+        return
+    if not reverse:
+        comment_ids = [instance.pk]
+    elif action == 'post_clear':
+        comment_ids = getattr(instance, '_cleared_comment_ids', [])
+    else:
+        comment_ids = pk_set or []
+    if comment_ids:
+        recount_likes(comment_ids)
@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from .models import Comment
+
+from core.loaders import BatchLoadingListSerializer, BatchLoadingSerializerMixin
+from .models import AIReplyJob, Comment
 from django.contrib.auth.models import User
 from players.models import Player
 
@@ -21,26 +23,51 @@ class PlayerSerializer(serializers.ModelSerializer):
         return bool(getattr(obj, "card_image", None))
 
 
-class CommentSerializer(serializers.ModelSerializer):
+def load_liked_comment_ids(comment_ids, context):
+    request = context.get('request')
+    if not request or not request.user.is_authenticated:
+        return {}
+    liked = Comment.likes.through.objects.filter(
+        user_id=request.user.id,
+        comment_id__in=comment_ids,
+    ).values_list('comment_id', flat=True)
+    return {comment_id: True for comment_id in liked}
+
+
+def load_ai_reply_statuses(comment_ids, context):
+    return dict(
+        AIReplyJob.objects.filter(comment_id__in=comment_ids).values_list('comment_id', 'status')
+    )
+
+
+class CommentSerializer(BatchLoadingSerializerMixin, serializers.ModelSerializer):
+    batch_loaders = {
+        'comment_liked': (lambda comment: comment.pk, load_liked_comment_ids),
+        'comment_ai_reply_status': (lambda comment: comment.pk, load_ai_reply_statuses),
+    }
+
     user = UserSerializer(read_only=True)
     likes_count = serializers.IntegerField(read_only=True)
     is_liked_by_user = serializers.SerializerMethodField()
+    # Stan odpowiedzi AI z kolejki (pending/running/completed/failed); None dla starszych komentarzy.
+    ai_response_status = serializers.SerializerMethodField()
     player = PlayerSerializer(read_only=True)
     player_id = serializers.PrimaryKeyRelatedField(
-        queryset=Player.objects.exclude(club__name="Loan"), source='player', write_only=True
+        queryset=Player.objects.filter(is_public=True), source='player', write_only=True
     )
 
     class Meta:
         model = Comment
         fields = ['id', 'player', 'player_id', 'user', 'content', 'likes_count',
-                  'is_liked_by_user', 'ai_response', 'created_at', 'updated_at']
+                  'is_liked_by_user', 'ai_response', 'ai_response_status', 'created_at', 'updated_at']
         read_only_fields = ['user', 'player', 'ai_response']
+        list_serializer_class = BatchLoadingListSerializer
 
     def get_is_liked_by_user(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.likes.filter(id=request.user.id).exists()
-        return False
+        return self.load('comment_liked', obj, default=False)
+
+    def get_ai_response_status(self, obj):
+        return self.load('comment_ai_reply_status', obj)
 
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
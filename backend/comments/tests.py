@@ -1,11 +1,17 @@
 
-from django.test import TestCase
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 from django.urls import reverse
 from django.contrib.auth.models import User
 from players.models import Player
 from clubs.models import Club
-from .models import Comment
+from core.ai import get_reply_cache
+from .ai_replies import enqueue_ai_reply, process_ai_reply_jobs
+from .models import AIReplyJob, Comment
 
 
 class CommentApiAddTest(APITestCase):
@@ -92,3 +98,156 @@ class CommentApiPermissionTest(APITestCase):
         response = self.client.delete(reverse('comment-detail', args=[comment.id]))
 
         self.assertEqual(response.status_code, 204)
+
+
+class CommentListQueryCountTest(APITestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name="Test Club", city="Test City")
+        self.player = Player.objects.create(name="Test Player", position="FW", club=self.club, nationality="PL")
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.client.force_authenticate(user=self.user)
+
+    def add_comments(self, count):
+        for index in range(count):
+            comment = Comment.objects.create(player=self.player, user=self.user, content=f"Komentarz {index}")
+            if index % 2:
+                comment.likes.add(self.user)
+
+    def test_list_query_count_does_not_grow_with_page_size(self):
+        self.add_comments(2)
+        with CaptureQueriesContext(connection) as small_page:
+            self.client.get(reverse('comment-list'))
+
+        self.add_comments(6)
+        with CaptureQueriesContext(connection) as large_page:
+            response = self.client.get(reverse('comment-list'))
+
+        self.assertEqual(len(response.data['results']), 8)
+        self.assertEqual(len(small_page), len(large_page))
+        liked = [item['is_liked_by_user'] for item in response.data['results']]
+        self.assertEqual(liked.count(True), 4)
+        self.assertEqual(sum(item['likes_count'] for item in response.data['results']), 4)
+
+    def test_cursor_pagination_walks_all_comments_once(self):
+        self.add_comments(7)
+        Comment.objects.update(created_at=Comment.objects.first().created_at)
+        seen = []
+        url = reverse('comment-list') + '?pagination=cursor&page_size=3'
+        while url:
+            response = self.client.get(url)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, sorted(Comment.objects.values_list('id', flat=True), reverse=True))
+
+    def test_page_size_is_capped_per_endpoint(self):
+        Comment.objects.bulk_create(
+            Comment(player=self.player, user=self.user, content=f"Komentarz {index}") for index in range(105)
+        )
+
+        default_page = self.client.get(reverse('comment-list'))
+        capped_page = self.client.get(reverse('comment-list'), {'page_size': 1000})
+
+        self.assertEqual(len(default_page.data['results']), 20)
+        self.assertEqual(capped_page.data['count'], 105)
+        self.assertEqual(len(capped_page.data['results']), 100)
+
+
+class CommentLikeCounterTest(APITestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name="Test Club", city="Test City")
+        self.player = Player.objects.create(name="Test Player", position="FW", club=self.club, nationality="PL")
+        self.users = [User.objects.create_user(username=f"fan{index}", password="testpass") for index in range(3)]
+        self.comment = Comment.objects.create(player=self.player, user=self.users[0], content="Pierwszy")
+        self.other = Comment.objects.create(player=self.player, user=self.users[0], content="Drugi")
+
+    def test_like_toggle_updates_counter(self):
+        url = reverse('comment-like', args=[self.comment.id])
+        for user in self.users:
+            self.client.force_authenticate(user=user)
+            response = self.client.post(url)
+        self.assertEqual(response.data['likes_count'], 3)
+
+        response = self.client.post(url)
+        self.assertEqual(response.data, {'status': 'Comment unliked', 'likes_count': 2})
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.likes_count, 2)
+        self.assertEqual(self.comment.likes.count(), 2)
+
+    def test_m2m_changes_recount_and_sort_player_comments(self):
+        self.other.likes.add(*self.users)
+        self.users[1].liked_comments.add(self.comment)
+        self.users[2].liked_comments.clear()
+
+        self.assertEqual(Comment.objects.get(pk=self.other.pk).likes_count, 2)
+        self.assertEqual(Comment.objects.get(pk=self.comment.pk).likes_count, 1)
+
+        response = self.client.get(
+            reverse('player-comments', args=[self.player.slug]), {'sort_by': '-likes_count'}
+        )
+        self.assertEqual(
+            [(item['id'], item['likes_count']) for item in response.data['results']],
+            [(self.other.id, 2), (self.comment.id, 1)],
+        )
+
+
+@override_settings(AI_BACKEND='core.ai.FakeBackend', AI_REPLY_MAX_ATTEMPTS=2, AI_REPLY_RETRY_BACKOFF_SECONDS=0)
+class AIReplyQueueTest(APITestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name="Test Club", city="Test City")
+        self.player = Player.objects.create(name="Test Player", position="FW", club=self.club, nationality="PL")
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.client.force_authenticate(user=self.user)
+        get_reply_cache().clear()
+
+    def post_comment(self, content):
+        with mock.patch('core.ai.FakeBackend.generate') as generate:
+            response = self.client.post(
+                reverse('comment-list'), {'player_id': self.player.id, 'content': content}, format='json'
+            )
+        generate.assert_not_called()
+        return response
+
+    def test_comment_is_returned_before_the_reply_is_generated(self):
+        Comment.objects.create(player=self.player, user=self.user, content="Wcześniejszy")
+        response = self.post_comment("Dramat")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(response.data['ai_response'])
+        self.assertEqual(response.data['ai_response_status'], AIReplyJob.STATUS_PENDING)
+
+        self.assertEqual(process_ai_reply_jobs(concurrency=1), (1, 0))
+        comment = Comment.objects.get(pk=response.data['id'])
+        self.assertTrue(comment.ai_response.startswith("Spokojnie"))
+        self.assertEqual(comment.ai_reply_job.status, AIReplyJob.STATUS_COMPLETED)
+        self.assertEqual(process_ai_reply_jobs(concurrency=1), (0, 0))
+
+    def test_failed_attempts_are_retried_until_the_limit(self):
+        comment_id = self.post_comment("Sprzedać go").data['id']
+
+        with mock.patch('core.ai.FakeBackend.generate', side_effect=RuntimeError("quota")):
+            self.assertEqual(process_ai_reply_jobs(concurrency=1), (0, 1))
+            job = AIReplyJob.objects.get(comment_id=comment_id)
+            self.assertEqual((job.status, job.attempts, job.last_error), (AIReplyJob.STATUS_PENDING, 1, "quota"))
+
+            self.assertEqual(process_ai_reply_jobs(concurrency=1), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (AIReplyJob.STATUS_FAILED, 2))
+        self.assertEqual(process_ai_reply_jobs(concurrency=1), (0, 0))
+        self.assertIsNone(Comment.objects.get(pk=comment_id).ai_response)
+
+    def test_pending_comments_are_answered_in_one_batch_call(self):
+        from core.ai import FakeBackend
+
+        comments = [
+            Comment.objects.create(player=self.player, user=self.user, content=content)
+            for content in ("Dramat", "Legenda", "Sprzedać go")
+        ]
+        for comment in comments:
+            enqueue_ai_reply(comment)
+
+        with mock.patch.object(FakeBackend, 'generate', autospec=True, side_effect=FakeBackend.generate) as generate:
+            self.assertEqual(process_ai_reply_jobs(concurrency=1, batch_size=3), (3, 0))
+
+        self.assertEqual(generate.call_count, 1)
+        replies = [Comment.objects.get(pk=comment.pk).ai_response for comment in comments]
+        self.assertEqual(len(set(replies)), 3)
@@ -1,22 +1,26 @@
+from django.db import transaction
+from django.db.models import F
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from .models import Comment
 from .serializers import CommentSerializer
-from core.pagination import StandardResultsSetPagination
+from core.pagination import CommentCursorPagination, CommentListPagination, CursorOptInPaginationMixin
 from core.permissions import IsOwnerOrStaff
 from rest_framework.filters import OrderingFilter
-from ratings.utils import check_comment_throttle
-from core.ai import generate_comment_response
+from core.ratelimit import check_rate_limit, rate_limited_response, with_rate_limit_headers
+from core.response_cache import COMMENTS, PLAYER, bump_versions, entity_key
+from .ai_replies import enqueue_ai_reply
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(CursorOptInPaginationMixin, viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
-    pagination_class = StandardResultsSetPagination
+    pagination_class = CommentListPagination
+    cursor_pagination_class = CommentCursorPagination
     filter_backends = [OrderingFilter]
     ordering_fields = ['created_at', 'updated_at', 'likes_count']
-    ordering = ['-created_at']
+    ordering = ['-created_at', '-id']
 
     def get_permissions(self):
         if self.action in {'list', 'retrieve', 'latest', 'club_latest'}:
@@ -27,8 +31,12 @@ class CommentViewSet(viewsets.ModelViewSet):
             permission_classes = [IsOwnerOrStaff]
         return [permission() for permission in permission_classes]
 
+    def get_keyset_ordering(self):
+        # Kursor paginacji idzie po tej samej kolejności co ?ordering= (z id na końcu).
+        return OrderingFilter().get_ordering(self.request, self.get_queryset(), self)
+
     def get_queryset(self):
-        queryset = super().get_queryset().exclude(player__club__name="Loan")
+        queryset = super().get_queryset().filter(player__is_public=True).select_related('user', 'player')
         player_id = self.request.query_params.get('player_id')
         if player_id:
             queryset = queryset.filter(player_id=player_id)
@@ -72,58 +80,40 @@ class CommentViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def like(self, request, pk=None):
         comment = self.get_object()
-        user = request.user
-        
-        if comment.likes.filter(id=user.id).exists():
-            comment.likes.remove(user)
-            action = 'unliked'
-        else:
-            comment.likes.add(user)
-            action = 'liked'
-        
+        likes = Comment.likes.through.objects
+
+        # Wiersz polubienia i licznik zmieniają się w jednej transakcji, licznik przez F(),
+        # więc równoległe kliknięcia nie gubią ani nie dublują polubień.
+        with transaction.atomic():
+            removed, _ = likes.filter(comment_id=comment.pk, user_id=request.user.id).delete()
+            if removed:
+                delta, action = -1, 'unliked'
+            else:
+                _, created = likes.get_or_create(comment_id=comment.pk, user_id=request.user.id)
+                delta, action = (1 if created else 0), 'liked'
+            Comment.objects.filter(pk=comment.pk).update(likes_count=F('likes_count') + delta)
+            likes_count = Comment.objects.values_list('likes_count', flat=True).get(pk=comment.pk)
+            # Zmiany przez through nie wysyłają m2m_changed.
+            bump_versions(COMMENTS, entity_key(PLAYER, comment.player_id))
+
         return Response({
             'status': f'Comment {action}',
-            'likes_count': comment.likes_count
+            'likes_count': likes_count
         })
     
     def create(self, request, *args, **kwargs):
-        # Sprawdź czy użytkownik może dodać nowy komentarz
-        can_comment, error_message = check_comment_throttle(request.user)
-        if not can_comment:
-            return Response(
-                {"detail": error_message},
-                status=status.HTTP_429_TOO_MANY_REQUESTS,
-                headers={"X-Error-Type": "throttled"}
-            )
-        
         # Standardowa logika tworzenia komentarza
         serializer = self.get_serializer(data=request.data)
-        if serializer.is_valid():
-            # Generate AI response
-            user_comment = serializer.validated_data.get('content')
-            player = serializer.validated_data.get('player')  # This might be tricky via serializer, check sourcing
-            # 'player' is read_only in serializer, sourced from 'player_id'. 
-            # serializer.validated_data will contain 'player' instance because of PrimaryKeyRelatedField source='player'
-            
-            # Let's save first without AI response to get the object, or generate before saving.
-            # Generating before saving avoids a second DB write, but we need the player object.
-            
-            # Helper to get player name safely
-            player_instance = serializer.validated_data.get('player')
-            ai_text = ""
-            if player_instance:
-                 recent_comments = list(
-                     Comment.objects.filter(player=player_instance)
-                     .order_by("-created_at")
-                     .values_list("content", flat=True)[:3]
-                 )
-                 ai_text = generate_comment_response(
-                     user_comment=user_comment, 
-                     player_name=player_instance.name,
-                     user_name=request.user.username,
-                     recent_comments=recent_comments,
-                 )
-            
-            serializer.save(user=request.user, ai_response=ai_text)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Sprawdź czy użytkownik może dodać nowy komentarz (dopiero po walidacji)
+        rate_limit = check_rate_limit(request, 'comment')
+        if not rate_limit.allowed:
+            return rate_limited_response(rate_limit)
+
+        # Odpowiedź AI generuje worker (process_ai_replies); komentarz wraca od razu.
+        with transaction.atomic():
+            comment = serializer.save(user=request.user)
+            enqueue_ai_reply(comment)
+        return with_rate_limit_headers(Response(serializer.data, status=status.HTTP_201_CREATED), rate_limit)
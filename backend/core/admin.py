@@ -1,3 +1,9 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import PendingAggregateRefresh
+
+
+@admin.register(PendingAggregateRefresh)
+class PendingAggregateRefreshAdmin(admin.ModelAdmin):
+    list_display = ("kind", "object_id", "requested_at")
+    list_filter = ("kind",)
@@ -1,107 +1,31 @@
+import hashlib
+import json
 import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from decouple import config
 import logging
-from typing import Optional, Sequence
+from typing import Dict, List, Optional, Sequence, Union
 
-logger = logging.getLogger(__name__)
+from django.conf import settings
+from django.utils.module_loading import import_string
 
-def get_gemini_model():
-    """Configures and returns the Gemini model."""
-    try:
-        api_key = config('GEMINI_API_KEY', default=os.environ.get('GEMINI_API_KEY'))
-        if not api_key:
-            logger.error("GEMINI_API_KEY not found in environment variables.")
-            return None
-
-        genai.configure(api_key=api_key)
-        
-        # Priority list of models to try
-        preferred_models = [
-            'models/gemini-2.5-flash-lite-preview-09-2025',
-            'models/gemini-2.5-flash-preview-09-2025',
-            'models/gemini-2.0-flash-lite-001',
-            'models/gemini-flash-latest',
-        ]
-        
-        available_models = [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
-        
-        model_name = None
-        for p in preferred_models:
-            if p in available_models:
-                model_name = p
-                break
-        
-        if not model_name:
-            # Fallback to any flash model
-            for m in available_models:
-                if 'flash' in m.lower():
-                    model_name = m
-                    break
-        
-        if not model_name and available_models:
-            model_name = available_models[0]
-            
-        if not model_name:
-            logger.error("No suitable Gemini model found.")
-            return None
-
-        logger.info(f"Using Gemini model: {model_name}")
-        return genai.GenerativeModel(model_name)
-    except Exception as e:
-        logger.error(f"Error configuring Gemini: {e}")
-        return None
+from matches.utils import normalize_text
 
-def generate_comment_response(
-    user_comment: str,
-    player_name: str,
-    user_name: str,
-    recent_comments: Optional[Sequence[str]] = None,
-) -> str:
-    """
-    Generates a humorous, ironic response to a user comment on a football player's profile.
-    Tries multiple models if one fails (especially on Quota QuotaExceeded).
-    """
-    
-    # Priority list of models to try
-    models_to_try = [
-        'models/gemini-2.5-flash-lite-preview-09-2025',
-        'models/gemini-2.5-flash-preview-09-2025',
-        'models/gemini-2.0-flash-lite-001',
-        'models/gemini-2.0-flash',
-        'models/gemini-flash-latest',
-    ]
+from .ai_log import log_ai_attempt, usage_metrics
 
-    api_key = config('GEMINI_API_KEY', default=os.environ.get('GEMINI_API_KEY'))
-    if not api_key:
-        logger.error("GEMINI_API_KEY not found.")
-        return ""
-    
-    try:
-        genai.configure(api_key=api_key)
-    except Exception as e:
-        logger.error(f"Failed to configure Gemini: {e}")
-        return ""
-
-    def _format_recent_comments(comments: Optional[Sequence[str]]) -> str:
-        if not comments:
-            return "- (brak)"
-        lines = []
-        for c in comments[:3]:
-            if c is None:
-                continue
-            # Keep prompt tidy; don't pass huge blobs.
-            c = " ".join(str(c).split())
-            if not c:
-                continue
-            if len(c) > 280:
-                c = c[:277] + "..."
-            lines.append(f"- {c}")
-        return "\n".join(lines) if lines else "- (brak)"
+logger = logging.getLogger(__name__)
+
+
+class AIGenerationError(Exception):
+    """The backend produced no reply (no API key, every model failed, empty text)."""
 
-    recent_comments_text = _format_recent_comments(recent_comments)
 
-    prompt = f"""
+_PROMPT_PERSONA = """
 Jesteś ADMIN_AI na stronie "Grill Ekstraklasa".
 Twoj styl: ironia i sarkazm, ale przyjazne, zartobliwe i nieofensywne. Zero hejtu.
 Pamietaj: Ekstraklasa to najlepsza liga swiata i daje nam duzo radosci, nawet gdy komentarze sa "gorace".
@@ -111,14 +35,9 @@ Cel odpowiedzi:
   a nie forme pilkarza, mecz, wynik czy przebieg spotkania.
 - jesli ma byc uszczypliwie, to delikatnie w kierunku piszacego (humor, mrugniecie okiem),
   bez obrazania, bez wyzwisk, bez ponizania.
+""".strip()
 
-Kontekst:
-- Pilkarz: {player_name}
-- Uzytkownik: {user_name}
-- Komentarz uzytkownika: "{user_comment}"
-- Ostatnie komentarze (tlo dyskusji; uzyj tylko jesli pasuje):
-{recent_comments_text}
-
+_PROMPT_RULES = """
 Zasady twarde:
 1) Maks 2 zdania (najlepiej 1). Bez list, bez emotek, bez hashtagow.
 2) Nie uzywaj wulgaryzmow ani obelg. Nie atakuj cech osoby (wyglad, pochodzenie, zdrowie itd.).
@@ -127,49 +46,525 @@ Zasady twarde:
 5) Jesli komentarz jest mocno negatywny: rozbroj to humorem i lekko zgas pewnosc autora, ale kulturalnie.
 6) Jesli komentarz jest pozytywny: pochwal luz i dorzuc drobna ironie w strone samego komentujacego (np. "spokojnie, to Ekstraklasa").
 7) Ekstraklasa zawsze wychodzi z tego wizerunkowo dobrze: zadnych szyder z ligi, co najwyzej ciepla, autoironiczna uwaga.
+""".strip()
+
+# Znaczniki bloku z komentarzami w prompcie zbiorczym.
+BATCH_START = "<KOMENTARZE>"
+BATCH_END = "</KOMENTARZE>"
+# Limit tokenów odpowiedzi na jeden komentarz.
+REPLY_MAX_OUTPUT_TOKENS = 90
+# Zamiast nicku w prompcie, gdy odpowiedzi idą do cache: ta sama riposta pasuje wtedy każdemu
+# autorowi, a nick wstawiamy dopiero w gotową odpowiedź.
+USER_NAME_PLACEHOLDER = "[UZYTKOWNIK]"
+
+
+def _recent_comment_lines(comments: Optional[Sequence[str]]) -> List[str]:
+    lines = []
+    for c in (comments or [])[:3]:
+        if c is None:
+            continue
+        # Keep prompt tidy; don't pass huge blobs.
+        c = " ".join(str(c).split())
+        if not c:
+            continue
+        if len(c) > 280:
+            c = c[:277] + "..."
+        lines.append(c)
+    return lines
+
+
+def _format_recent_comments(comments: Optional[Sequence[str]]) -> str:
+    lines = _recent_comment_lines(comments)
+    return "\n".join(f"- {c}" for c in lines) if lines else "- (brak)"
+
+
+def build_comment_prompt(
+    user_comment: str,
+    player_name: str,
+    user_name: str,
+    recent_comments: Optional[Sequence[str]] = None,
+) -> str:
+    recent_comments_text = _format_recent_comments(recent_comments)
+
+    return f"""
+{_PROMPT_PERSONA}
+
+Kontekst:
+- Pilkarz: {player_name}
+- Uzytkownik: {user_name}
+- Komentarz uzytkownika: "{user_comment}"
+- Ostatnie komentarze (tlo dyskusji; uzyj tylko jesli pasuje):
+{recent_comments_text}
+
+{_PROMPT_RULES}
 
 Twoja odpowiedz (sam tekst, bez naglowkow):
 """.strip()
 
-    import datetime
-    # Ensure logs directory exists
-    os.makedirs('logs', exist_ok=True)
-    log_file = "logs/gemini_responses.log"
 
-    for model_name in models_to_try:
-        print(f"DEBUG: Trying Gemini model: {model_name}")
+@dataclass(frozen=True)
+class ReplyRequest:
+    user_comment: str
+    player_name: str
+    user_name: str
+    recent_comments: Sequence[str] = ()
+    player_id: Optional[int] = None
+
+
+def build_batch_prompt(requests: Sequence[ReplyRequest]) -> str:
+    """One prompt for several comments; the reply to item ``i`` comes back under ``"id": i``."""
+    items = [
+        {
+            "id": index,
+            "pilkarz": request.player_name,
+            "uzytkownik": request.user_name,
+            "komentarz": request.user_comment,
+            "ostatnie_komentarze": _recent_comment_lines(request.recent_comments),
+        }
+        for index, request in enumerate(requests, start=1)
+    ]
+    return f"""
+{_PROMPT_PERSONA}
+
+Odpowiadasz naraz na kilka niezaleznych komentarzy. Kazdy ma wlasny kontekst (JSON ponizej):
+pilkarz, uzytkownik, komentarz i ostatnie komentarze (tlo dyskusji; uzyj tylko jesli pasuje).
+{BATCH_START}
+{json.dumps(items, ensure_ascii=False, indent=1)}
+{BATCH_END}
+
+{_PROMPT_RULES}
+Kazda odpowiedz dotyczy tylko swojego komentarza; zasady obowiazuja dla kazdej osobno.
+
+Zwroc wylacznie tablice JSON, po jednym obiekcie na kazdy komentarz:
+[{{"id": 1, "odpowiedz": "..."}}, ...]
+""".strip()
+
+
+def parse_batch_response(text: str) -> Dict[int, str]:
+    """Replies by item id from a batch answer; items missing or malformed in the answer are left out."""
+    text = text or ""
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end <= start:
+        return {}
+    try:
+        items = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+    replies = {}
+    for item in items if isinstance(items, list) else ():
+        if not isinstance(item, dict):
+            continue
         try:
-            model = genai.GenerativeModel(model_name)
-            response = model.generate_content(
-                prompt,
-                generation_config={
-                    # Keep it short and punchy.
-                    "max_output_tokens": 90,
-                    "temperature": 0.7,
-                },
+            index = int(item.get("id"))
+        except (TypeError, ValueError):
+            continue
+        reply = clean_response(str(item.get("odpowiedz") or ""))
+        if reply:
+            replies[index] = reply
+    return replies
+
+
+def clean_response(text: str) -> str:
+    text = (text or "").strip()
+    if text.startswith("Komentarz AI:") or text.startswith("AI:"):
+        text = text.split(":", 1)[1].strip()
+    return text
+
+
+# Priority list of models to try
+GEMINI_MODELS = [
+    'models/gemini-2.5-flash-lite-preview-09-2025',
+    'models/gemini-2.5-flash-preview-09-2025',
+    'models/gemini-2.0-flash-lite-001',
+    'models/gemini-2.0-flash',
+    'models/gemini-flash-latest',
+]
+
+
+class GeminiModelRegistry:
+    """
+    Process-wide state of the Gemini models: the API is configured and the
+    available models are listed once, GenerativeModel clients are kept, and
+    each model has a circuit breaker. After ``failure_threshold`` consecutive
+    failures (or one quota error) a model is skipped for ``cooldown`` seconds,
+    then gets a single trial call; a success closes the breaker again.
+    """
+
+    def __init__(self, preferred_models, failure_threshold=3, cooldown=300.0, clock=time.monotonic):
+        self.preferred_models = list(preferred_models)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._models = None
+        self._clients = {}
+        self._failures = {}
+        self._open_until = {}
+
+    def _resolve(self):
+        api_key = config('GEMINI_API_KEY', default=os.environ.get('GEMINI_API_KEY'))
+        if not api_key:
+            logger.error("GEMINI_API_KEY not found.")
+            raise AIGenerationError("GEMINI_API_KEY not found")
+        try:
+            genai.configure(api_key=api_key)
+        except Exception as e:
+            logger.error(f"Failed to configure Gemini: {e}")
+            raise AIGenerationError(f"Failed to configure Gemini: {e}") from e
+        try:
+            available = {
+                m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods
+            }
+        except Exception as e:
+            # Bez listy modeli próbujemy wszystkich z listy preferencji.
+            logger.warning(f"Could not list Gemini models: {e}")
+            return list(self.preferred_models)
+        models = [name for name in self.preferred_models if name in available]
+        if not models:
+            # Fallback to any flash model
+            models = sorted(name for name in available if 'flash' in name.lower())[:1]
+        if not models:
+            raise AIGenerationError("No suitable Gemini model found")
+        logger.info(f"Using Gemini models: {models}")
+        return models
+
+    def models(self):
+        """Models to call now, best first: closed breakers, plus those whose cooldown is over."""
+        with self._lock:
+            if self._models is None:
+                self._models = self._resolve()
+            now = self.clock()
+            return [name for name in self._models if self._open_until.get(name, 0) <= now]
+
+    def client(self, model_name):
+        with self._lock:
+            if model_name not in self._clients:
+                self._clients[model_name] = genai.GenerativeModel(model_name)
+            return self._clients[model_name]
+
+    def record_success(self, model_name):
+        with self._lock:
+            self._failures.pop(model_name, None)
+            self._open_until.pop(model_name, None)
+
+    def record_failure(self, model_name, error):
+        with self._lock:
+            failures = self._failures.get(model_name, 0) + 1
+            self._failures[model_name] = failures
+            # Wyczerpany limit nie wróci przy następnym komentarzu - od razu przerwa.
+            if failures >= self.failure_threshold or isinstance(error, google_exceptions.TooManyRequests):
+                self._open_until[model_name] = self.clock() + self.cooldown
+                logger.warning(f"Gemini model {model_name} cooling down for {self.cooldown}s: {error}")
+
+
+class GeminiBackend:
+    """Gemini models in order of preference; the first healthy one that answers wins."""
+
+    def __init__(self):
+        self.registry = GeminiModelRegistry(
+            GEMINI_MODELS,
+            failure_threshold=getattr(settings, "AI_MODEL_FAILURE_THRESHOLD", 3),
+            cooldown=getattr(settings, "AI_MODEL_COOLDOWN_SECONDS", 300),
+        )
+
+    def generate(self, prompt: str, max_output_tokens: int = REPLY_MAX_OUTPUT_TOKENS) -> str:
+        models = self.registry.models()
+        if not models:
+            raise AIGenerationError("All Gemini models are cooling down")
+
+        last_error = None
+        for model_name in models:
+            started = time.perf_counter()
+            try:
+                response = self.registry.client(model_name).generate_content(
+                    prompt,
+                    generation_config={
+                        # Keep it short and punchy.
+                        "max_output_tokens": max_output_tokens,
+                        "temperature": 0.7,
+                    },
+                )
+                text = response.text.strip()
+            except Exception as e:
+                # Any error -> try the next model. Only API errors (transport, quota, server) count
+                # toward the breaker: a blocked or empty answer says nothing about the model's health.
+                last_error = f"{model_name}: {e}"
+                if isinstance(e, google_exceptions.GoogleAPICallError):
+                    self.registry.record_failure(model_name, e)
+                log_ai_attempt(
+                    model_name,
+                    (time.perf_counter() - started) * 1000,
+                    ok=False,
+                    prompt_chars=len(prompt),
+                    error=str(e),
+                    max_output_tokens=max_output_tokens,
+                )
+                continue
+
+            self.registry.record_success(model_name)
+            log_ai_attempt(
+                model_name,
+                (time.perf_counter() - started) * 1000,
+                ok=True,
+                prompt_chars=len(prompt),
+                response_text=text,
+                max_output_tokens=max_output_tokens,
+                **usage_metrics(response),
             )
-            text = response.text.strip()
-            
-            print(f"DEBUG: Success with {model_name}. Response: {text}")
-            
-            # Helper to log to file
-            with open(log_file, "a", encoding="utf-8") as f:
-                timestamp = datetime.datetime.now().isoformat()
-                f.write(f"[{timestamp}] MODEL: {model_name}\nPROMPT: {user_comment}\nRESPONSE: {text}\n{'-'*20}\n")
-
-            # Clean up response
-            if text.startswith("Komentarz AI:") or text.startswith("AI:"): 
-                text = text.split(":", 1)[1].strip()
             return text
 
-        except Exception as e:
-            err_msg = str(e)
-            print(f"DEBUG: Failed with {model_name}: {err_msg}")
-            # Only continue loop if it is likely a temporary/quota error, but here we assume any error -> try next
-            with open(log_file, "a", encoding="utf-8") as f:
-                timestamp = datetime.datetime.now().isoformat()
-                f.write(f"[{timestamp}] MODEL: {model_name} FAILED\nERROR: {err_msg}\n{'-'*20}\n")
-            continue
-    
-    print("DEBUG: All models failed.")
-    return ""
+        logger.warning(f"All Gemini models failed (last: {last_error})")
+        raise AIGenerationError(f"All Gemini models failed (last: {last_error})")
+
+
+def get_gemini_model():
+    """The client of the first healthy Gemini model, or None when none is usable."""
+    backend = get_ai_backend()
+    registry = getattr(backend, "registry", None) or GeminiBackend().registry
+    try:
+        models = registry.models()
+    except AIGenerationError as e:
+        logger.error(f"Error configuring Gemini: {e}")
+        return None
+    return registry.client(models[0]) if models else None
+
+
+class FakeBackend:
+    """
+    Offline backend for tests and local development: no network, and the
+    same prompt always gets the same reply. Batch prompts get a JSON answer
+    with one reply per item, like the real model is asked to give.
+    """
+
+    @staticmethod
+    def _reply(text: str) -> str:
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()[:8]
+        return f"Spokojnie, to tylko Ekstraklasa. [{digest}]"
+
+    def generate(self, prompt: str, max_output_tokens: int = REPLY_MAX_OUTPUT_TOKENS) -> str:
+        if BATCH_START not in prompt:
+            return self._reply(prompt)
+        items = json.loads(prompt.split(BATCH_START, 1)[1].split(BATCH_END, 1)[0])
+        return json.dumps(
+            [
+                {"id": item["id"], "odpowiedz": self._reply(json.dumps(item, ensure_ascii=False, sort_keys=True))}
+                for item in items
+            ],
+            ensure_ascii=False,
+        )
+
+
+# settings.AI_REPLY_CACHE_POLICY
+REPLY_CACHE_OFF = "off"
+REPLY_CACHE_REUSE = "reuse"  # jedna odpowiedź na klucz, podawana za każdym razem
+REPLY_CACHE_VARY = "vary"  # do AI_REPLY_CACHE_VARIANTS odpowiedzi na klucz, potem podawane po kolei
+
+
+@dataclass
+class _CachedReplies:
+    expires_at: float
+    replies: List[str] = field(default_factory=list)
+    served: int = 0
+
+
+class ReplyCache:
+    """
+    Generated replies keyed by (prompt version, player, normalized comment),
+    so near-identical comments on a player ("Dramat!!", "dramat") share
+    replies instead of each costing an LLM call. Entries expire ``ttl``
+    seconds after their first reply; beyond ``max_entries`` the least
+    recently used one is dropped.
+    """
+
+    def __init__(self, max_entries=1000, ttl=6 * 60 * 60, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def lookup(self, key, variants=1):
+        """
+        A cached reply for ``key``, rotating through its replies; None while
+        the key has fewer than ``variants`` replies, i.e. a new one is wanted.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            if len(entry.replies) < variants:
+                return None
+            reply = entry.replies[entry.served % len(entry.replies)]
+            entry.served += 1
+            return reply
+
+    def store(self, key, reply, variants=1):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= self.clock():
+                entry = self._entries[key] = _CachedReplies(expires_at=self.clock() + self.ttl)
+            if len(entry.replies) < variants:
+                entry.replies.append(reply)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _prompt_version():
+    # Zmiana treści promptu zmienia klucze, więc stare odpowiedzi przestają być używane.
+    template = build_comment_prompt("{user_comment}", "{player_name}", "{user_name}") + build_batch_prompt([])
+    return hashlib.sha1(template.encode("utf-8")).hexdigest()[:12]
+
+
+PROMPT_VERSION = _prompt_version()
+
+
+def reply_cache_key(user_comment: str, player) -> Optional[str]:
+    """
+    Key shared by comments that normalize to the same text on the same player,
+    whoever wrote them; None for empty ones.
+    """
+    text = normalize_text(user_comment)
+    if not text:
+        return None
+    return f"{PROMPT_VERSION}:{player}:{text}"
+
+
+def personalize_reply(reply: str, user_name: str) -> str:
+    """Puts the author's name where a cacheable reply has USER_NAME_PLACEHOLDER."""
+    return reply.replace(USER_NAME_PLACEHOLDER, user_name)
+
+
+_reply_cache = None
+
+
+def get_reply_cache():
+    global _reply_cache
+    if _reply_cache is None:
+        _reply_cache = ReplyCache(
+            max_entries=getattr(settings, "AI_REPLY_CACHE_MAX_ENTRIES", 1000),
+            ttl=getattr(settings, "AI_REPLY_CACHE_TTL_SECONDS", 6 * 60 * 60),
+        )
+    return _reply_cache
+
+
+_backends = {}
+
+
+def get_ai_backend():
+    """The backend named by settings.AI_BACKEND, one instance per process."""
+    path = getattr(settings, "AI_BACKEND", "core.ai.GeminiBackend")
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
+
+
+def _generate(requests: Sequence[ReplyRequest]) -> List[Union[str, AIGenerationError]]:
+    """One backend call for all ``requests``: the plain prompt for one, the batch prompt for more."""
+    backend = get_ai_backend()
+    try:
+        if len(requests) == 1:
+            request = requests[0]
+            prompt = build_comment_prompt(
+                request.user_comment, request.player_name, request.user_name, request.recent_comments
+            )
+            text = clean_response(backend.generate(prompt))
+            return [text or AIGenerationError("Empty response")]
+        replies = parse_batch_response(
+            backend.generate(
+                build_batch_prompt(requests),
+                max_output_tokens=REPLY_MAX_OUTPUT_TOKENS * len(requests) + 50,
+            )
+        )
+    except AIGenerationError as e:
+        return [e] * len(requests)
+    return [
+        replies.get(index) or AIGenerationError("No reply for this comment in the batch response")
+        for index in range(1, len(requests) + 1)
+    ]
+
+
+def generate_comment_responses(
+    requests: Sequence[ReplyRequest], batch_size: Optional[int] = None
+) -> List[Union[str, AIGenerationError]]:
+    """
+    Replies to many comments, ``batch_size`` (default settings.AI_REPLY_BATCH_SIZE)
+    per backend call. Each result is the reply or the AIGenerationError saying
+    why there is none. Cached replies are used as in generate_comment_response,
+    and a comment repeated within the call is generated once. Replies meant for
+    the cache are generated for USER_NAME_PLACEHOLDER instead of the author, so
+    any fan's near-identical comment can reuse them.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, "AI_REPLY_BATCH_SIZE", 5)
+    policy = getattr(settings, "AI_REPLY_CACHE_POLICY", REPLY_CACHE_REUSE)
+    variants = getattr(settings, "AI_REPLY_CACHE_VARIANTS", 3) if policy == REPLY_CACHE_VARY else 1
+    reply_cache = get_reply_cache()
+
+    results = [None] * len(requests)
+    keys = [None] * len(requests)
+    pending = []
+    first_by_key = {}
+    for index, request in enumerate(requests):
+        if policy != REPLY_CACHE_OFF:
+            player = request.player_id if request.player_id is not None else normalize_text(request.player_name)
+            keys[index] = reply_cache_key(request.user_comment, player)
+        if keys[index] is not None:
+            results[index] = reply_cache.lookup(keys[index], variants)
+            if results[index] is not None:
+                continue
+            if variants == 1 and keys[index] in first_by_key:
+                continue
+            first_by_key.setdefault(keys[index], index)
+        pending.append(index)
+
+    for start in range(0, len(pending), max(batch_size, 1)):
+        chunk = pending[start:start + max(batch_size, 1)]
+        generated = _generate([
+            replace(requests[index], user_name=USER_NAME_PLACEHOLDER) if keys[index] is not None else requests[index]
+            for index in chunk
+        ])
+        for index, result in zip(chunk, generated):
+            results[index] = result
+            if keys[index] is not None and not isinstance(result, AIGenerationError):
+                reply_cache.store(keys[index], result, variants)
+
+    # Powtórzenia w obrębie wywołania dostają odpowiedź pierwszego wystąpienia.
+    for index, key in enumerate(keys):
+        if results[index] is None:
+            results[index] = results[first_by_key[key]]
+    return [
+        personalize_reply(result, request.user_name) if isinstance(result, str) else result
+        for request, result in zip(requests, results)
+    ]
+
+
+def generate_comment_response(
+    user_comment: str,
+    player_name: str,
+    user_name: str,
+    recent_comments: Optional[Sequence[str]] = None,
+    player_id: Optional[int] = None,
+) -> str:
+    """
+    Generates a humorous, ironic response to a user comment on a football player's profile.
+    Replies to near-identical comments on the same player, by any user, come
+    from the reply cache according to settings.AI_REPLY_CACHE_POLICY.
+    Raises AIGenerationError when the backend gives no usable reply.
+    """
+    request = ReplyRequest(user_comment, player_name, user_name, tuple(recent_comments or ()), player_id)
+    (result,) = generate_comment_responses([request], batch_size=1)
+    if isinstance(result, AIGenerationError):
+        raise result
+    return result
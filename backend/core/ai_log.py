@@ -0,0 +1,131 @@
+"""
+Non-blocking log of LLM calls made by core.ai.
+
+Each attempt is one JSON line (model, outcome, latency, token counts) written
+to a file of its own per process, named after settings.AI_LOG_FILE with the
+pid inserted (gemini_responses.<pid>.log): RotatingFileHandler cannot be
+shared between processes, which would otherwise rotate the same file under
+each other. Callers only put the record on an in-memory queue;
+a background QueueListener thread formats it and writes it through a
+RotatingFileHandler, so no disk I/O happens on the calling thread and the
+file is capped at AI_LOG_MAX_BYTES x (AI_LOG_BACKUP_COUNT + 1). When the
+queue is full, records are dropped (and counted) rather than blocking.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from django.conf import settings
+
+AI_LOGGER_NAME = "core.ai.calls"
+
+_lock = threading.Lock()
+_listener = None
+_listener_pid = None
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks: a record that does not fit is dropped."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonLineFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "event": record.getMessage(),
+            **getattr(record, "ai", {}),
+        }
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def start_queue_logging(log_file, max_bytes, backup_count, queue_size):
+    """
+    Starts a listener writing JSON lines to a rotating ``log_file``; returns
+    it with the non-blocking handler that feeds it.
+    """
+    # Katalog zakładamy raz, przy starcie listenera - nie przy każdym wpisie.
+    os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+    file_handler = RotatingFileHandler(
+        log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True
+    )
+    file_handler.setFormatter(JsonLineFormatter())
+    log_queue = queue.Queue(maxsize=queue_size)
+    listener = QueueListener(log_queue, file_handler)
+    listener.start()
+    return listener, DroppingQueueHandler(log_queue)
+
+
+def process_log_file(log_file, pid=None):
+    """``log_file`` with the process id before its extension: logs/calls.log -> logs/calls.<pid>.log."""
+    root, ext = os.path.splitext(log_file)
+    return f"{root}.{pid or os.getpid()}{ext}"
+
+
+def get_ai_logger():
+    """The call logger; its queue listener is started on first use, once per process."""
+    global _listener, _listener_pid
+    ai_logger = logging.getLogger(AI_LOGGER_NAME)
+    # Po fork() (np. gunicorn --preload) listener rodzica nie działa w dziecku - startujemy własny.
+    if _listener_pid != os.getpid() and getattr(settings, "AI_LOG_ENABLED", True):
+        with _lock:
+            if _listener_pid != os.getpid():
+                for handler in list(ai_logger.handlers):
+                    if isinstance(handler, DroppingQueueHandler):
+                        ai_logger.removeHandler(handler)
+                _listener, handler = start_queue_logging(
+                    process_log_file(settings.AI_LOG_FILE),
+                    settings.AI_LOG_MAX_BYTES,
+                    settings.AI_LOG_BACKUP_COUNT,
+                    settings.AI_LOG_QUEUE_SIZE,
+                )
+                _listener_pid = os.getpid()
+                atexit.register(_listener.stop)
+                ai_logger.addHandler(handler)
+                ai_logger.setLevel(logging.INFO)
+                # Wpisy trafiają tylko do pliku, nie do handlerów nadrzędnych loggerów.
+                ai_logger.propagate = False
+    return ai_logger
+
+
+def usage_metrics(response):
+    """Token counts reported by the Gemini response (None when it reports none)."""
+    usage = getattr(response, "usage_metadata", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_token_count", None),
+        "output_tokens": getattr(usage, "candidates_token_count", None),
+        "total_tokens": getattr(usage, "total_token_count", None),
+    }
+
+
+def log_ai_attempt(model, latency_ms, ok, prompt_chars, error=None, response_text=None, **metrics):
+    get_ai_logger().log(
+        logging.INFO if ok else logging.WARNING,
+        "attempt",
+        extra={
+            "ai": {
+                "model": model,
+                "ok": ok,
+                "latency_ms": round(latency_ms, 1),
+                "prompt_chars": prompt_chars,
+                "error": error,
+                "response": response_text,
+                **metrics,
+            }
+        },
+    )
@@ -0,0 +1,72 @@
+"""
+Sparse fieldsets for read endpoints: ``?fields=id,name`` limits the response
+to the listed fields and ``?expand=recent_comments`` adds heavy relations
+that list endpoints leave out by default.
+
+A serializer using SparseFieldsetSerializerMixin declares in its Meta:
+- ``lean_fields``: the default projection for list endpoints,
+- ``expandable_fields``: fields a lean projection returns only when asked
+  for in ``expand`` (or named explicitly in ``fields``).
+
+Detail endpoints keep the full representation unless ``fields`` is given.
+"""
+
+
+def parse_field_list(value):
+    if not value:
+        return None
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+class SparseFieldsetSerializerMixin:
+    def __init__(self, *args, fields=None, expand=None, lean=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = self.resolve_field_names(fields=fields, expand=expand, lean=lean)
+        for name in list(self.fields):
+            if name not in selected:
+                self.fields.pop(name)
+
+    @classmethod
+    def resolve_field_names(cls, fields=None, expand=None, lean=False):
+        meta = cls.Meta
+        available = list(meta.fields)
+        expandable = set(getattr(meta, "expandable_fields", ()))
+        if fields:
+            selected = {name for name in fields if name in available}
+        elif lean:
+            selected = set(getattr(meta, "lean_fields", available)) - expandable
+        else:
+            selected = set(available)
+        selected.update(name for name in (expand or ()) if name in expandable)
+        return selected
+
+
+class SparseFieldsetViewMixin:
+    """
+    Passes ``fields``/``expand`` from the query string to the serializer on
+    GET requests; actions in ``lean_actions`` default to the lean projection.
+    """
+
+    lean_actions = {"list"}
+
+    def get_fieldset_options(self):
+        request = getattr(self, "request", None)
+        if request is None or request.method != "GET":
+            return {}
+        return {
+            "fields": parse_field_list(request.query_params.get("fields")),
+            "expand": parse_field_list(request.query_params.get("expand")),
+            "lean": self.action in self.lean_actions,
+        }
+
+    def get_response_field_names(self):
+        """Field names the response will contain, or None for a write."""
+        options = self.get_fieldset_options()
+        if not options:
+            return None
+        return self.get_serializer_class().resolve_field_names(**options)
+
+    def get_serializer(self, *args, **kwargs):
+        for key, value in self.get_fieldset_options().items():
+            kwargs.setdefault(key, value)
+        return super().get_serializer(*args, **kwargs)
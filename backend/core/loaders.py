@@ -0,0 +1,77 @@
+"""
+Request-scoped batch loading for serializer method fields (DataLoader style).
+
+A serializer declares its loaders in ``batch_loaders``: ``{name: (key_fn,
+batch_fn)}`` where ``key_fn(instance)`` gives the key an instance needs and
+``batch_fn(keys, context)`` resolves many keys at once, returning
+``{key: value}``; its Meta sets ``list_serializer_class =
+BatchLoadingListSerializer``. Before a list is serialized, that list serializer
+registers the keys of every item, so the first ``load()`` resolves all of
+them with one ``IN (...)`` query per loader.
+
+Loaders live in the serializer context, which nested serializers share, so a
+parent may register keys for a loader its nested serializer reads from.
+"""
+
+from django.db.models.manager import BaseManager
+from rest_framework import serializers
+
+CONTEXT_KEY = "batch_loaders"
+
+
+class BatchLoader:
+    def __init__(self, batch_fn, context):
+        self.batch_fn = batch_fn
+        self.context = context
+        self._pending = set()
+        self._values = {}
+
+    def register(self, keys):
+        self._pending.update(key for key in keys if key is not None and key not in self._values)
+
+    def load(self, key, default=None):
+        if key is None:
+            return default
+        if key not in self._values:
+            self._pending.add(key)
+            keys = self._pending
+            self._pending = set()
+            resolved = self.batch_fn(keys, self.context)
+            for pending_key in keys:
+                self._values[pending_key] = resolved.get(pending_key, default)
+        return self._values[key]
+
+
+def get_batch_loader(context, name, batch_fn):
+    loaders = context.setdefault(CONTEXT_KEY, {})
+    if name not in loaders:
+        loaders[name] = BatchLoader(batch_fn, context)
+    return loaders[name]
+
+
+class BatchLoadingListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, BaseManager) else data)
+        self.child.register_batch_keys(items)
+        return super().to_representation(items)
+
+
+class BatchLoadingSerializerMixin:
+    batch_loaders = {}
+
+    def get_loader(self, name):
+        _, batch_fn = self.batch_loaders[name]
+        return get_batch_loader(self.context, name, batch_fn)
+
+    def active_batch_loaders(self):
+        """Names of loaders whose fields are part of this representation."""
+        return list(self.batch_loaders)
+
+    def register_batch_keys(self, instances):
+        for name in self.active_batch_loaders():
+            key_fn, _ = self.batch_loaders[name]
+            self.get_loader(name).register(key_fn(instance) for instance in instances)
+
+    def load(self, name, instance, default=None):
+        key_fn, _ = self.batch_loaders[name]
+        return self.get_loader(name).load(key_fn(instance), default)
@@ -0,0 +1,53 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from players.rating_aggregates import flush_pending_aggregate_refreshes
+
+
+class Command(BaseCommand):
+    help = "Worker: przelicza oznaczone agregaty ocen (mecze, ranking zawodników) co najwyżej raz na okno czasowe."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--window",
+            type=float,
+            default=None,
+            help="Długość okna w sekundach (domyślnie AGGREGATE_REFRESH_WINDOW_SECONDS).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Maksymalna liczba kluczy przeliczanych w jednym przebiegu.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Wykonaj jeden przebieg i zakończ (np. z crona).",
+        )
+
+    def handle(self, *args, **options):
+        window = options["window"]
+        if window is None:
+            window = settings.AGGREGATE_REFRESH_WINDOW_SECONDS
+        batch_size = options["batch_size"]
+
+        if options["once"]:
+            refreshed = flush_pending_aggregate_refreshes(limit=batch_size)
+            self.stdout.write(f"[process_aggregate_refreshes] refreshed: {refreshed}")
+            return
+
+        self.stdout.write(f"[process_aggregate_refreshes] started, window={window}s")
+        try:
+            while True:
+                started = time.monotonic()
+                close_old_connections()
+                refreshed = flush_pending_aggregate_refreshes(limit=batch_size)
+                if refreshed:
+                    self.stdout.write(f"[process_aggregate_refreshes] refreshed: {refreshed}")
+                time.sleep(max(window - (time.monotonic() - started), 0))
+        except KeyboardInterrupt:
+            self.stdout.write("[process_aggregate_refreshes] stopped")
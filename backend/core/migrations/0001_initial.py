@@ -0,0 +1,52 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingAggregateRefresh",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("player", "Player rating snapshot"),
+                            ("fixture", "Fixture rating summary"),
+                        ],
+                        max_length=16,
+                    ),
+                ),
+                ("object_id", models.PositiveBigIntegerField()),
+                (
+                    "requested_at",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["requested_at"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="pendingaggregaterefresh",
+            constraint=models.UniqueConstraint(
+                fields=("kind", "object_id"), name="unique_pending_aggregate_refresh"
+            ),
+        ),
+    ]
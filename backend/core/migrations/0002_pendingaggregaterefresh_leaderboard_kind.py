@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="pendingaggregaterefresh",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("player", "Player rating snapshot"),
+                    ("fixture", "Fixture rating summary"),
+                    ("leaderboard", "Player leaderboard position"),
+                ],
+                max_length=16,
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+def delete_player_snapshot_markers(apps, schema_editor):
+    PendingAggregateRefresh = apps.get_model("core", "PendingAggregateRefresh")
+    PendingAggregateRefresh.objects.filter(kind="player").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_pendingaggregaterefresh_leaderboard_kind"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_player_snapshot_markers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="pendingaggregaterefresh",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("fixture", "Fixture rating summary"),
+                    ("leaderboard", "Player leaderboard position"),
+                ],
+                max_length=16,
+            ),
+        ),
+    ]
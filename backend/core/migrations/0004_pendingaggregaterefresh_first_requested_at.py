@@ -0,0 +1,37 @@
+# Generated by Django 4.2.20 on 2026-10-18 17:59
+
+from django.db import migrations, models
+import django.utils.timezone
+from django.db.models import F
+
+
+def copy_requested_at(apps, schema_editor):
+    PendingAggregateRefresh = apps.get_model("core", "PendingAggregateRefresh")
+    PendingAggregateRefresh.objects.update(first_requested_at=F("requested_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_remove_player_snapshot_kind"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="pendingaggregaterefresh",
+            options={"ordering": ["first_requested_at"]},
+        ),
+        migrations.AddField(
+            model_name="pendingaggregaterefresh",
+            name="claimed_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="pendingaggregaterefresh",
+            name="first_requested_at",
+            field=models.DateTimeField(
+                db_index=True, default=django.utils.timezone.now
+            ),
+        ),
+        migrations.RunPython(copy_requested_at, migrations.RunPython.noop),
+    ]
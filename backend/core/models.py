@@ -1,3 +1,35 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class PendingAggregateRefresh(models.Model):
+    """
+    Dirty marker for a denormalized aggregate. Rating writes only upsert a row here;
+    the process_aggregate_refreshes worker recomputes each key once per window.
+    """
+
+    KIND_FIXTURE = "fixture"
+    KIND_LEADERBOARD = "leaderboard"
+
+    KIND_CHOICES = [
+        (KIND_FIXTURE, "Fixture rating summary"),
+        (KIND_LEADERBOARD, "Player leaderboard position"),
+    ]
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    # requested_at moves with every re-mark; first_requested_at keeps the moment the key
+    # first became dirty, so the worker serves keys oldest-first and hot ones cannot starve.
+    requested_at = models.DateTimeField(default=timezone.now, db_index=True)
+    first_requested_at = models.DateTimeField(default=timezone.now, db_index=True)
+    # Set while a worker is refreshing the key; an expired claim is taken over by another worker.
+    claimed_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["first_requested_at"]
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "object_id"], name="unique_pending_aggregate_refresh"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.object_id}"
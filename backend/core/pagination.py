@@ -1,4 +1,11 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db.models import Max, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 class StandardResultsSetPagination(PageNumberPagination):
     """
@@ -8,3 +15,248 @@ class StandardResultsSetPagination(PageNumberPagination):
     page_size = 1000  # Domyślny rozmiar strony do 1000 rekordów
     page_size_query_param = 'page_size'
     max_page_size = 1000
+
+
+class PlayerListPagination(StandardResultsSetPagination):
+    # Lista zawodników: jak PlayerRankingPagination; 200 mieści cały skład ligi na jednej stronie.
+    page_size = 50
+    max_page_size = 200
+
+
+class CommentListPagination(StandardResultsSetPagination):
+    page_size = 20
+    max_page_size = 100
+
+
+class PlayerCommentsPagination(StandardResultsSetPagination):
+    page_size = 20
+    max_page_size = 100
+
+
+def wants_cursor_pagination(request):
+    """Paginacja kursorowa jest opcjonalna: ?cursor=... albo ?pagination=cursor."""
+    return "cursor" in request.query_params or request.query_params.get("pagination") == "cursor"
+
+
+class CursorOptInPaginationMixin:
+    """
+    Dla akcji list zamienia domyślną paginację (numery stron z count) na
+    cursor_pagination_class, gdy klient o to poprosi; bez tego kontrakt
+    endpointu się nie zmienia.
+    """
+
+    cursor_pagination_class = None
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            pagination_class = self.pagination_class
+            if self.cursor_pagination_class and self.action == "list" and wants_cursor_pagination(self.request):
+                pagination_class = self.cursor_pagination_class
+            self._paginator = pagination_class() if pagination_class is not None else None
+        return self._paginator
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginacja kursorowa (keyset) po stałym porządku z rozstrzyganiem remisów po id.
+
+    Kolejna strona to zawsze WHERE (pola) > (wartości ostatniego wiersza)
+    + LIMIT, bez COUNT(*) i bez OFFSET, więc strona 500 kosztuje tyle co
+    pierwsza. Kursor jest nieprzezroczysty (base64 z JSON-em).
+    Widok może nadpisać porządek metodą get_keyset_ordering().
+    """
+
+    ordering = ("-id",)
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Nieprawidłowy kursor paginacji."
+
+    def get_ordering(self, view):
+        ordering = None
+        if view is not None and hasattr(view, "get_keyset_ordering"):
+            ordering = view.get_keyset_ordering()
+        ordering = list(ordering or self.ordering)
+        if not any(field.lstrip("-") in ("id", "pk") for field in ordering):
+            ordering.append("-id" if ordering[-1].startswith("-") else "id")
+        return ordering
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            size = self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        self.ordering_fields = self.get_ordering(view)
+        position, reverse = self.decode_cursor(request)
+
+        ordering = [_flip(field) for field in self.ordering_fields] if reverse else self.ordering_fields
+        if position is not None:
+            queryset = queryset.filter(self._after(queryset, ordering, position))
+        rows = list(queryset.order_by(*ordering)[: self.page_size_value + 1])
+        has_more = len(rows) > self.page_size_value
+        rows = rows[: self.page_size_value]
+        if reverse:
+            rows.reverse()
+
+        self.next_position = self.previous_position = None
+        if rows:
+            if has_more or reverse:
+                self.next_position = self._position(rows[-1])
+            if position is not None and (has_more or not reverse):
+                self.previous_position = self._position(rows[0])
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.encode_cursor(self.next_position, reverse=False),
+            "previous": self.encode_cursor(self.previous_position, reverse=True),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def _position(self, instance):
+        return [getattr(instance, field.lstrip("-")) for field in self.ordering_fields]
+
+    def _after(self, queryset, ordering, position):
+        """(a, b, c) > (x, y, z) rozpisane na OR-y, z kierunkiem per pole."""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip("-")
+            value = _output_field(queryset, name).to_python(value)
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def encode_cursor(self, position, reverse):
+        if position is None:
+            return None
+        payload = json.dumps({"p": position, "r": int(reverse)}, default=_encode_value)
+        token = urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            payload = json.loads(urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode())
+            position = payload["p"]
+            reverse = bool(payload.get("r"))
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering_fields):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+
+def _encode_value(value):
+    # Pełna precyzja (z mikrosekundami), inaczej kursor po created_at gubiłby wiersze.
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _flip(field):
+    return field[1:] if field.startswith("-") else f"-{field}"
+
+
+def _output_field(queryset, name):
+    if name in queryset.query.annotations:
+        return queryset.query.annotations[name].output_field
+    if name == "pk":
+        return queryset.model._meta.pk
+    return queryset.model._meta.get_field(name)
+
+
+class PlayerRankingPagination(KeysetPagination):
+    ordering = ("-average_rating", "-id")
+    page_size = 50
+    max_page_size = 200
+
+
+class CommentCursorPagination(KeysetPagination):
+    ordering = ("-created_at", "-id")
+    page_size = 20
+    max_page_size = 100
+
+
+class FixtureCursorPagination(KeysetPagination):
+    ordering = ("kickoff_at", "id")
+    page_size = 24
+    max_page_size = 100
+
+
+class RankRangePagination(BasePagination):
+    """
+    Paginacja po kolumnie z gotową pozycją w rankingu (1..n bez luk).
+
+    Strona N to zakres pozycji WHERE rank BETWEEN a AND b na indeksie
+    (zakres, pozycja), a liczba wyników to najwyższa pozycja - bez OFFSET
+    i bez COUNT(*). Widok podaje kolumnę metodą get_rank_field().
+    """
+
+    page_size = 50
+    max_page_size = 200
+    page_query_param = "page"
+    page_size_query_param = "page_size"
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            size = self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        rank_field = view.get_rank_field()
+        self.page_size_value = self.get_page_size(request)
+        try:
+            self.page = max(int(request.query_params.get(self.page_query_param, 1)), 1)
+        except (TypeError, ValueError):
+            raise NotFound("Nieprawidłowy numer strony.")
+        self.count = queryset.aggregate(size=Max(rank_field))["size"] or 0
+        first = (self.page - 1) * self.page_size_value + 1
+        last = first + self.page_size_value - 1
+        return list(
+            queryset.filter(**{f"{rank_field}__gte": first, f"{rank_field}__lte": last}).order_by(rank_field)
+        )
+
+    def get_next_link(self):
+        if self.page * self.page_size_value >= self.count:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.page + 1)
+
+    def get_previous_link(self):
+        if self.page == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page - 1)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "count": self.count,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
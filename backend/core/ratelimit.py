@@ -0,0 +1,157 @@
+"""
+Cache-backed rate limiting shared by the write endpoints.
+
+Each policy is a token bucket: ``limit`` tokens refilled evenly over ``window``
+seconds. The bucket state lives in the Django cache, so checking a limit costs
+no database round trip. Policies can be overridden with settings.RATE_LIMITS.
+"""
+
+import math
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from .voter import get_voter_token
+
+DEFAULT_RATE_LIMITS = {
+    "player_rating": {
+        "limit": 1,
+        "window": 60,
+        "message": "Możesz oceniać tylko raz na minutę",
+    },
+    "comment": {
+        "limit": 1,
+        "window": 60,
+        "message": "Możesz komentować tylko raz na minutę",
+    },
+    "fixture_rating": {
+        "limit": 60,
+        "window": 60,
+        "message": "Za dużo ocen w krótkim czasie. Spróbuj ponownie za chwilę.",
+    },
+}
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    name: str
+    limit: int
+    window: int
+    message: str
+
+    @property
+    def refill_rate(self) -> float:
+        return self.limit / self.window
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    policy: RateLimitPolicy
+    allowed: bool
+    remaining: int
+    retry_after: int
+    reset: int
+
+    @property
+    def headers(self):
+        headers = {
+            "X-RateLimit-Limit": str(self.policy.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(self.reset),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after)
+        return headers
+
+
+def get_rate_limit_policy(name: str) -> RateLimitPolicy:
+    config = {**DEFAULT_RATE_LIMITS.get(name, {}), **getattr(settings, "RATE_LIMITS", {}).get(name, {})}
+    if not config:
+        raise KeyError(f"Unknown rate limit policy: {name}")
+    return RateLimitPolicy(
+        name=name,
+        limit=int(config["limit"]),
+        window=int(config["window"]),
+        message=config.get("message", "Too many requests."),
+    )
+
+
+def consume(policy: RateLimitPolicy, identity: str, now: Optional[float] = None) -> RateLimitResult:
+    """
+    Takes one token from the identity's bucket, if available.
+
+    Read-modify-write on the cache is not atomic; under a race a client may
+    get a request or two past the limit, which is acceptable for throttling.
+    """
+    now = time.time() if now is None else now
+    key = f"ratelimit:{policy.name}:{identity}"
+    tokens, updated_at = cache.get(key) or (float(policy.limit), now)
+    tokens = min(float(policy.limit), tokens + max(now - updated_at, 0) * policy.refill_rate)
+
+    # Tolerate float drift so a bucket refilled for exactly one token counts as full.
+    allowed = tokens >= 1 - 1e-9
+    if allowed:
+        tokens = max(tokens - 1, 0.0)
+    # An untouched bucket is full again after one window, so it may expire then.
+    cache.set(key, (tokens, now), timeout=policy.window)
+
+    missing = max(policy.limit - tokens, 0.0)
+    return RateLimitResult(
+        policy=policy,
+        allowed=allowed,
+        remaining=int(tokens + 1e-9),
+        retry_after=0 if allowed else math.ceil((1 - tokens) / policy.refill_rate - 1e-9),
+        reset=max(math.ceil(missing / policy.refill_rate - 1e-9), 0),
+    )
+
+
+def client_ip(request) -> str:
+    """
+    The client address as seen by the outermost trusted proxy.
+
+    X-Forwarded-For is client-controlled except for the entries appended by our
+    own proxies, so with settings.RATE_LIMIT_TRUSTED_PROXIES = N the address is
+    the N-th entry from the right; with 0 the header is ignored.
+    """
+    trusted_proxies = getattr(settings, "RATE_LIMIT_TRUSTED_PROXIES", 0)
+    forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
+    if trusted_proxies and forwarded_for:
+        addresses = [address.strip() for address in forwarded_for.split(",") if address.strip()]
+        if addresses:
+            return addresses[-min(trusted_proxies, len(addresses))]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def rate_limit_identity(request) -> str:
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    # Anonimowych rozpoznajemy po podpisanym tokenie, nie po surowym ciasteczku sesji,
+    # którego wartość klient może dowolnie zmieniać.
+    voter_token = get_voter_token(request)
+    if voter_token:
+        return f"voter:{voter_token}"
+    return f"ip:{client_ip(request)}"
+
+
+def check_rate_limit(request, policy_name: str) -> RateLimitResult:
+    return consume(get_rate_limit_policy(policy_name), rate_limit_identity(request))
+
+
+def rate_limited_response(result: RateLimitResult) -> Response:
+    return Response(
+        {"detail": result.policy.message},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={"X-Error-Type": "throttled", **result.headers},
+    )
+
+
+def with_rate_limit_headers(response, result: RateLimitResult):
+    for header, value in result.headers.items():
+        response[header] = value
+    return response
@@ -0,0 +1,375 @@
+"""
+Versioned response cache for public read endpoints.
+
+Every cached response is keyed by its path, its query string and the current
+version of each piece of data it depends on. There are two kinds of versions:
+
+- one per list (``players``, ``ratings``, ...), for responses that span many
+  rows: lists, rankings, search, widgets;
+- one per entity (``entity_key(PLAYER, 42)``), for the detail response of a
+  single player, club or fixture.
+
+Writes never delete cache entries; they bump the versions of what they touch,
+so every key built afterwards is new and stale entries simply age out of the
+cache. A vote on one player bumps that player and the lists it appears in,
+but leaves the cached detail of every other player, club and fixture alone.
+Versions are bumped from ``post_save``/``post_delete`` signals (see
+INVALIDATING_MODELS) and explicitly by the code paths that write with
+``bulk_create``/``bulk_update``/``QuerySet.update()``, which send no signals.
+
+Versions live in the Django cache, so the response cache is only correct with
+a backend shared by all processes (Redis, Memcached): a bump made by one
+worker must be seen by the others. RESPONSE_CACHE_ENABLED defaults to off on
+a process-local backend, and turning it on there is refused at startup.
+
+Only anonymous GET responses are cached: authenticated ones carry per-user
+fields such as ``user_rating``. Conditional GET does not depend on the body
+cache. On a shared backend every GET, anonymous or not, gets a strong ETag
+and a Last-Modified header derived from the same versions, so a conditional
+request for unchanged data is answered with 304 before the view runs any
+query or serializer. On a process-local backend the versions cannot be
+trusted, so the ETag is a digest of the representation itself: the view
+still runs, but an unchanged response goes out as an empty 304.
+"""
+
+import hashlib
+import json
+import secrets
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+# Lists.
+PLAYERS = "players"
+CLUBS = "clubs"
+RATINGS = "ratings"
+COMMENTS = "comments"
+MEDIA = "media"
+FIXTURES = "fixtures"
+
+# Entities with a detail endpoint, and the model each is looked up in.
+PLAYER = "player"
+CLUB = "club"
+FIXTURE = "fixture"
+ENTITY_MODELS = {
+    PLAYER: "players.Player",
+    CLUB: "clubs.Club",
+    FIXTURE: "matches.Fixture",
+}
+
+VERSION_KEY = "response_cache:version:{}"
+SLUG_KEY = "response_cache:slug:{}:{}"
+RESPONSE_KEY = "response_cache:{}:{}"
+
+# Backends whose data is private to one process.
+PROCESS_LOCAL_CACHE_BACKENDS = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+def entity_key(kind, pk):
+    return f"{kind}:{pk}"
+
+
+def entity_keys(kind, pks):
+    return [entity_key(kind, pk) for pk in pks if pk is not None]
+
+
+def _new_version():
+    # (time of the change, random tag): a version restarted after eviction
+    # can never repeat an old one, so keys built from it cannot come back.
+    return int(time.time()), secrets.token_hex(8)
+
+
+def get_versions(keys):
+    """
+    Returns the versions of ``keys`` and the Unix time of the most recent
+    change among them, read with a single cache round trip.
+    """
+    cache_keys = [VERSION_KEY.format(key) for key in keys]
+    values = cache.get_many(cache_keys)
+    missing = [key for key in cache_keys if key not in values]
+    if missing:
+        for key in missing:
+            cache.add(key, _new_version(), timeout=None)
+        values.update(cache.get_many(missing))
+    stored = [values.get(key) or _new_version() for key in cache_keys]
+    return tuple(tag for _, tag in stored), max(modified for modified, _ in stored)
+
+
+def _store_versions(keys):
+    version = _new_version()
+    cache.set_many({VERSION_KEY.format(key): version for key in keys}, timeout=None)
+
+
+def bump_versions(*keys):
+    """
+    Invalidates every cached response depending on any of ``keys`` (lists
+    and/or ``entity_key(...)``).
+
+    The versions are bumped right away and once more after the surrounding
+    transaction commits, so a response rendered from not yet committed data
+    by a concurrent reader is not served past the commit.
+    """
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return
+    _store_versions(keys)
+    transaction.on_commit(lambda: _store_versions(keys))
+
+
+def forget_slug(kind, slug):
+    """Drops the cached slug -> id mapping, e.g. when the slug may have moved to another row."""
+    if slug:
+        cache.delete(SLUG_KEY.format(kind, slug))
+
+
+def resolve_entity(kind, lookup):
+    """
+    The id of the entity a detail URL points at (by id or by slug), or None
+    when there is no such entity. Slugs are resolved once and remembered.
+    """
+    lookup = str(lookup)
+    if lookup.isdigit():
+        return int(lookup)
+    model = apps.get_model(ENTITY_MODELS[kind])
+    if not any(field.name == "slug" for field in model._meta.concrete_fields):
+        return None
+    key = SLUG_KEY.format(kind, lookup)
+    pk = cache.get(key)
+    if pk is None:
+        pk = model.objects.filter(slug=lookup).values_list("pk", flat=True).first()
+        if pk is not None:
+            cache.set(key, pk, timeout=getattr(settings, "RESPONSE_CACHE_TIMEOUT", 60 * 60))
+    return pk
+
+
+def response_cache_enabled():
+    return getattr(settings, "RESPONSE_CACHE_ENABLED", False)
+
+
+def shared_cache_backend():
+    return settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_CACHE_BACKENDS
+
+
+def check_cache_backend():
+    """Refuses to run the response cache on a cache that other processes cannot see."""
+    backend = settings.CACHES["default"]["BACKEND"]
+    if response_cache_enabled() and not shared_cache_backend():
+        raise ImproperlyConfigured(
+            f"RESPONSE_CACHE_ENABLED requires a cache shared by all processes (Redis, Memcached), not {backend}."
+        )
+
+
+def _request_digest(request):
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    return hashlib.md5(f"{request.path}?{query}".encode()).hexdigest()
+
+
+def _etag(digest, versions, user):
+    # Authenticated responses differ per user, so the user is part of the tag.
+    owner = user.pk if user.is_authenticated else ""
+    raw = ":".join([digest, str(owner), *(str(version) for version in versions)])
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def _with_validators(response, etag, last_modified=None):
+    if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+    patch_vary_headers(response, ("Authorization",))
+    return response
+
+
+def _representation_validators(request, response):
+    """ETag from the response data itself, for when the versions are not shared between processes."""
+    if response.status_code != status.HTTP_200_OK:
+        return response
+    body = json.dumps(response.data, sort_keys=True, default=str)
+    etag = _etag(_request_digest(request), (hashlib.md5(body.encode()).hexdigest(),), request.user)
+    not_modified = get_conditional_response(request, etag=etag)
+    return _with_validators(not_modified if not_modified is not None else response, etag)
+
+
+def cache_response(*kinds, entity=None, timeout=None):
+    """
+    Serves GET requests of a DRF view from the versions of the lists in
+    ``kinds`` and, for a detail view, of its entity: ``entity=(PLAYER, "pk")``
+    names the entity kind and the URL kwarg holding its id or slug. The ETag
+    and Last-Modified of such a view come from that entity's version alone,
+    so writes to other entities leave them unchanged. Answers matching
+    If-None-Match/If-Modified-Since with 304 and, when RESPONSE_CACHE_ENABLED,
+    caches anonymous 200 responses until one of those versions changes. ``timeout`` is only
+    needed by views whose output also depends on the clock (e.g. "upcoming"
+    fixtures); by default settings.RESPONSE_CACHE_TIMEOUT bounds how long
+    unused entries are kept.
+
+    Works on function views; wrap it in ``method_decorator`` for view methods.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped(request, *args, **kwargs):
+            if request.method != "GET":
+                return view_func(request, *args, **kwargs)
+            if not response_cache_enabled() and not shared_cache_backend():
+                return _representation_validators(request, view_func(request, *args, **kwargs))
+
+            keys = list(kinds)
+            if entity is not None:
+                entity_kind, url_kwarg = entity
+                pk = resolve_entity(entity_kind, kwargs[url_kwarg])
+                if pk is None:
+                    # Nie ma takiego obiektu: widok odpowie 404, nie ma czego cache'ować.
+                    return view_func(request, *args, **kwargs)
+                keys.append(entity_key(entity_kind, pk))
+
+            digest = _request_digest(request)
+            versions, last_modified = get_versions(keys)
+            if timeout is not None:
+                # Clock-dependent output: the time window acts as one more version.
+                window = int(time.time()) // timeout * timeout
+                versions += (window,)
+                last_modified = max(last_modified, window)
+            etag = _etag(digest, versions, request.user)
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                return _with_validators(not_modified, etag, last_modified)
+
+            if request.user.is_authenticated or not response_cache_enabled():
+                response = view_func(request, *args, **kwargs)
+            else:
+                key = RESPONSE_KEY.format(digest, ":".join(str(version) for version in versions))
+                data = cache.get(key)
+                if data is not None:
+                    response = Response(data)
+                else:
+                    response = view_func(request, *args, **kwargs)
+                    if response.status_code == status.HTTP_200_OK:
+                        cache.set(
+                            key,
+                            response.data,
+                            timeout if timeout is not None else getattr(settings, "RESPONSE_CACHE_TIMEOUT", 60 * 60),
+                        )
+            return _with_validators(response, etag, last_modified)
+
+        return wrapped
+
+    return decorator
+
+
+def _fixture_ids_of_player(player_id):
+    from matches.models import FixturePlayer
+
+    return FixturePlayer.objects.filter(player_id=player_id).values_list("fixture_id", flat=True).distinct()
+
+
+def _player_keys(instance, update_fields=None, **kwargs):
+    from players.models import Player
+
+    keys = [PLAYERS, entity_key(PLAYER, instance.pk)]
+    if update_fields is not None and set(update_fields) <= set(Player.RATING_AGGREGATE_FIELDS):
+        # Odświeżenie samych agregatów ocen widać tylko na piłkarzu i listach.
+        return keys
+    forget_slug(PLAYER, instance.slug)
+    # Klub pokazuje skład, a mecz nazwiska z kadry.
+    keys += entity_keys(CLUB, {instance.club_id, getattr(instance, "_response_cache_club_id", None)})
+    keys += entity_keys(FIXTURE, _fixture_ids_of_player(instance.pk))
+    return keys
+
+
+def _remember_player_club(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Przeniesienie do innego klubu zmienia też skład poprzedniego klubu.
+    if raw or instance.pk is None or (update_fields is not None and "club" not in update_fields):
+        return
+    instance._response_cache_club_id = (
+        sender.objects.filter(pk=instance.pk).values_list("club_id", flat=True).first()
+    )
+
+
+def _club_keys(instance, **kwargs):
+    from matches.models import Fixture
+    from players.models import Player
+
+    # Nazwa klubu jest w szczegółach jego piłkarzy i meczów.
+    player_ids = Player.objects.filter(club_id=instance.pk).values_list("id", flat=True)
+    fixture_ids = Fixture.objects.filter(Q(home_club_id=instance.pk) | Q(away_club_id=instance.pk)).values_list(
+        "id", flat=True
+    )
+    return [
+        CLUBS, PLAYERS, FIXTURES, entity_key(CLUB, instance.pk),
+        *entity_keys(PLAYER, player_ids), *entity_keys(FIXTURE, fixture_ids),
+    ]
+
+
+def _fixture_keys(instance, **kwargs):
+    forget_slug(FIXTURE, instance.slug)
+    return [FIXTURES, entity_key(FIXTURE, instance.pk)]
+
+
+# Keys bumped whenever a row of the model is saved or deleted.
+INVALIDATING_MODELS = {
+    "players.Player": _player_keys,
+    "players.PlayerMedia": lambda instance, **kwargs: [MEDIA, entity_key(PLAYER, instance.player_id)],
+    "matches.PlayerAlias": lambda instance, **kwargs: [PLAYERS, entity_key(PLAYER, instance.player_id)],
+    "clubs.Club": _club_keys,
+    "ratings.Rating": lambda instance, **kwargs: [RATINGS, entity_key(PLAYER, instance.player_id)],
+    "comments.Comment": lambda instance, **kwargs: [COMMENTS, entity_key(PLAYER, instance.player_id)],
+    "matches.Fixture": _fixture_keys,
+    "matches.FixturePlayer": lambda instance, **kwargs: [FIXTURES, entity_key(FIXTURE, instance.fixture_id)],
+    "matches.FixtureRating": lambda instance, **kwargs: [
+        RATINGS, FIXTURES, entity_key(FIXTURE, instance.fixture_id), *entity_keys(PLAYER, [instance.player_id]),
+    ],
+}
+
+
+def _bump_for_model(keys_for):
+    def receiver(sender, instance, raw=False, **kwargs):
+        if not raw:
+            bump_versions(*keys_for(instance, **kwargs))
+
+    return receiver
+
+
+def _bump_for_comment_likes(sender, instance, action, reverse, pk_set, **kwargs):
+    from comments.models import Comment
+
+    if action not in {"post_add", "post_remove", "post_clear"}:
+        return
+    if reverse:
+        # user.liked_comments.add(...): instancja to użytkownik, komentarze w pk_set.
+        player_ids = set(Comment.objects.filter(pk__in=pk_set or ()).values_list("player_id", flat=True))
+    else:
+        player_ids = {instance.player_id}
+    bump_versions(COMMENTS, *entity_keys(PLAYER, player_ids))
+
+
+def connect_signals():
+    from comments.models import Comment
+
+    check_cache_backend()
+    for label, keys_for in INVALIDATING_MODELS.items():
+        receiver = _bump_for_model(keys_for)
+        uid = f"response_cache:{label}"
+        post_save.connect(receiver, sender=label, weak=False, dispatch_uid=uid)
+        post_delete.connect(receiver, sender=label, weak=False, dispatch_uid=uid)
+    pre_save.connect(_remember_player_club, sender="players.Player", dispatch_uid="response_cache:players.Player:club")
+    m2m_changed.connect(
+        _bump_for_comment_likes,
+        sender=Comment.likes.through,
+        dispatch_uid="response_cache:comments.Comment.likes",
+    )
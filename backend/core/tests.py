@@ -1,7 +1,16 @@
 
+from unittest import mock
+
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.contrib.sessions.backends.db import SessionStore
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from clubs.models import Club
+from players.models import Player
+from .ratelimit import client_ip, consume, get_rate_limit_policy
+from .voter import get_voter_token
 
 class RegistrationTestCase(APITestCase):
     def test_register_user(self):
@@ -36,3 +45,547 @@ class LoginTestCase(APITestCase):
 
         self.assertEqual(response.status_code, 200)
         self.assertTrue(response.data['is_staff'])
+
+
+class TokenBucketRateLimitTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(RATE_LIMITS={"fixture_rating": {"limit": 2, "window": 60}})
+    def test_bucket_refills_evenly_over_window(self):
+        policy = get_rate_limit_policy("fixture_rating")
+
+        self.assertEqual(consume(policy, "ip:1", now=1000).remaining, 1)
+        self.assertTrue(consume(policy, "ip:1", now=1000).allowed)
+        denied = consume(policy, "ip:1", now=1010)
+        self.assertFalse(denied.allowed)
+        self.assertEqual(denied.retry_after, 20)
+        self.assertEqual(denied.headers["Retry-After"], "20")
+        self.assertTrue(consume(policy, "ip:1", now=1030).allowed)
+        self.assertTrue(consume(policy, "ip:2", now=1030).allowed)
+
+    def test_client_ip_ignores_forwarded_for_without_trusted_proxies(self):
+        request = RequestFactory().get("/", HTTP_X_FORWARDED_FOR="1.1.1.1, 10.0.0.2", REMOTE_ADDR="10.0.0.1")
+
+        self.assertEqual(client_ip(request), "10.0.0.1")
+        with override_settings(RATE_LIMIT_TRUSTED_PROXIES=1):
+            self.assertEqual(client_ip(request), "10.0.0.2")
+        with override_settings(RATE_LIMIT_TRUSTED_PROXIES=2):
+            self.assertEqual(client_ip(request), "1.1.1.1")
+
+
+class CommentRateLimitApiTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        club = Club.objects.create(name="Test Club", city="Test City")
+        self.player = Player.objects.create(name="Test Player", position="FW", club=club, nationality="PL")
+        self.user = User.objects.create_user(username="fan", password="tajnehaslo")
+        self.client.force_authenticate(user=self.user)
+
+    def test_second_comment_within_window_is_throttled_with_quota_headers(self):
+        url = reverse('player-comment', args=[self.player.id])
+        first = self.client.post(url, {'content': 'Pierwszy'}, format='json')
+        second = self.client.post(url, {'content': 'Drugi'}, format='json')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['X-RateLimit-Remaining'], '0')
+        self.assertEqual(second.status_code, 429)
+        self.assertEqual(second['X-Error-Type'], 'throttled')
+        self.assertEqual(second['Retry-After'], '60')
+
+    def test_invalid_comment_does_not_use_the_limit(self):
+        url = reverse('player-comment', args=[self.player.id])
+        invalid = self.client.post(url, {'content': ''}, format='json')
+        valid = self.client.post(url, {'content': 'Pierwszy'}, format='json')
+
+        self.assertEqual(invalid.status_code, 400)
+        self.assertEqual(valid.status_code, 200)
+
+
+class VoterTokenTest(TestCase):
+    def request_with_session(self, session_key):
+        request = RequestFactory().get("/")
+        request.session = SessionStore(session_key)
+        return request
+
+    def test_session_key_counts_only_for_an_existing_session(self):
+        session = SessionStore()
+        session.create()
+
+        self.assertEqual(get_voter_token(self.request_with_session(session.session_key)), session.session_key)
+        self.assertEqual(get_voter_token(self.request_with_session("forged-session-key")), "")
+
+
+class WeeklyDramasApiTest(APITestCase):
+    def test_weekly_dramas_uses_rating_rollups(self):
+        from ratings.models import Rating
+
+        club = Club.objects.create(name="Test Club", city="Test City")
+        player = Player.objects.create(name="Dramat", position="FW", club=club, nationality="PL")
+        for index, value in enumerate((2, 3)):
+            user = User.objects.create_user(username=f"fan{index}", password="tajnehaslo")
+            Rating.objects.create(player=player, user=user, value=value)
+
+        response = self.client.get(reverse('weekly_dramas'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['items'][0]['id'], player.id)
+        self.assertEqual(response.data['items'][0]['average_rating'], 2.5)
+        self.assertEqual(response.data['items'][0]['total_ratings'], 2)
+
+    @override_settings(TIME_ZONE="Asia/Kolkata")
+    def test_week_bounds_in_a_half_hour_offset_time_zone(self):
+        from ratings.models import Rating
+
+        club = Club.objects.create(name="Test Club", city="Test City")
+        player = Player.objects.create(name="Dramat", position="FW", club=club, nationality="PL")
+        user = User.objects.create_user(username="fan", password="tajnehaslo")
+        Rating.objects.create(player=player, user=user, value=4)
+
+        response = self.client.get(reverse('weekly_dramas'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['items'][0]['total_ratings'], 1)
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=True)
+class ResponseCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.club = club = Club.objects.create(name="Test Club", city="Test City")
+        self.player = Player.objects.create(name="Test Player", position="FW", club=club, nationality="PL")
+        self.user = User.objects.create_user(username="fan", password="tajnehaslo")
+
+    def test_anonymous_reads_are_served_from_cache_until_data_changes(self):
+        from ratings.models import Rating
+
+        url = reverse('player-detail', args=[self.player.id])
+        self.assertEqual(self.client.get(url).data['total_ratings'], 0)
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+        self.assertEqual(cached.data['total_ratings'], 0)
+
+        Rating.objects.create(player=self.player, user=self.user, value=8)
+
+        fresh = self.client.get(url)
+        self.assertEqual(fresh.data['total_ratings'], 1)
+        self.assertEqual(fresh.data['average_rating'], 8.0)
+
+    def test_write_to_another_player_keeps_detail_cached(self):
+        from ratings.models import Rating
+
+        other = Player.objects.create(name="Other Player", position="DF", club=self.club, nationality="PL")
+        url = reverse('player-detail', args=[self.player.id])
+        self.client.get(url)
+
+        Rating.objects.create(player=other, user=self.user, value=8)
+
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        self.client.get(reverse('player-list'))
+        Rating.objects.create(player=self.player, user=self.user, value=6)
+        self.assertEqual(self.client.get(url).data['total_ratings'], 1)
+
+    def test_club_detail_follows_its_players(self):
+        url = reverse('club-detail', args=[self.club.id])
+        self.client.get(url)
+
+        self.player.name = "Renamed Player"
+        self.player.save()
+
+        names = [player['name'] for player in self.client.get(url).data['players']]
+        self.assertEqual(names, ["Renamed Player"])
+
+    def test_query_params_are_part_of_the_key(self):
+        url = reverse('player-list')
+        self.client.get(url, {'fields': 'id,name'})
+        response = self.client.get(url, {'fields': 'id'})
+
+        self.assertEqual(list(response.data['results'][0]), ['id'])
+
+    def test_authenticated_reads_bypass_cache(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        url = reverse('player-detail', args=[self.player.id])
+        self.client.get(url)
+        self.client.force_authenticate(user=self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(queries), 0)
+
+    def test_matching_etag_is_answered_with_304_without_queries(self):
+        from ratings.models import Rating
+
+        url = reverse('player-detail', args=[self.player.id])
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], etag)
+
+        Rating.objects.create(player=self.player, user=self.user, value=8)
+
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+    def test_detail_etag_survives_writes_to_other_entities(self):
+        from ratings.models import Rating
+
+        other = Player.objects.create(name="Other Player", position="DF", club=self.club, nationality="PL")
+        url = reverse('player-detail', args=[self.player.id])
+        etag = self.client.get(url)['ETag']
+
+        Rating.objects.create(player=other, user=self.user, value=8)
+        Club.objects.create(name="Another Club", city="Elsewhere")
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Rating.objects.create(player=self.player, user=self.user, value=6)
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_differs_per_user(self):
+        url = reverse('club-list')
+        anonymous = self.client.get(url)
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=anonymous['ETag'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class ConditionalGetWithoutResponseCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        club = Club.objects.create(name="Test Club", city="Test City")
+        self.player = Player.objects.create(name="Test Player", position="FW", club=club, nationality="PL")
+        self.user = User.objects.create_user(username="fan", password="tajnehaslo")
+
+    def test_unchanged_detail_is_answered_with_304(self):
+        from ratings.models import Rating
+
+        url = reverse('player-detail', args=[self.player.id])
+        etag = self.client.get(url)['ETag']
+
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], etag)
+
+        Rating.objects.create(player=self.player, user=self.user, value=8)
+
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.data['total_ratings'], 1)
+
+
+class ResponseCacheBackendTest(SimpleTestCase):
+    @override_settings(RESPONSE_CACHE_ENABLED=True)
+    def test_process_local_cache_is_refused(self):
+        from django.core.exceptions import ImproperlyConfigured
+
+        from .response_cache import check_cache_backend
+
+        with self.assertRaises(ImproperlyConfigured):
+            check_cache_backend()
+
+    @override_settings(
+        RESPONSE_CACHE_ENABLED=True,
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://cache"}},
+    )
+    def test_shared_cache_is_accepted(self):
+        from .response_cache import check_cache_backend
+
+        check_cache_backend()
+
+
+class PersonalizationOverlayTest(APITestCase):
+    def setUp(self):
+        from comments.models import Comment
+
+        club = Club.objects.create(name="Test Club", city="Test City")
+        self.player = Player.objects.create(name="Test Player", position="FW", club=club, nationality="PL")
+        self.other = Player.objects.create(name="Other Player", position="DF", club=club, nationality="PL")
+        self.user = User.objects.create_user(username="fan", password="tajnehaslo")
+        self.liked = Comment.objects.create(player=self.player, user=self.user, content="Liked")
+        self.ignored = Comment.objects.create(player=self.player, user=self.user, content="Ignored")
+        self.liked.likes.add(self.user)
+        self.url = reverse('personalization_overlay')
+
+    def test_returns_latest_ratings_and_likes_in_one_query(self):
+        from ratings.models import Rating
+
+        Rating.objects.create(player=self.player, user=self.user, value=4)
+        latest = Rating.objects.create(player=self.player, user=self.user, value=9)
+        self.client.force_authenticate(user=self.user)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {
+                'players': f'{self.player.id},{self.other.id}',
+                'comments': f'{self.liked.id},{self.ignored.id}',
+            })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data['ratings']), [str(self.player.id)])
+        self.assertEqual(response.data['ratings'][str(self.player.id)]['id'], latest.id)
+        self.assertEqual(response.data['ratings'][str(self.player.id)]['value'], 9)
+        self.assertEqual(response.data['liked_comments'], [self.liked.id])
+
+    def test_requires_authentication_and_valid_ids(self):
+        self.assertEqual(self.client.get(self.url, {'players': '1'}).status_code, 401)
+
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(self.url, {'players': '1,x'}).status_code, 400)
+        with self.assertNumQueries(0):
+            empty = self.client.get(self.url)
+        self.assertEqual(empty.data, {'ratings': {}, 'liked_comments': []})
+
+
+class GeminiModelRegistryTest(SimpleTestCase):
+    def setUp(self):
+        from google.api_core import exceptions as google_exceptions
+
+        from .ai import GeminiModelRegistry
+
+        self.now = 0.0
+        self.quota_error = google_exceptions.ResourceExhausted("quota")
+        self.registry = GeminiModelRegistry(
+            ["models/first", "models/second"], failure_threshold=2, cooldown=60, clock=lambda: self.now
+        )
+        genai_patcher = mock.patch("core.ai.genai")
+        self.genai = genai_patcher.start()
+        self.addCleanup(genai_patcher.stop)
+        self.genai.list_models.return_value = [
+            mock.Mock(supported_generation_methods=["generateContent"]) for _ in range(2)
+        ]
+        self.genai.list_models.return_value[0].name = "models/first"
+        self.genai.list_models.return_value[1].name = "models/second"
+        env_patcher = mock.patch.dict("os.environ", {"GEMINI_API_KEY": "test-key"})
+        env_patcher.start()
+        self.addCleanup(env_patcher.stop)
+
+    def test_models_are_resolved_once_and_clients_reused(self):
+        self.assertEqual(self.registry.models(), ["models/first", "models/second"])
+        self.assertEqual(self.registry.models(), ["models/first", "models/second"])
+        self.assertIs(self.registry.client("models/first"), self.registry.client("models/first"))
+
+        self.genai.configure.assert_called_once()
+        self.genai.list_models.assert_called_once()
+        self.genai.GenerativeModel.assert_called_once_with("models/first")
+
+    def test_failing_model_is_skipped_until_cooldown_ends(self):
+        self.registry.record_failure("models/first", RuntimeError("timeout"))
+        self.assertEqual(self.registry.models(), ["models/first", "models/second"])
+        self.registry.record_failure("models/first", RuntimeError("timeout"))
+        self.assertEqual(self.registry.models(), ["models/second"])
+
+        self.now = 61
+        self.assertEqual(self.registry.models(), ["models/first", "models/second"])
+        self.registry.record_success("models/first")
+        self.registry.record_failure("models/first", RuntimeError("timeout"))
+        self.assertEqual(self.registry.models(), ["models/first", "models/second"])
+
+    def test_quota_error_opens_the_breaker_at_once(self):
+        from .ai import GeminiBackend
+
+        backend = GeminiBackend()
+        backend.registry = self.registry
+        first, second = mock.Mock(), mock.Mock()
+        first.generate_content.side_effect = self.quota_error
+        second.generate_content.return_value = mock.Mock(text="Riposta")
+        self.genai.GenerativeModel.side_effect = lambda name: {"models/first": first, "models/second": second}[name]
+
+        with mock.patch("core.ai.log_ai_attempt") as log_attempt:
+            self.assertEqual(backend.generate("prompt"), "Riposta")
+            self.assertEqual(backend.generate("prompt"), "Riposta")
+
+        self.assertEqual(first.generate_content.call_count, 1)
+        self.assertEqual(second.generate_content.call_count, 2)
+        self.assertEqual(
+            [(call.args[0], call.kwargs["ok"]) for call in log_attempt.call_args_list],
+            [("models/first", False), ("models/second", True), ("models/second", True)],
+        )
+
+    def test_blocked_response_does_not_count_toward_the_breaker(self):
+        from .ai import GeminiBackend
+
+        backend = GeminiBackend()
+        backend.registry = self.registry
+        blocked = mock.Mock()
+        type(blocked).text = mock.PropertyMock(side_effect=ValueError("response blocked by safety filters"))
+        first, second = mock.Mock(), mock.Mock()
+        first.generate_content.return_value = blocked
+        second.generate_content.return_value = mock.Mock(text="Riposta")
+        self.genai.GenerativeModel.side_effect = lambda name: {"models/first": first, "models/second": second}[name]
+
+        with mock.patch("core.ai.log_ai_attempt"):
+            for _ in range(3):
+                self.assertEqual(backend.generate("prompt"), "Riposta")
+
+        self.assertEqual(first.generate_content.call_count, 3)
+        self.assertEqual(self.registry.models(), ["models/first", "models/second"])
+
+
+@override_settings(AI_BACKEND="core.ai.FakeBackend")
+class ReplyCacheTest(SimpleTestCase):
+    def setUp(self):
+        from .ai import get_reply_cache
+
+        get_reply_cache().clear()
+        self.addCleanup(get_reply_cache().clear)
+
+    def generate(self, comment, player_id=1, user_name="fan"):
+        from .ai import generate_comment_response
+
+        return generate_comment_response(comment, "Jan Kowalski", user_name, player_id=player_id)
+
+    def test_near_identical_comments_reuse_the_reply(self):
+        with mock.patch("core.ai.FakeBackend.generate", side_effect=["Riposta 1", "Riposta 2"]) as generate:
+            self.assertEqual(self.generate("Dramat!!!"), "Riposta 1")
+            self.assertEqual(self.generate("  dramat "), "Riposta 1")
+            self.assertEqual(self.generate("Dramat", player_id=2), "Riposta 2")
+        self.assertEqual(generate.call_count, 2)
+
+    def test_different_users_share_one_generation(self):
+        with mock.patch("core.ai.FakeBackend.generate", return_value="Spokojnie, [UZYTKOWNIK]") as generate:
+            self.assertEqual(self.generate("Dramat!!"), "Spokojnie, fan")
+            self.assertEqual(self.generate("dramat", user_name="kibic"), "Spokojnie, kibic")
+        self.assertEqual(generate.call_count, 1)
+        self.assertIn("Uzytkownik: [UZYTKOWNIK]", generate.call_args.args[0])
+
+    @override_settings(AI_REPLY_CACHE_POLICY="vary", AI_REPLY_CACHE_VARIANTS=2)
+    def test_vary_policy_rotates_generated_variants(self):
+        with mock.patch("core.ai.FakeBackend.generate", side_effect=["A", "B"]) as generate:
+            replies = [self.generate("Sprzedać go") for _ in range(4)]
+        self.assertEqual(replies, ["A", "B", "A", "B"])
+        self.assertEqual(generate.call_count, 2)
+
+    @override_settings(AI_REPLY_CACHE_POLICY="off")
+    def test_off_policy_always_generates(self):
+        with mock.patch("core.ai.FakeBackend.generate", side_effect=["A", "B"]):
+            self.assertEqual([self.generate("Dramat"), self.generate("Dramat")], ["A", "B"])
+
+    def test_entries_expire_and_least_recently_used_is_evicted(self):
+        from .ai import ReplyCache
+
+        now = [0.0]
+        replies = ReplyCache(max_entries=2, ttl=10, clock=lambda: now[0])
+        replies.store("a", "A")
+        replies.store("b", "B")
+        self.assertEqual(replies.lookup("a"), "A")
+        replies.store("c", "C")
+        self.assertIsNone(replies.lookup("b"))
+        self.assertEqual(len(replies), 2)
+
+        now[0] = 10
+        self.assertIsNone(replies.lookup("a"))
+
+
+@override_settings(AI_BACKEND="core.ai.FakeBackend", AI_REPLY_CACHE_POLICY="off")
+class BatchReplyGenerationTest(SimpleTestCase):
+    def requests(self, *comments):
+        from .ai import ReplyRequest
+
+        return [ReplyRequest(comment, "Jan Kowalski", "fan", ("Wcześniej",), player_id=1) for comment in comments]
+
+    def test_batches_are_packed_into_one_call_each(self):
+        from .ai import FakeBackend, generate_comment_responses
+
+        with mock.patch.object(FakeBackend, "generate", autospec=True, side_effect=FakeBackend.generate) as generate:
+            replies = generate_comment_responses(self.requests("Dramat", "Sprzedać go", "Legenda"), batch_size=2)
+            again = generate_comment_responses(self.requests("Dramat", "Sprzedać go", "Legenda"), batch_size=2)
+
+        self.assertEqual(generate.call_count, 4)
+        self.assertEqual(replies, again)
+        self.assertEqual(len(set(replies)), 3)
+        self.assertTrue(all(reply.startswith("Spokojnie") for reply in replies))
+        self.assertIn('"komentarz": "Sprzedać go"', generate.call_args_list[0].args[1])
+
+    def test_missing_and_malformed_items_fail_individually(self):
+        from .ai import AIGenerationError, generate_comment_responses, parse_batch_response
+
+        answer = '```json\n[{"id": 2, "odpowiedz": "AI: Druga"}, {"id": "x"}, "smieci"]\n```'
+        self.assertEqual(parse_batch_response(answer), {2: "Druga"})
+        self.assertEqual(parse_batch_response("nie JSON"), {})
+
+        with mock.patch("core.ai.FakeBackend.generate", return_value=answer):
+            first, second = generate_comment_responses(self.requests("Dramat", "Legenda"))
+        self.assertIsInstance(first, AIGenerationError)
+        self.assertEqual(second, "Druga")
+
+    @override_settings(AI_REPLY_CACHE_POLICY="reuse")
+    def test_repeated_comment_is_generated_once(self):
+        from .ai import generate_comment_responses, get_reply_cache
+
+        get_reply_cache().clear()
+        self.addCleanup(get_reply_cache().clear)
+        with mock.patch("core.ai.FakeBackend.generate", return_value="Riposta") as generate:
+            replies = generate_comment_responses(self.requests("Dramat!", "dramat"))
+        self.assertEqual(replies, ["Riposta", "Riposta"])
+        self.assertNotIn("<KOMENTARZE>", generate.call_args.args[0])
+
+
+class AILogTest(SimpleTestCase):
+    def setUp(self):
+        import tempfile
+
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.log_dir.cleanup)
+
+    def test_records_are_written_in_the_background_and_rotated(self):
+        import json
+        import logging
+        import os
+
+        from .ai_log import JsonLineFormatter, start_queue_logging, usage_metrics
+
+        log_file = os.path.join(self.log_dir.name, "ai", "calls.log")
+        listener, handler = start_queue_logging(log_file, max_bytes=400, backup_count=2, queue_size=100)
+        test_logger = logging.getLogger("core.tests.ai_log")
+        test_logger.addHandler(handler)
+        test_logger.propagate = False
+        self.addCleanup(test_logger.removeHandler, handler)
+
+        usage = mock.Mock(prompt_token_count=120, candidates_token_count=30, total_token_count=150)
+        for attempt in range(20):
+            test_logger.warning(
+                "attempt",
+                extra={"ai": {"model": "models/first", "latency_ms": attempt, **usage_metrics(mock.Mock(usage_metadata=usage))}},
+            )
+        listener.stop()
+
+        files = sorted(os.listdir(os.path.dirname(log_file)))
+        self.assertEqual(files, ["calls.log", "calls.log.1", "calls.log.2"])
+        self.assertTrue(all(os.path.getsize(os.path.join(os.path.dirname(log_file), name)) <= 400 for name in files))
+        with open(log_file, encoding="utf-8") as f:
+            entry = json.loads(f.readlines()[-1])
+        self.assertEqual(entry["latency_ms"], 19)
+        self.assertEqual((entry["prompt_tokens"], entry["output_tokens"], entry["total_tokens"]), (120, 30, 150))
+        self.assertIsInstance(JsonLineFormatter().format(logging.makeLogRecord({"msg": "x"})), str)
+
+    def test_each_process_logs_to_its_own_file(self):
+        from django.conf import settings
+
+        from .ai_log import process_log_file
+
+        self.assertEqual(process_log_file("/var/log/ai/calls.log", pid=42), "/var/log/ai/calls.42.log")
+        self.assertEqual(process_log_file("calls", pid=7), "calls.7")
+        self.assertFalse(settings.AI_LOG_ENABLED)
+
+    def test_full_queue_drops_records_instead_of_blocking(self):
+        import logging
+        import queue
+
+        from .ai_log import DroppingQueueHandler
+
+        handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+        for _ in range(3):
+            handler.handle(logging.makeLogRecord({"msg": "attempt"}))
+        self.assertEqual(handler.dropped, 2)
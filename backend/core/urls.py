@@ -9,4 +9,5 @@ urlpatterns = [
     path('najnizsze-live/', views.live_lowest_ratings, name='live_lowest_ratings'),
     path('latest-media/', views.latest_media, name='latest_media'),
     path('latest-cards/', views.latest_cards, name='latest_cards'),
+    path('me/overlay/', views.personalization_overlay, name='personalization_overlay'),
 ]
@@ -1,5 +1,4 @@
 from datetime import datetime, timedelta, time
-from django.db.models import Avg, Count, Q
 from django.http import HttpResponse
 from django.shortcuts import render, redirect
 from django.utils import timezone
@@ -7,16 +6,18 @@ from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from django.contrib.auth.models import User
+from django.db.models import DateTimeField, F, IntegerField, Value
 from rest_framework.authtoken.models import Token
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth import authenticate
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.decorators import permission_classes
 from rest_framework.views import APIView
 from players.models import Player, PlayerMedia
-from ratings.models import Rating
-from matches.models import FixtureRating
+from players.rating_aggregates import compose_average_rating, rollup_rating_totals
 from comments.models import Comment
+from ratings.models import Rating
+from .response_cache import CLUBS, COMMENTS, MEDIA, PLAYERS, RATINGS, cache_response
 
 
 def home(request):
@@ -28,6 +29,8 @@ def home(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+# Zakres tygodnia zmienia się z upływem czasu, nie tylko po zapisie - stąd timeout.
+@cache_response(PLAYERS, CLUBS, RATINGS, COMMENTS, MEDIA, timeout=15 * 60)
 def weekly_dramas(request):
     limit = 3
     today = timezone.localdate()
@@ -37,45 +40,21 @@ def weekly_dramas(request):
     start_dt = timezone.make_aware(datetime.combine(start_of_week, time.min), tz)
     end_dt = timezone.make_aware(datetime.combine(end_of_week, time.min), tz)
 
-    ratings_stats = (
-        Rating.objects.filter(created_at__gte=start_dt, created_at__lt=end_dt)
-        .values("player_id")
-        .annotate(avg=Avg("value"), count=Count("id"))
-    )
-    fixture_stats = (
-        FixtureRating.objects.filter(created_at__gte=start_dt, created_at__lt=end_dt)
-        .values("player_id")
-        .annotate(avg=Avg("value"), count=Count("id"))
-    )
-
-    ratings_map = {item["player_id"]: item for item in ratings_stats}
-    fixture_map = {item["player_id"]: item for item in fixture_stats}
-    rated_ids = list({*ratings_map.keys(), *fixture_map.keys()})
+    # Hourly/daily rollups instead of scanning the week's raw votes.
+    weekly_totals = rollup_rating_totals(start_dt, end_dt)
+    rated_ids = list(weekly_totals.keys())
 
     rated_players = (
         Player.objects.filter(id__in=rated_ids)
-        .exclude(club__name="Loan")
+        .filter(is_public=True)
         .select_related('club')
     )
 
     items = []
 
     def combined_weekly_stats(player_id):
-        rating_data = ratings_map.get(player_id) or {}
-        fixture_data = fixture_map.get(player_id) or {}
-
-        classic_count = rating_data.get("count") or 0
-        fixture_count = fixture_data.get("count") or 0
-        total_count = classic_count + fixture_count
-
-        if total_count:
-            weighted_sum = (rating_data.get("avg") or 0) * classic_count
-            weighted_sum += (fixture_data.get("avg") or 0) * fixture_count
-            avg = round(weighted_sum / total_count, 2)
-        else:
-            avg = 0
-
-        return avg, total_count
+        total_sum, total_count = weekly_totals.get(player_id, (0, 0))
+        return compose_average_rating(total_sum, total_count), total_count
 
     def build_item(player, average_rating, total_ratings):
         latest_comment = (
@@ -138,7 +117,7 @@ def weekly_dramas(request):
     if len(items) < limit:
         fillers = (
             Player.objects.exclude(id__in=rated_ids)
-            .exclude(club__name="Loan")
+            .filter(is_public=True)
             .select_related('club')
             .order_by('name')[: limit - len(items)]
         )
@@ -156,11 +135,12 @@ def weekly_dramas(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_response(PLAYERS, RATINGS)
 def live_lowest_ratings(request):
     limit = 5
     rated_players = list(
         Player.objects.filter(total_ratings__gte=1)
-        .exclude(club__name="Loan")
+        .filter(is_public=True)
         .order_by('average_rating', 'name')[:limit]
     )
     rated_ids = [player.id for player in rated_players]
@@ -196,10 +176,11 @@ def live_lowest_ratings(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_response(MEDIA, PLAYERS, RATINGS)
 def latest_media(request):
     media_items = (
         PlayerMedia.objects.select_related('player')
-        .exclude(player__club__name="Loan")
+        .filter(player__is_public=True)
         .order_by('-created_at')[:12]
     )
 
@@ -220,6 +201,7 @@ def latest_media(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_response(PLAYERS, CLUBS, RATINGS)
 def latest_cards(request):
     """
     Latest "magic card" images added to players.
@@ -238,7 +220,7 @@ def latest_cards(request):
         Player.objects
         .filter(card_image__isnull=False)
         .exclude(card_image='')
-        .exclude(club__name="Loan")
+        .filter(is_public=True)
         .order_by('-card_updated_at', '-id')[:limit]
     )
 
@@ -257,6 +239,80 @@ def latest_cards(request):
     })
 
 
+MAX_OVERLAY_IDS = 200
+
+
+def _parse_overlay_ids(raw):
+    if not raw:
+        return []
+    try:
+        ids = {int(value) for value in raw.split(',') if value.strip()}
+    except ValueError:
+        raise ValueError('Ids must be comma-separated integers')
+    if len(ids) > MAX_OVERLAY_IDS:
+        raise ValueError(f'At most {MAX_OVERLAY_IDS} ids per list')
+    return sorted(ids)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def personalization_overlay(request):
+    """
+    The current user's ratings and comment likes for the given ids
+    (?players=1,2&comments=3,4), read in one query.
+
+    Public player and comment payloads are shared between users; the client
+    merges this overlay into them instead of asking for per-user fields.
+    """
+    try:
+        player_ids = _parse_overlay_ids(request.query_params.get('players'))
+        comment_ids = _parse_overlay_ids(request.query_params.get('comments'))
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Obie części mają te same kolumny w tej samej kolejności (tylko adnotacje),
+    # więc UNION ALL zwraca oceny i polubienia w jednym zapytaniu.
+    ratings = (
+        Rating.objects.filter(user=request.user, player_id__in=player_ids)
+        .annotate(
+            kind=Value('rating'),
+            object_id=F('player_id'),
+            rating_id=F('id'),
+            rating_value=F('value'),
+            rated_at=F('created_at'),
+        )
+        .order_by()
+        .values_list('kind', 'object_id', 'rating_id', 'rating_value', 'rated_at')
+    )
+    likes = (
+        Comment.likes.through.objects.filter(user_id=request.user.id, comment_id__in=comment_ids)
+        .annotate(
+            kind=Value('like'),
+            object_id=F('comment_id'),
+            rating_id=Value(None, output_field=IntegerField()),
+            rating_value=Value(None, output_field=IntegerField()),
+            rated_at=Value(None, output_field=DateTimeField()),
+        )
+        .order_by()
+        .values_list('kind', 'object_id', 'rating_id', 'rating_value', 'rated_at')
+    )
+
+    user_ratings = {}
+    liked_comments = []
+    if player_ids or comment_ids:
+        for kind, object_id, rating_id, value, created_at in ratings.union(likes, all=True):
+            if kind == 'like':
+                liked_comments.append(object_id)
+            elif object_id not in user_ratings or created_at > user_ratings[object_id]['created_at']:
+                # Przy kilku ocenach jednego piłkarza obowiązuje najnowsza (jak w user_rating).
+                user_ratings[object_id] = {'id': rating_id, 'value': value, 'created_at': created_at}
+
+    return Response({
+        'ratings': {str(player_id): rating for player_id, rating in user_ratings.items()},
+        'liked_comments': sorted(liked_comments),
+    })
+
+
 # Klasa do obsługi logowania - zabezpieczona przed CSRF
 class LoginView(APIView):
     permission_classes = [AllowAny]
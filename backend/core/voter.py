@@ -0,0 +1,76 @@
+"""
+Stateless identity for anonymous voters.
+
+Anonymous fixture ratings are keyed on a random token kept in a signed
+cookie, so a first-time visitor costs no write to the session table and
+later requests need no session lookup to recognise the voter.
+"""
+
+import secrets
+
+from django.conf import settings
+
+VOTER_COOKIE_SALT = "core.voter"
+
+
+def _cookie_name():
+    return getattr(settings, "VOTER_COOKIE_NAME", "grill_voter")
+
+
+def _cookie_max_age():
+    return getattr(settings, "VOTER_COOKIE_AGE", 60 * 60 * 24 * 365)
+
+
+def get_voter_token(request):
+    """
+    Returns the anonymous voter token of the request, or "" if there is none.
+
+    Visitors who voted before the signed cookie existed are still recognised
+    by their session key, but only if that session really exists: the raw
+    session cookie is client-controlled, so an arbitrary value must not let
+    anyone act as another voter.
+    """
+    cached = getattr(request, "_voter_token", None)
+    if cached is not None:
+        return cached
+
+    token = request.get_signed_cookie(
+        _cookie_name(),
+        default="",
+        salt=VOTER_COOKIE_SALT,
+        max_age=_cookie_max_age(),
+    )
+    if not token:
+        session = getattr(request, "session", None)
+        session_key = session.session_key if session is not None else None
+        token = session_key if session_key and session.exists(session_key) else ""
+    request._voter_token = token
+    return token
+
+
+def get_or_create_voter_token(request):
+    token = get_voter_token(request)
+    if not token:
+        token = secrets.token_hex(16)
+        request._voter_token = token
+    return token
+
+
+def remember_voter(request, response):
+    """
+    Sets (or refreshes) the signed voter cookie when the request has a token.
+    """
+    token = getattr(request, "_voter_token", "")
+    if not token:
+        return response
+    response.set_signed_cookie(
+        _cookie_name(),
+        token,
+        salt=VOTER_COOKIE_SALT,
+        max_age=_cookie_max_age(),
+        domain=settings.SESSION_COOKIE_DOMAIN,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite=settings.SESSION_COOKIE_SAMESITE,
+    )
+    return response
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 
 from decouple import config
@@ -83,6 +84,14 @@ CORS_ALLOW_HEADERS = [
     "x-csrftoken",
     "x-requested-with",
 ]
+# Nagłówki limitów zapytań widoczne dla frontendu
+CORS_EXPOSE_HEADERS = [
+    "retry-after",
+    "x-error-type",
+    "x-ratelimit-limit",
+    "x-ratelimit-remaining",
+    "x-ratelimit-reset",
+]
 
 # Application definition
 
@@ -94,6 +103,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "django.contrib.sitemaps",
+    "django.contrib.postgres",
     "storages",
     "rest_framework",
     "rest_framework.authtoken",
@@ -209,6 +219,75 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Cache (rate limiting, odpowiedzi publicznych endpointów). Domyślnie pamięć procesu; na produkcji wskaż współdzielony backend.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "grill-ekstraklasa"),
+    }
+}
+
+# Cache odpowiedzi dla anonimowych GET-ów (core.response_cache), unieważniany wersjami danych.
+# Wersje muszą widzieć wszystkie procesy, więc działa tylko na współdzielonym backendzie (Redis, Memcached);
+# przy pamięci procesu jest domyślnie wyłączony, a włączenie go tam zatrzymuje start aplikacji.
+RESPONSE_CACHE_ENABLED = os.getenv(
+    "RESPONSE_CACHE_ENABLED",
+    str(CACHES["default"]["BACKEND"] not in {
+        "django.core.cache.backends.locmem.LocMemCache",
+        "django.core.cache.backends.dummy.DummyCache",
+    }),
+) == "True"
+RESPONSE_CACHE_TIMEOUT = int(os.getenv("RESPONSE_CACHE_TIMEOUT", str(60 * 60)))
+
+# Nadpisania limitów z core.ratelimit.DEFAULT_RATE_LIMITS, np. {"fixture_rating": {"limit": 30, "window": 60}}
+RATE_LIMITS = {}
+# Liczba naszych proxy dopisujących się do X-Forwarded-For (0 = adres klienta z REMOTE_ADDR).
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "0"))
+
+# Odświeżanie agregatów w tle (worker: manage.py process_aggregate_refreshes, musi działać zawsze -
+# to on przesuwa zawodników w rankingu po głosach).
+# Gdy włączone, głos także podsumowanie meczu tylko oznacza jako "brudne", a worker przelicza je co najwyżej raz na okno.
+DEFERRED_AGGREGATE_REFRESH = os.getenv("DEFERRED_AGGREGATE_REFRESH", "False") == "True"
+AGGREGATE_REFRESH_WINDOW_SECONDS = float(os.getenv("AGGREGATE_REFRESH_WINDOW_SECONDS", "2"))
+# Po tym czasie klucze wzięte przez workera, który przestał działać, przejmuje inny worker.
+AGGREGATE_REFRESH_CLAIM_SECONDS = float(os.getenv("AGGREGATE_REFRESH_CLAIM_SECONDS", "300"))
+
+# Przeliczenia ocen zlecone przez API (worker: manage.py process_rating_recalculations).
+# Zadanie bez postępu dłużej niż ten czas uznajemy za porzucone i przejmuje je inny worker.
+RATING_RECALCULATION_JOB_TIMEOUT_SECONDS = float(os.getenv("RATING_RECALCULATION_JOB_TIMEOUT_SECONDS", "600"))
+
+# Odpowiedzi AI do komentarzy generowane w tle (worker: manage.py process_ai_replies).
+# AI_BACKEND: ścieżka klasy z metodą generate(prompt); "core.ai.FakeBackend" działa bez sieci.
+AI_BACKEND = os.getenv("AI_BACKEND", "core.ai.GeminiBackend")
+AI_REPLY_CONCURRENCY = int(os.getenv("AI_REPLY_CONCURRENCY", "2"))
+AI_REPLY_MAX_ATTEMPTS = int(os.getenv("AI_REPLY_MAX_ATTEMPTS", "4"))
+AI_REPLY_RETRY_BACKOFF_SECONDS = float(os.getenv("AI_REPLY_RETRY_BACKOFF_SECONDS", "30"))
+AI_REPLY_JOB_TIMEOUT_SECONDS = float(os.getenv("AI_REPLY_JOB_TIMEOUT_SECONDS", "300"))
+# Tyle oczekujących komentarzy worker pakuje w jeden prompt (1 = osobne wywołanie na komentarz).
+AI_REPLY_BATCH_SIZE = int(os.getenv("AI_REPLY_BATCH_SIZE", "5"))
+# Bezpiecznik modeli Gemini: po tylu kolejnych błędach (lub od razu po wyczerpaniu limitu) model ma przerwę.
+AI_MODEL_FAILURE_THRESHOLD = int(os.getenv("AI_MODEL_FAILURE_THRESHOLD", "3"))
+AI_MODEL_COOLDOWN_SECONDS = float(os.getenv("AI_MODEL_COOLDOWN_SECONDS", "300"))
+# Odpowiedzi na niemal identyczne komentarze o tym samym piłkarzu (core.ai.ReplyCache):
+# "off", "reuse" (jedna odpowiedź) albo "vary" (do AI_REPLY_CACHE_VARIANTS odpowiedzi, podawanych po kolei).
+AI_REPLY_CACHE_POLICY = os.getenv("AI_REPLY_CACHE_POLICY", "reuse")
+AI_REPLY_CACHE_VARIANTS = int(os.getenv("AI_REPLY_CACHE_VARIANTS", "3"))
+AI_REPLY_CACHE_MAX_ENTRIES = int(os.getenv("AI_REPLY_CACHE_MAX_ENTRIES", "1000"))
+AI_REPLY_CACHE_TTL_SECONDS = float(os.getenv("AI_REPLY_CACHE_TTL_SECONDS", str(6 * 60 * 60)))
+# Dziennik wywołań LLM (core.ai_log): linie JSON zapisywane w tle, plik rotowany po AI_LOG_MAX_BYTES.
+# Każdy proces pisze do własnego pliku (pid w nazwie); w testach dziennik jest wyłączony.
+TESTING = sys.argv[1:2] == ["test"]
+AI_LOG_ENABLED = os.getenv("AI_LOG_ENABLED", str(not TESTING)) == "True"
+AI_LOG_FILE = os.getenv("AI_LOG_FILE", str(BASE_DIR / "logs" / "gemini_responses.log"))
+AI_LOG_MAX_BYTES = int(os.getenv("AI_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+AI_LOG_BACKUP_COUNT = int(os.getenv("AI_LOG_BACKUP_COUNT", "5"))
+AI_LOG_QUEUE_SIZE = int(os.getenv("AI_LOG_QUEUE_SIZE", "10000"))
+
+# Podpisane ciasteczko identyfikujące anonimowych głosujących (core.voter), bez wpisu w tabeli sesji.
+VOTER_COOKIE_NAME = "grill_voter"
+VOTER_COOKIE_AGE = 60 * 60 * 24 * 365
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -3,6 +3,7 @@ from datetime import timedelta
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
+from core.response_cache import FIXTURE, FIXTURES, bump_versions, entity_keys
 from matches.models import Fixture
 
 
@@ -32,9 +33,17 @@ class Command(BaseCommand):
             kickoff_at__lte=archive_cutoff,
         )
 
+        # update() nie wysyła sygnałów, więc zmienione mecze zbieramy przed zmianą statusu.
+        changed_ids = [
+            *to_live.values_list("id", flat=True),
+            *to_finished.values_list("id", flat=True),
+            *to_archived.values_list("id", flat=True),
+        ]
         live_count = to_live.update(status=Fixture.STATUS_LIVE)
         finished_count = to_finished.update(status=Fixture.STATUS_FINISHED)
         archived_count = to_archived.update(status=Fixture.STATUS_ARCHIVED)
+        if live_count or finished_count or archived_count:
+            bump_versions(FIXTURES, *entity_keys(FIXTURE, changed_ids))
 
         self.stdout.write(
             f"[update_fixture_statuses] live: {live_count}, finished: {finished_count}, archived: {archived_count}, now={now.isoformat()}"
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.20 on 2026-10-18 16:37
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_fixture_player_rating_counters(apps, schema_editor):
+    FixturePlayer = apps.get_model("matches", "FixturePlayer")
+    FixtureRating = apps.get_model("matches", "FixtureRating")
+
+    totals = {
+        row["fixture_player_id"]: row
+        for row in FixtureRating.objects.values("fixture_player_id").annotate(total=Sum("value"), count=Count("id"))
+    }
+    fixture_players = list(FixturePlayer.objects.filter(pk__in=totals.keys()))
+    for item in fixture_players:
+        item.ratings_sum = totals[item.pk]["total"] or 0
+        item.ratings_count = totals[item.pk]["count"] or 0
+    FixturePlayer.objects.bulk_update(fixture_players, ["ratings_sum", "ratings_count"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matches", "0002_seed_club_aliases"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fixtureplayer",
+            name="ratings_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="fixtureplayer",
+            name="ratings_sum",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name="fixture",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("draft", "Draft"),
+                    ("lineup_pending", "Lineup pending"),
+                    ("lineup_predicted", "Lineup predicted"),
+                    ("published", "Published"),
+                    ("live", "Live"),
+                    ("finished", "Finished"),
+                    ("archived", "Archived"),
+                ],
+                db_index=True,
+                default="draft",
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(backfill_fixture_player_rating_counters, migrations.RunPython.noop),
+    ]
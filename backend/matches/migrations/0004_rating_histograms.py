@@ -0,0 +1,40 @@
+import django.contrib.postgres.fields
+from django.db import migrations, models
+from django.db.models import Count
+import players.rating_aggregates
+
+
+def backfill_fixture_player_histograms(apps, schema_editor):
+    FixturePlayer = apps.get_model("matches", "FixturePlayer")
+    FixtureRating = apps.get_model("matches", "FixtureRating")
+
+    histograms = {}
+    rows = FixtureRating.objects.values_list("fixture_player_id", "value").annotate(count=Count("id")).order_by()
+    for fixture_player_id, value, count in rows:
+        histograms.setdefault(fixture_player_id, [0] * 10)[value - 1] += count
+
+    fixture_players = []
+    for fixture_player in FixturePlayer.objects.filter(pk__in=histograms.keys()):
+        fixture_player.ratings_histogram = histograms[fixture_player.pk]
+        fixture_players.append(fixture_player)
+    FixturePlayer.objects.bulk_update(fixture_players, ["ratings_histogram"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matches", "0003_fixtureplayer_rating_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fixtureplayer",
+            name="ratings_histogram",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.PositiveIntegerField(),
+                default=players.rating_aggregates.empty_rating_histogram,
+                size=10,
+            ),
+        ),
+        migrations.RunPython(backfill_fixture_player_histograms, migrations.RunPython.noop),
+    ]
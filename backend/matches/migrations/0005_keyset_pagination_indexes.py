@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matches", "0004_rating_histograms"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="fixture",
+            index=models.Index(
+                fields=["kickoff_at", "id"], name="fixture_kickoff_id_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def create_trigram_index(apps, schema_editor):
+    # Zob. players.0018_player_search - bez pg_trgm zostaje indeks btree na normalized_alias.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS player_alias_normalized_trgm "
+        "ON matches_playeralias USING gin (normalized_alias gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS player_alias_normalized_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matches", "0005_keyset_pagination_indexes"),
+        ("players", "0018_player_search"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -1,13 +1,15 @@
 from django.contrib.auth.models import User
+from django.contrib.postgres.fields import ArrayField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.db.models import Q
-from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 
 from clubs.models import Club
 from players.models import Player
+from players.rating_aggregates import empty_rating_histogram
 
 from .utils import normalize_text, slugify_value
 
@@ -155,6 +157,7 @@ class Fixture(models.Model):
         indexes = [
             models.Index(fields=["season", "kickoff_at"], name="fixture_season_kickoff_idx"),
             models.Index(fields=["status", "kickoff_at"], name="fixture_status_kickoff_idx"),
+            models.Index(fields=["kickoff_at", "id"], name="fixture_kickoff_id_idx"),
         ]
 
     def save(self, *args, **kwargs):
@@ -243,6 +246,10 @@ class FixturePlayer(models.Model):
     raw_name = models.CharField(max_length=120, blank=True)
     position_label = models.CharField(max_length=16, blank=True)
     is_captain = models.BooleanField(default=False)
+    # Maintained by FixtureRating signals so public lineups need no join over votes.
+    ratings_sum = models.PositiveIntegerField(default=0)
+    ratings_count = models.PositiveIntegerField(default=0)
+    ratings_histogram = ArrayField(models.PositiveIntegerField(), size=10, default=empty_rating_histogram)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -316,10 +323,57 @@ class FixtureRating(models.Model):
         return f"{player_name}: {self.value}"
 
 
-@receiver([post_save, post_delete], sender=FixtureRating)
-def sync_fixture_rating_aggregates(sender, instance, **kwargs):
-    from players.rating_aggregates import refresh_fixture_rating_summary, refresh_player_rating_snapshot
+@receiver(pre_save, sender=FixtureRating)
+def remember_previous_fixture_rating(sender, instance, **kwargs):
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = (
+            FixtureRating.objects.filter(pk=instance.pk)
+            .values_list("player_id", "fixture_player_id", "value")
+            .first()
+        )
+
+
+@receiver(post_save, sender=FixtureRating)
+def sync_fixture_rating_aggregates_on_save(sender, instance, **kwargs):
+    from players.rating_aggregates import (
+        RATING_SOURCE_FIXTURE,
+        apply_fixture_player_rating_change,
+        apply_player_rating_change,
+        apply_rating_rollup_change,
+        request_fixture_rating_summary_refresh,
+    )
+
+    previous = getattr(instance, "_previous_rating", None)
+    previous_player = (previous[0], previous[2]) if previous else None
+    current_player = (instance.player_id, instance.value)
+    apply_player_rating_change(RATING_SOURCE_FIXTURE, previous=previous_player, current=current_player)
+    apply_rating_rollup_change(
+        RATING_SOURCE_FIXTURE,
+        instance.created_at,
+        previous=previous_player,
+        current=current_player,
+    )
+    apply_fixture_player_rating_change(
+        previous=(previous[1], previous[2]) if previous else None,
+        current=(instance.fixture_player_id, instance.value),
+    )
+    instance._previous_rating = None
+    request_fixture_rating_summary_refresh(instance.fixture)
+
+
+@receiver(post_delete, sender=FixtureRating)
+def sync_fixture_rating_aggregates_on_delete(sender, instance, **kwargs):
+    from players.rating_aggregates import (
+        RATING_SOURCE_FIXTURE,
+        apply_fixture_player_rating_change,
+        apply_player_rating_change,
+        apply_rating_rollup_change,
+        request_fixture_rating_summary_refresh,
+    )
 
-    if instance.player_id:
-        refresh_player_rating_snapshot(instance.player)
-    refresh_fixture_rating_summary(instance.fixture)
+    previous_player = (instance.player_id, instance.value)
+    apply_player_rating_change(RATING_SOURCE_FIXTURE, previous=previous_player)
+    apply_rating_rollup_change(RATING_SOURCE_FIXTURE, instance.created_at, previous=previous_player)
+    apply_fixture_player_rating_change(previous=(instance.fixture_player_id, instance.value))
+    request_fixture_rating_summary_refresh(instance.fixture)
@@ -1,17 +1,19 @@
-from collections import defaultdict
+from collections import Counter, defaultdict
 from datetime import datetime
 import re
 from zoneinfo import ZoneInfo
 
-from django.db import transaction
-from django.db.models import Avg, Count, Q
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 
 from clubs.models import Club
+from core.response_cache import FIXTURE, FIXTURES, PLAYER, RATINGS, bump_versions, entity_key, entity_keys
 from players.models import Player
+from players.rating_aggregates import compose_average_rating, histogram_median
 
-from .models import ClubAlias, Fixture, FixturePlayer, PlayerAlias, Round, Season
+from .models import ClubAlias, Fixture, FixturePlayer, FixtureRating, PlayerAlias, Round, Season
 from .utils import normalize_text, similarity
 
 POPULAR_FORMATIONS = {
@@ -79,7 +81,7 @@ def _club_candidate_payload(club, score=0.0, method="candidate"):
 
 
 def match_club_name(raw_name, club_scope=None):
-    clubs = list((club_scope or Club.objects.exclude(name="Loan")).order_by("name"))
+    clubs = list((club_scope or Club.objects.filter(is_loan_pool=False)).order_by("name"))
     aliases = list(ClubAlias.objects.select_related("club").filter(club__in=clubs))
     normalized_raw = normalize_text(raw_name)
     if not normalized_raw:
@@ -858,11 +860,6 @@ def current_lineup_summary(fixture, public_only=False, include_rating_summary=Fa
     queryset = FixturePlayer.objects.filter(fixture=fixture).select_related("player", "club")
     if public_only:
         queryset = queryset.filter(is_visible_public=True)
-    if include_rating_summary:
-        queryset = queryset.annotate(
-            rating_avg=Avg("ratings__value"),
-            ratings_count=Count("ratings"),
-        )
     queryset = queryset.order_by("side", "sort_order", "id")
 
     for item in queryset:
@@ -885,8 +882,10 @@ def current_lineup_summary(fixture, public_only=False, include_rating_summary=Fa
             "captain": item.is_captain,
         }
         if include_rating_summary:
-            payload["rating_avg"] = round(item.rating_avg or 0, 2)
-            payload["ratings_count"] = item.ratings_count or 0
+            payload["rating_avg"] = compose_average_rating(item.ratings_sum, item.ratings_count)
+            payload["ratings_count"] = item.ratings_count
+            payload["rating_histogram"] = item.ratings_histogram
+            payload["rating_median"] = histogram_median(item.ratings_histogram)
         grouped[item.side].append((sort_key, payload))
 
     ordered = {}
@@ -1015,3 +1014,205 @@ def apply_manual_lineup(fixture, payload):
         fixture.published_at = fixture.published_at or timezone.now()
     fixture.save(update_fields=["lineup_payload", "lineup_confirmed_at", "status", "published_at"])
     return fixture
+
+
+def fixture_rating_counters(fixture_id, fixture_player_ids):
+    """
+    Reads the stored rating counters of the given fixture players and the
+    fixture-level averages: two primary-key lookups, no lineup rendering.
+
+    Returns ``([{id, rating_avg, ratings_count, rating_histogram, rating_median}, ...],
+    {fixture_ratings_count,
+    home_rating_avg, away_rating_avg})``.
+    """
+    summaries = [
+        {
+            "id": fixture_player_id,
+            "rating_avg": compose_average_rating(ratings_sum, ratings_count),
+            "ratings_count": ratings_count,
+            "rating_histogram": histogram,
+            "rating_median": histogram_median(histogram),
+        }
+        for fixture_player_id, ratings_sum, ratings_count, histogram in FixturePlayer.objects.filter(
+            pk__in=list(fixture_player_ids)
+        ).values_list("id", "ratings_sum", "ratings_count", "ratings_histogram")
+    ]
+    fixture_summary = Fixture.objects.filter(pk=fixture_id).values(
+        "ratings_count", "home_rating_avg", "away_rating_avg"
+    ).get()
+    return summaries, {
+        "fixture_ratings_count": fixture_summary["ratings_count"],
+        "home_rating_avg": fixture_summary["home_rating_avg"],
+        "away_rating_avg": fixture_summary["away_rating_avg"],
+    }
+
+
+MAX_BULK_FIXTURE_RATINGS = 40
+
+
+def _parse_bulk_rating_entries(entries):
+    if not isinstance(entries, list) or not entries:
+        raise ValidationError("Pole 'ratings' musi być niepustą listą ocen.")
+    if len(entries) > MAX_BULK_FIXTURE_RATINGS:
+        raise ValidationError(f"Można wysłać maksymalnie {MAX_BULK_FIXTURE_RATINGS} ocen naraz.")
+
+    values = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise ValidationError("Każda ocena musi być obiektem JSON.")
+        try:
+            fixture_player_id = int(entry.get("fixture_player_id"))
+            value = int(entry.get("value"))
+        except (TypeError, ValueError):
+            raise ValidationError("Ocena musi być liczbą od 1 do 10.")
+        if value < 1 or value > 10:
+            raise ValidationError("Ocena musi być liczbą od 1 do 10.")
+        if fixture_player_id in values:
+            raise ValidationError("Ten sam zawodnik nie może być oceniony dwa razy w jednym zgłoszeniu.")
+        values[fixture_player_id] = value
+    return values
+
+
+def validate_fixture_ratings(fixture, entries):
+    """
+    Checks a bulk rating payload against the fixture's public lineup; returns
+    ``(values, fixture_players)`` keyed by fixture player id or raises
+    ValidationError.
+    """
+    values = _parse_bulk_rating_entries(entries)
+    fixture_players = {
+        item.id: item
+        for item in FixturePlayer.objects.filter(fixture=fixture, is_visible_public=True, pk__in=values.keys())
+    }
+    if len(fixture_players) != len(values):
+        raise ValidationError("Nieprawidłowe ID zawodników w ocenach.")
+    return values, fixture_players
+
+
+def submit_fixture_ratings(fixture, entries, user=None, session_key="", validated=None):
+    """
+    Upserts all of one voter's ratings for a fixture in a constant number of
+    statements and applies every affected aggregate exactly once.
+    ``validated`` is the result of validate_fixture_ratings() when the caller
+    already checked the payload.
+
+    Bulk writes bypass the FixtureRating signals, so the deltas they would
+    apply are accumulated here per player / fixture player / rollup bucket.
+    """
+    from players.rating_aggregates import (
+        RATING_SOURCE_FIXTURE,
+        apply_fixture_player_rating_delta,
+        apply_player_rating_delta,
+        apply_rating_rollup_delta,
+        rating_transition_deltas,
+        request_fixture_rating_summary_refresh,
+        rollup_bucket_start,
+    )
+    from ratings.models import PlayerRatingRollup
+
+    values, fixture_players = validated or validate_fixture_ratings(fixture, entries)
+
+    voter_filter = {"user": user} if user is not None else {"session_key": session_key}
+    now = timezone.now()
+    player_deltas = defaultdict(lambda: [0, 0, Counter()])
+    fixture_player_deltas = defaultdict(lambda: [0, 0, Counter()])
+    rollup_deltas = defaultdict(lambda: [0, 0])
+
+    def add_delta(rating, previous_value, current_value):
+        previous = (rating.fixture_player_id, previous_value) if previous_value is not None else None
+        for _, value_delta, count_delta, histogram_delta in rating_transition_deltas(
+            previous, (rating.fixture_player_id, current_value)
+        ):
+            targets = [fixture_player_deltas[rating.fixture_player_id]]
+            if rating.player_id:
+                targets.append(player_deltas[rating.player_id])
+            for target in targets:
+                target[0] += value_delta
+                target[1] += count_delta
+                target[2].update(histogram_delta)
+            if rating.player_id:
+                # Hour bucket start also identifies the day bucket.
+                rollup_key = (
+                    rating.player_id,
+                    rollup_bucket_start(rating.created_at, PlayerRatingRollup.GRANULARITY_HOUR),
+                )
+                rollup_deltas[rollup_key][0] += value_delta
+                rollup_deltas[rollup_key][1] += count_delta
+
+    def write_ratings():
+        player_deltas.clear()
+        fixture_player_deltas.clear()
+        rollup_deltas.clear()
+        with transaction.atomic():
+            existing = {
+                rating.fixture_player_id: rating
+                for rating in FixtureRating.objects.select_for_update().filter(
+                    fixture=fixture,
+                    fixture_player_id__in=values.keys(),
+                    **voter_filter,
+                )
+            }
+
+            to_create = []
+            to_update = []
+            for fixture_player_id, value in values.items():
+                rating = existing.get(fixture_player_id)
+                if rating is None:
+                    rating = FixtureRating(
+                        fixture=fixture,
+                        fixture_player_id=fixture_player_id,
+                        player_id=fixture_players[fixture_player_id].player_id,
+                        user=user,
+                        session_key="" if user is not None else session_key,
+                        value=value,
+                    )
+                    to_create.append(rating)
+                elif rating.value != value:
+                    add_delta(rating, rating.value, value)
+                    rating.value = value
+                    rating.updated_at = now
+                    to_update.append(rating)
+
+            FixtureRating.objects.bulk_create(to_create)
+            FixtureRating.objects.bulk_update(to_update, ["value", "updated_at"])
+            for rating in to_create:
+                add_delta(rating, None, rating.value)
+
+            for player_id, (value_delta, count_delta, histogram_delta) in player_deltas.items():
+                apply_player_rating_delta(player_id, RATING_SOURCE_FIXTURE, value_delta, count_delta, histogram_delta)
+            for fixture_player_id, (value_delta, count_delta, histogram_delta) in fixture_player_deltas.items():
+                apply_fixture_player_rating_delta(fixture_player_id, value_delta, count_delta, histogram_delta)
+            for (player_id, bucket_start), (value_delta, count_delta) in rollup_deltas.items():
+                apply_rating_rollup_delta(player_id, RATING_SOURCE_FIXTURE, bucket_start, value_delta, count_delta)
+            if fixture_player_deltas:
+                request_fixture_rating_summary_refresh(fixture)
+                # bulk_create/bulk_update nie wysyłają sygnałów.
+                bump_versions(
+                    RATINGS, FIXTURES, entity_key(FIXTURE, fixture.pk), *entity_keys(PLAYER, player_deltas)
+                )
+        return to_create, to_update
+
+    try:
+        to_create, to_update = write_ratings()
+    except IntegrityError:
+        # Równoległe pierwsze zgłoszenie tego samego głosującego wstawiło już część ocen
+        # (unikalność per głosujący); powtórka zobaczy je i zaktualizuje zamiast wstawiać.
+        to_create, to_update = write_ratings()
+
+    summaries, fixture_summary = fixture_rating_counters(fixture.pk, values.keys())
+    return {
+        "ratings": [
+            {
+                "fixture_player_id": summary["id"],
+                "value": values[summary["id"]],
+                "rating_avg": summary["rating_avg"],
+                "ratings_count": summary["ratings_count"],
+                "rating_histogram": summary["rating_histogram"],
+                "rating_median": summary["rating_median"],
+            }
+            for summary in summaries
+        ],
+        "created": len(to_create),
+        "updated": len(to_update),
+        **fixture_summary,
+    }
@@ -1,13 +1,22 @@
 from datetime import timedelta
+from unittest import mock
 
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework.test import APITestCase
 
 from clubs.models import Club
+from core.models import PendingAggregateRefresh
 from players.models import Player
-from ratings.models import Rating
+from players.rating_aggregates import flush_pending_aggregate_refreshes, mark_aggregate_dirty
+from ratings.models import PlayerRatingRollup, Rating
 
 from .models import Fixture, FixturePlayer, FixtureRating, PlayerAlias, Round, Season
 
@@ -298,6 +307,8 @@ class MatchPublicApiTests(APITestCase):
             is_visible_public=True,
             raw_name=self.home_player.name,
         )
+        # Nowi zawodnicy czekają na miejsce w rankingu; testy zaczynają od pustej kolejki.
+        flush_pending_aggregate_refreshes()
 
     def test_public_detail_hides_non_public_fixture_players(self):
         self.fixture.lineup_payload = {
@@ -317,9 +328,10 @@ class MatchPublicApiTests(APITestCase):
         self.assertEqual(response.data["formation"]["home"], "3-5-2")
         self.assertEqual(response.data["formation"]["away"], "4-3-3")
 
-    def test_anonymous_fixture_rating_uses_session_and_updates_summary(self):
+    def test_anonymous_fixture_rating_uses_signed_voter_cookie_and_updates_summary(self):
+        url = reverse("fixture-rating", args=[self.fixture.slug])
         response = self.client.post(
-            reverse("fixture-rating", args=[self.fixture.slug]),
+            url,
             {
                 "fixture_player_id": self.visible_fixture_player.id,
                 "value": 9,
@@ -328,12 +340,39 @@ class MatchPublicApiTests(APITestCase):
         )
 
         self.assertEqual(response.status_code, 200)
+        self.assertIn(settings.VOTER_COOKIE_NAME, response.cookies)
+        self.assertFalse(Session.objects.exists())
         self.fixture.refresh_from_db()
         self.home_player.refresh_from_db()
         self.assertEqual(self.fixture.ratings_count, 1)
         self.assertEqual(self.home_player.total_ratings, 1)
         self.assertEqual(self.home_player.average_rating, 9.0)
 
+        self.client.post(url, {"fixture_player_id": self.visible_fixture_player.id, "value": 5}, format="json")
+        rating = FixtureRating.objects.get()
+        self.assertEqual(rating.value, 5)
+        self.assertEqual(len(rating.session_key), 32)
+
+    def test_anonymous_voter_with_legacy_session_keeps_existing_rating(self):
+        legacy_session = SessionStore()
+        legacy_session.create()
+        FixtureRating.objects.create(
+            fixture=self.fixture,
+            fixture_player=self.visible_fixture_player,
+            session_key=legacy_session.session_key,
+            value=3,
+        )
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = legacy_session.session_key
+
+        response = self.client.post(
+            reverse("fixture-rating", args=[self.fixture.slug]),
+            {"fixture_player_id": self.visible_fixture_player.id, "value": 7},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(FixtureRating.objects.get().value, 7)
+
     def test_anonymous_fixture_rating_can_be_deleted_and_updates_summary(self):
         create_response = self.client.post(
             reverse("fixture-rating", args=[self.fixture.slug]),
@@ -364,6 +403,247 @@ class MatchPublicApiTests(APITestCase):
         self.assertEqual(self.home_player.total_ratings, 0)
         self.assertEqual(self.home_player.average_rating, 0)
 
+    def test_public_lineup_reads_fixture_player_rating_counters(self):
+        fan = User.objects.create_user(username="fan", password="secret")
+        rating_url = reverse("fixture-rating", args=[self.fixture.slug])
+        self.client.post(rating_url, {"fixture_player_id": self.visible_fixture_player.id, "value": 4}, format="json")
+        self.client.force_authenticate(user=fan)
+        self.client.post(rating_url, {"fixture_player_id": self.visible_fixture_player.id, "value": 5}, format="json")
+        self.client.post(rating_url, {"fixture_player_id": self.visible_fixture_player.id, "value": 9}, format="json")
+
+        self.visible_fixture_player.refresh_from_db()
+        self.assertEqual(self.visible_fixture_player.ratings_sum, 13)
+        self.assertEqual(self.visible_fixture_player.ratings_count, 2)
+
+        response = self.client.get(reverse("fixture-detail", args=[self.fixture.slug]))
+        entry = response.data["lineup"]["home"][0]
+        self.assertEqual(entry["ratings_count"], 2)
+        self.assertEqual(entry["rating_avg"], 6.5)
+        self.assertEqual(entry["rating_histogram"], [0, 0, 0, 1, 0, 0, 0, 0, 1, 0])
+        self.assertEqual(entry["rating_median"], 4)
+        self.assertEqual(response.data["home_rating_avg"], 6.5)
+
+    def test_delta_rating_response_returns_only_counters(self):
+        url = reverse("fixture-rating", args=[self.fixture.slug])
+        with CaptureQueriesContext(connection) as full_queries:
+            self.client.post(url, {"fixture_player_id": self.visible_fixture_player.id, "value": 6}, format="json")
+        with CaptureQueriesContext(connection) as delta_queries:
+            response = self.client.post(
+                url + "?response=delta",
+                {"fixture_player_id": self.visible_fixture_player.id, "value": 8},
+                format="json",
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(len(delta_queries), len(full_queries))
+        self.assertEqual(
+            response.data["player_summary"],
+            {
+                "id": self.visible_fixture_player.id,
+                "rating_avg": 8.0,
+                "ratings_count": 1,
+                "rating_histogram": [0, 0, 0, 0, 0, 0, 0, 1, 0, 0],
+                "rating_median": 8,
+            },
+        )
+        self.assertEqual(response.data["value"], 8)
+        self.assertEqual(response.data["fixture_ratings_count"], 1)
+        self.assertEqual(response.data["home_rating_avg"], 8.0)
+
+    @override_settings(DEFERRED_AGGREGATE_REFRESH=True)
+    def test_deferred_refresh_coalesces_fixture_summary_updates(self):
+        second_user = User.objects.create_user(username="fan2", password="secret")
+        for voter, value in ((None, 6), (second_user, 8)):
+            if voter:
+                self.client.force_authenticate(user=voter)
+            self.client.post(
+                reverse("fixture-rating", args=[self.fixture.slug]),
+                {"fixture_player_id": self.visible_fixture_player.id, "value": value},
+                format="json",
+            )
+
+        self.fixture.refresh_from_db()
+        self.home_player.refresh_from_db()
+        self.assertEqual(self.fixture.ratings_count, 0)
+        self.assertEqual(self.home_player.total_ratings, 2)
+        self.assertEqual(
+            sorted(PendingAggregateRefresh.objects.values_list("kind", flat=True)),
+            [PendingAggregateRefresh.KIND_FIXTURE, PendingAggregateRefresh.KIND_LEADERBOARD],
+        )
+
+        self.assertEqual(flush_pending_aggregate_refreshes(), 2)
+        self.fixture.refresh_from_db()
+        self.assertEqual(self.fixture.ratings_count, 2)
+        self.assertEqual(self.fixture.home_rating_avg, 7.0)
+        self.assertEqual(self.home_player.leaderboard_entry.overall_rank, 1)
+        self.assertFalse(PendingAggregateRefresh.objects.exists())
+
+    def test_failed_refresh_keeps_marker(self):
+        mark_aggregate_dirty(PendingAggregateRefresh.KIND_FIXTURE, self.fixture.pk)
+
+        with mock.patch("players.rating_aggregates.refresh_fixture_rating_summary", side_effect=RuntimeError):
+            with self.assertLogs("players.rating_aggregates", "ERROR"):
+                self.assertEqual(flush_pending_aggregate_refreshes(), 0)
+
+        self.assertTrue(PendingAggregateRefresh.objects.filter(object_id=self.fixture.pk).exists())
+        self.assertEqual(flush_pending_aggregate_refreshes(), 1)
+        self.assertFalse(PendingAggregateRefresh.objects.exists())
+
+    def test_vote_during_refresh_keeps_key_dirty(self):
+        from players.rating_aggregates import refresh_fixture_rating_summary
+
+        mark_aggregate_dirty(PendingAggregateRefresh.KIND_FIXTURE, self.fixture.pk)
+
+        def refresh_and_vote(fixture):
+            refresh_fixture_rating_summary(fixture)
+            mark_aggregate_dirty(PendingAggregateRefresh.KIND_FIXTURE, fixture.pk)
+
+        with mock.patch("players.rating_aggregates.refresh_fixture_rating_summary", side_effect=refresh_and_vote):
+            self.assertEqual(flush_pending_aggregate_refreshes(), 1)
+
+        self.assertTrue(PendingAggregateRefresh.objects.filter(object_id=self.fixture.pk).exists())
+
+    def test_remarked_key_keeps_its_place_in_the_queue(self):
+        mark_aggregate_dirty(PendingAggregateRefresh.KIND_FIXTURE, self.fixture.pk)
+        mark_aggregate_dirty(PendingAggregateRefresh.KIND_FIXTURE, self.hidden_fixture.pk)
+        mark_aggregate_dirty(PendingAggregateRefresh.KIND_FIXTURE, self.fixture.pk)
+
+        self.assertEqual(flush_pending_aggregate_refreshes(limit=1), 1)
+
+        self.assertEqual(
+            list(PendingAggregateRefresh.objects.values_list("object_id", flat=True)), [self.hidden_fixture.pk]
+        )
+
+    def test_keys_claimed_by_another_worker_are_skipped(self):
+        from players.rating_aggregates import _claim_aggregate_markers
+
+        mark_aggregate_dirty(PendingAggregateRefresh.KIND_FIXTURE, self.fixture.pk)
+        self.assertEqual(len(_claim_aggregate_markers(limit=10)), 1)
+
+        self.assertEqual(flush_pending_aggregate_refreshes(), 0)
+        # Claim workera, który przestał działać, wygasa i klucz przejmuje następny przebieg.
+        PendingAggregateRefresh.objects.update(claimed_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(flush_pending_aggregate_refreshes(), 1)
+
+    def test_bulk_fixture_rating_upserts_and_applies_aggregates_once(self):
+        away_fixture_player = FixturePlayer.objects.filter(fixture=self.fixture, player=self.away_player).get()
+        away_fixture_player.is_visible_public = True
+        away_fixture_player.save(update_fields=["is_visible_public"])
+        bulk_url = reverse("fixture-rating-bulk", args=[self.fixture.slug])
+
+        response = self.client.post(
+            bulk_url,
+            {
+                "ratings": [
+                    {"fixture_player_id": self.visible_fixture_player.id, "value": 8},
+                    {"fixture_player_id": away_fixture_player.id, "value": 4},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual(response.data["fixture_ratings_count"], 2)
+
+        response = self.client.post(
+            bulk_url,
+            {
+                "ratings": [
+                    {"fixture_player_id": self.visible_fixture_player.id, "value": 6},
+                    {"fixture_player_id": away_fixture_player.id, "value": 4},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["created"], response.data["updated"]), (0, 1))
+        self.assertEqual(FixtureRating.objects.filter(fixture=self.fixture).count(), 2)
+
+        self.fixture.refresh_from_db()
+        self.home_player.refresh_from_db()
+        self.visible_fixture_player.refresh_from_db()
+        self.assertEqual(self.fixture.home_rating_avg, 6.0)
+        self.assertEqual(self.fixture.away_rating_avg, 4.0)
+        self.assertEqual((self.visible_fixture_player.ratings_sum, self.visible_fixture_player.ratings_count), (6, 1))
+        self.assertEqual(self.visible_fixture_player.ratings_histogram, [0, 0, 0, 0, 0, 1, 0, 0, 0, 0])
+        self.assertEqual(self.home_player.rating_histogram, [0, 0, 0, 0, 0, 1, 0, 0, 0, 0])
+        self.assertEqual((self.home_player.fixture_ratings_sum, self.home_player.total_ratings), (6, 1))
+        self.assertEqual(
+            sum(PlayerRatingRollup.objects.filter(
+                player=self.home_player,
+                granularity=PlayerRatingRollup.GRANULARITY_DAY,
+            ).values_list("ratings_sum", flat=True)),
+            6,
+        )
+
+    def test_bulk_fixture_rating_retries_as_update_after_concurrent_insert(self):
+        voter = User.objects.create_user(username="fan2", password="secret")
+        self.client.force_authenticate(user=voter)
+        # Ocena wstawiona przez równoległe zgłoszenie, niewidoczna dla pierwszego odczytu.
+        FixtureRating.objects.create(
+            fixture=self.fixture,
+            fixture_player=self.visible_fixture_player,
+            user=voter,
+            value=3,
+        )
+        select_for_update = FixtureRating.objects.select_for_update
+        with mock.patch.object(
+            FixtureRating.objects,
+            "select_for_update",
+            side_effect=[FixtureRating.objects.none(), select_for_update()],
+        ):
+            response = self.client.post(
+                reverse("fixture-rating-bulk", args=[self.fixture.slug]),
+                {"ratings": [{"fixture_player_id": self.visible_fixture_player.id, "value": 8}]},
+                format="json",
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["created"], response.data["updated"]), (0, 1))
+        self.assertEqual(FixtureRating.objects.get().value, 8)
+        self.visible_fixture_player.refresh_from_db()
+        self.assertEqual((self.visible_fixture_player.ratings_sum, self.visible_fixture_player.ratings_count), (8, 1))
+
+    def test_bulk_fixture_rating_rejects_non_object_body(self):
+        response = self.client.post(
+            reverse("fixture-rating-bulk", args=[self.fixture.slug]),
+            [{"fixture_player_id": self.visible_fixture_player.id, "value": 8}],
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(FixtureRating.objects.exists())
+
+    def test_bulk_fixture_rating_rejects_hidden_fixture_players(self):
+        response = self.client.post(
+            reverse("fixture-rating-bulk", args=[self.fixture.slug]),
+            {"ratings": [{"fixture_player_id": self.hidden_fixture_player.id, "value": 8}]},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(FixtureRating.objects.exists())
+
+    @override_settings(RATE_LIMITS={"fixture_rating": {"limit": 1, "window": 60}})
+    def test_rejected_bulk_rating_does_not_use_the_rate_limit(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        rating = {"fixture_player_id": self.visible_fixture_player.id, "value": 8}
+        missing = self.client.post(
+            reverse("fixture-rating-bulk", args=["no-such-fixture"]), {"ratings": [rating]}, format="json"
+        )
+        invalid = self.client.post(
+            reverse("fixture-rating-bulk", args=[self.fixture.slug]),
+            {"ratings": [{**rating, "value": 11}]},
+            format="json",
+        )
+        valid = self.client.post(
+            reverse("fixture-rating-bulk", args=[self.fixture.slug]), {"ratings": [rating]}, format="json"
+        )
+
+        self.assertEqual([missing.status_code, invalid.status_code, valid.status_code], [404, 400, 200])
+
     def test_public_list_excludes_hidden_statuses(self):
         response = self.client.get(reverse("fixture-list"), {"scope": "upcoming", "limit": 20})
 
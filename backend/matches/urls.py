@@ -9,6 +9,7 @@ from .views import (
     AdminFixtureListView,
     AdminLineupImportAnalyzeView,
     AdminLineupImportConfirmView,
+    FixtureBulkRatingView,
     FixtureDetailView,
     FixtureListView,
     FixtureRatingView,
@@ -21,6 +22,7 @@ urlpatterns = [
     path("fixtures/upcoming/", FixtureUpcomingView.as_view(), name="fixture-upcoming"),
     path("fixtures/<slug:slug>/", FixtureDetailView.as_view(), name="fixture-detail"),
     path("fixtures/<slug:slug>/ratings/", FixtureRatingView.as_view(), name="fixture-rating"),
+    path("fixtures/<slug:slug>/ratings/bulk/", FixtureBulkRatingView.as_view(), name="fixture-rating-bulk"),
     path("admin/fixtures/", AdminFixtureListView.as_view(), name="admin-fixture-list"),
     path("admin/fixtures/import/analyze/", AdminFixtureImportAnalyzeView.as_view(), name="admin-fixture-import-analyze"),
     path("admin/fixtures/import/confirm/", AdminFixtureImportConfirmView.as_view(), name="admin-fixture-import-confirm"),
@@ -1,11 +1,17 @@
 from datetime import datetime
 
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
 from django.utils import timezone
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from core.pagination import FixtureCursorPagination, wants_cursor_pagination
+from core.ratelimit import check_rate_limit, rate_limited_response, with_rate_limit_headers
+from core.response_cache import CLUBS, FIXTURE, FIXTURES, PLAYERS, cache_response
+from core.voter import get_or_create_voter_token, get_voter_token, remember_voter
+
 from .models import Fixture, FixturePlayer, FixtureRating
 from .serializers import FixtureDetailSerializer, FixtureListSerializer, FixturePublicDetailSerializer
 from .services import (
@@ -16,6 +22,9 @@ from .services import (
     confirm_fixture_import,
     confirm_lineup_import,
     fixture_queryset_with_counts,
+    fixture_rating_counters,
+    submit_fixture_ratings,
+    validate_fixture_ratings,
 )
 
 PUBLIC_FIXTURE_STATUSES = {
@@ -43,6 +52,8 @@ class FixtureUpcomingView(APIView):
 class FixtureListView(APIView):
     permission_classes = [permissions.AllowAny]
 
+    # Podział na nadchodzące/ostatnie zależy od bieżącej godziny, stąd krótki timeout.
+    @method_decorator(cache_response(FIXTURES, CLUBS, PLAYERS, timeout=60))
     def get(self, request):
         queryset = fixture_queryset_with_counts().filter(status__in=PUBLIC_FIXTURE_STATUSES)
         scope = request.query_params.get("scope", "upcoming")
@@ -54,19 +65,29 @@ class FixtureListView(APIView):
         now = timezone.now()
 
         if scope == "recent":
-            queryset = queryset.filter(kickoff_at__lt=now).order_by("-kickoff_at")
+            queryset = queryset.filter(kickoff_at__lt=now)
+            ordering = ("-kickoff_at", "-id")
         elif scope == "all":
-            queryset = queryset.order_by("kickoff_at")
+            ordering = ("kickoff_at", "id")
         else:
-            queryset = queryset.filter(kickoff_at__gte=now).order_by("kickoff_at")
+            queryset = queryset.filter(kickoff_at__gte=now)
+            ordering = ("kickoff_at", "id")
+
+        # ?cursor= / ?pagination=cursor: kolejne strony bez OFFSET, w odpowiedzi {next, previous, results}.
+        if wants_cursor_pagination(request):
+            paginator = FixtureCursorPagination()
+            paginator.ordering = ordering
+            page = paginator.paginate_queryset(queryset, request)
+            return paginator.get_paginated_response(FixtureListSerializer(page, many=True).data)
 
-        serializer = FixtureListSerializer(queryset[:limit], many=True)
+        serializer = FixtureListSerializer(queryset.order_by(*ordering)[:limit], many=True)
         return Response(serializer.data)
 
 
 class FixtureDetailView(APIView):
     permission_classes = [permissions.AllowAny]
 
+    @method_decorator(cache_response(entity=(FIXTURE, "slug")))
     def get(self, request, slug):
         fixture = get_object_or_404(
             Fixture.objects.select_related("season", "round", "home_club", "away_club"),
@@ -95,27 +116,39 @@ class FixtureRatingView(APIView):
             is_visible_public=True,
         )
 
-    def _build_response_payload(self, fixture, fixture_player, value=None, deleted=False):
-        fixture.refresh_from_db()
-        public_payload = FixturePublicDetailSerializer(fixture).data
-        updated_player = None
-        for side_entries in public_payload["lineup"].values():
-            if not side_entries:
-                continue
-            for item in side_entries:
-                if item["id"] == fixture_player.id:
-                    updated_player = item
+    def _build_response_payload(self, request, fixture, fixture_player, value=None, deleted=False):
+        """
+        ``?response=delta`` returns only the stored counters of the rated
+        player and the fixture averages instead of re-rendering the lineup.
+        """
+        if request.query_params.get("response") == "delta":
+            summaries, fixture_summary = fixture_rating_counters(fixture.pk, [fixture_player.id])
+            payload = {
+                "fixture_player_id": fixture_player.id,
+                "player_summary": summaries[0] if summaries else None,
+                **fixture_summary,
+            }
+        else:
+            fixture.refresh_from_db()
+            public_payload = FixturePublicDetailSerializer(fixture).data
+            updated_player = None
+            for side_entries in public_payload["lineup"].values():
+                if not side_entries:
+                    continue
+                for item in side_entries:
+                    if item["id"] == fixture_player.id:
+                        updated_player = item
+                        break
+                if updated_player:
                     break
-            if updated_player:
-                break
-
-        payload = {
-            "fixture_player_id": fixture_player.id,
-            "player_summary": updated_player,
-            "fixture_ratings_count": public_payload["ratings_count"],
-            "home_rating_avg": public_payload["home_rating_avg"],
-            "away_rating_avg": public_payload["away_rating_avg"],
-        }
+
+            payload = {
+                "fixture_player_id": fixture_player.id,
+                "player_summary": updated_player,
+                "fixture_ratings_count": public_payload["ratings_count"],
+                "home_rating_avg": public_payload["home_rating_avg"],
+                "away_rating_avg": public_payload["away_rating_avg"],
+            }
         if value is not None:
             payload["value"] = value
         if deleted:
@@ -139,6 +172,10 @@ class FixtureRatingView(APIView):
         if value < 1 or value > 10:
             return Response({"detail": "Ocena musi być liczbą od 1 do 10."}, status=status.HTTP_400_BAD_REQUEST)
 
+        rate_limit = check_rate_limit(request, "fixture_rating")
+        if not rate_limit.allowed:
+            return rate_limited_response(rate_limit)
+
         if request.user and request.user.is_authenticated:
             rating, _ = FixtureRating.objects.update_or_create(
                 fixture=fixture,
@@ -151,12 +188,10 @@ class FixtureRatingView(APIView):
                 },
             )
         else:
-            if not request.session.session_key:
-                request.session.create()
             rating, _ = FixtureRating.objects.update_or_create(
                 fixture=fixture,
                 fixture_player=fixture_player,
-                session_key=request.session.session_key,
+                session_key=get_or_create_voter_token(request),
                 defaults={
                     "player": fixture_player.player,
                     "user": None,
@@ -164,7 +199,11 @@ class FixtureRatingView(APIView):
                 },
             )
 
-        return Response(self._build_response_payload(fixture, fixture_player, value=rating.value), status=status.HTTP_200_OK)
+        response = Response(
+            self._build_response_payload(request, fixture, fixture_player, value=rating.value),
+            status=status.HTTP_200_OK,
+        )
+        return remember_voter(request, with_rate_limit_headers(response, rate_limit))
 
     def delete(self, request, slug):
         fixture = self._get_fixture(slug)
@@ -177,19 +216,56 @@ class FixtureRatingView(APIView):
                 fixture_player=fixture_player,
                 user=request.user,
             ).delete()
-        elif request.session.session_key:
+        elif get_voter_token(request):
             deleted, _ = FixtureRating.objects.filter(
                 fixture=fixture,
                 fixture_player=fixture_player,
-                session_key=request.session.session_key,
+                session_key=get_voter_token(request),
             ).delete()
 
         return Response(
-            self._build_response_payload(fixture, fixture_player, value=None, deleted=bool(deleted)),
+            self._build_response_payload(request, fixture, fixture_player, value=None, deleted=bool(deleted)),
             status=status.HTTP_200_OK,
         )
 
 
+class FixtureBulkRatingView(APIView):
+    """
+    Accepts all of a voter's ratings for one fixture in a single request:
+    ``{"ratings": [{"fixture_player_id": 1, "value": 7}, ...]}``.
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request, slug):
+        if not isinstance(request.data, dict):
+            return Response(
+                {"detail": "Treść żądania musi być obiektem JSON z polem 'ratings'."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fixture = get_object_or_404(Fixture, slug=slug, status__in=PUBLIC_FIXTURE_STATUSES)
+        ratings = request.data.get("ratings")
+        # Limit zużywają tylko poprawne żądania: 404 i 400 zapadają wcześniej.
+        validated = validate_fixture_ratings(fixture, ratings)
+
+        rate_limit = check_rate_limit(request, "fixture_rating")
+        if not rate_limit.allowed:
+            return rate_limited_response(rate_limit)
+
+        if request.user and request.user.is_authenticated:
+            payload = submit_fixture_ratings(fixture, ratings, user=request.user, validated=validated)
+        else:
+            payload = submit_fixture_ratings(
+                fixture,
+                ratings,
+                session_key=get_or_create_voter_token(request),
+                validated=validated,
+            )
+
+        return remember_voter(request, with_rate_limit_headers(Response(payload, status=status.HTTP_200_OK), rate_limit))
+
+
 class AdminFixtureListView(APIView):
     permission_classes = [permissions.IsAdminUser]
 
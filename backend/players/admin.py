@@ -242,7 +242,8 @@ class PlayerAdmin(admin.ModelAdmin):
         }),
     )
     
-    readonly_fields = ['display_current_gifs']
+    # Rating totals are maintained by vote signals; use recalculate_ratings to repair them.
+    readonly_fields = ['display_current_gifs', 'average_rating', 'total_ratings']
     
     def display_current_gifs(self, obj):
         if not obj:
@@ -0,0 +1,233 @@
+"""
+Materialized player leaderboard (players.models.PlayerRank).
+
+Every rated public player has one row holding its overall, per-position and
+per-club rank under LEADERBOARD_ORDERING. A rating change moves only that
+player: its new rank is the number of rows ahead of it plus one, and the rows
+between its old and new place are shifted by one in a single UPDATE per
+scope. Reading a rank is then a primary-key lookup, and a leaderboard page is
+a range scan on a (scope, rank) index.
+
+Repositioning is serialized with a transaction-level advisory lock, because
+two concurrent moves would otherwise shift the same rows. Votes therefore
+never reposition inline: request_leaderboard_update() only marks the player
+dirty and the process_aggregate_refreshes worker moves each batch of marked
+players under one lock, off the request path. rebuild_leaderboard()
+recomputes every rank with window functions and is the repair path
+(manage.py rebuild_leaderboard).
+"""
+
+from django.db import connection, transaction
+from django.db.models import F, Max, Q, Window
+from django.db.models.functions import RowNumber
+
+from core.response_cache import PLAYER, PLAYERS, bump_versions, entity_keys
+
+# Best first: higher average, then more votes, then the older player.
+LEADERBOARD_ORDERING = (F("average_rating").desc(), F("total_ratings").desc(), F("id").asc())
+LEADERBOARD_MIN_RATINGS = 1
+LEADERBOARD_LOCK_ID = 7_401_017
+
+# Rank column -> fields whose values delimit the scope it ranks within.
+RANK_SCOPES = {
+    "overall_rank": (),
+    "position_rank": ("position",),
+    "club_rank": ("club_id",),
+}
+
+
+def eligible_players():
+    from .models import Player
+
+    return Player.objects.filter(total_ratings__gte=LEADERBOARD_MIN_RATINGS, is_public=True)
+
+
+def _lock():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [LEADERBOARD_LOCK_ID])
+
+
+def _scope(entry, scope_fields):
+    """Filter selecting the rows ranked together with ``entry``, or None when unranked."""
+    values = {field: getattr(entry, field) for field in scope_fields}
+    if any(value is None for value in values.values()):
+        return None
+    return values
+
+
+def _ahead_of(entry):
+    return (
+        Q(average_rating__gt=entry.average_rating)
+        | Q(average_rating=entry.average_rating, total_ratings__gt=entry.total_ratings)
+        | Q(
+            average_rating=entry.average_rating,
+            total_ratings=entry.total_ratings,
+            player_id__lt=entry.player_id,
+        )
+    )
+
+
+def _shift(rank_field, scope, old_rank, new_rank, player_id):
+    """
+    Closes the gap at ``old_rank`` and opens one at ``new_rank`` (either may
+    be None); returns the ids of the players whose rank changed.
+    """
+    from .models import PlayerRank
+
+    rows = PlayerRank.objects.filter(**scope).exclude(player_id=player_id)
+    if old_rank is None:
+        rows, step = rows.filter(**{f"{rank_field}__gte": new_rank}), 1
+    elif new_rank is None:
+        rows, step = rows.filter(**{f"{rank_field}__gt": old_rank}), -1
+    elif new_rank < old_rank:
+        rows, step = rows.filter(**{f"{rank_field}__gte": new_rank, f"{rank_field}__lt": old_rank}), 1
+    elif new_rank > old_rank:
+        rows, step = rows.filter(**{f"{rank_field}__gt": old_rank, f"{rank_field}__lte": new_rank}), -1
+    else:
+        return []
+    # Pod blokadą rankingu zbiór przesuwanych wierszy nie zmieni się między zapytaniami.
+    shifted = list(rows.values_list("player_id", flat=True))
+    if shifted:
+        rows.update(**{rank_field: F(rank_field) + step})
+    return shifted
+
+
+def _reposition(entry, player):
+    """
+    Moves ``entry`` (the stored row, or None) to where ``player`` belongs now
+    (None or an ineligible player removes it); returns the ids of the players
+    whose rank changed, including the moved one.
+    """
+    from .models import PlayerRank
+
+    current = None
+    if player is not None:
+        current = PlayerRank(
+            player_id=player.pk,
+            average_rating=player.average_rating,
+            total_ratings=player.total_ratings,
+            position=player.position,
+            club_id=player.club_id,
+        )
+    if entry is None and current is None:
+        return set()
+    key_fields = ("average_rating", "total_ratings", "position", "club_id")
+    if entry is not None and current is not None and all(
+        getattr(entry, field) == getattr(current, field) for field in key_fields
+    ):
+        return set()
+
+    player_id = (current or entry).player_id
+    moved = {player_id}
+    for rank_field, scope_fields in RANK_SCOPES.items():
+        old_scope = _scope(entry, scope_fields) if entry is not None else None
+        new_scope = _scope(current, scope_fields) if current is not None else None
+        old_rank = getattr(entry, rank_field) if old_scope is not None else None
+        new_rank = None
+        if new_scope is not None:
+            new_rank = (
+                PlayerRank.objects.filter(**new_scope)
+                .exclude(player_id=player_id)
+                .filter(_ahead_of(current))
+                .count()
+                + 1
+            )
+            setattr(current, rank_field, new_rank)
+        if old_scope == new_scope:
+            if old_scope is not None:
+                moved.update(_shift(rank_field, old_scope, old_rank, new_rank, player_id))
+        else:
+            if old_scope is not None:
+                moved.update(_shift(rank_field, old_scope, old_rank, None, player_id))
+            if new_scope is not None:
+                moved.update(_shift(rank_field, new_scope, None, new_rank, player_id))
+
+    if current is None:
+        PlayerRank.objects.filter(player_id=player_id).delete()
+    else:
+        current.save()
+    return moved
+
+
+def _bump_ranked(player_ids):
+    # Ranga jest w szczegółach piłkarza, więc przesunięci piłkarze dostają nową wersję.
+    if player_ids:
+        bump_versions(PLAYERS, *entity_keys(PLAYER, player_ids))
+
+
+def update_leaderboard(player_ids):
+    """Repositions the given players after their rating, position or club changed."""
+    from .models import PlayerRank
+
+    player_ids = sorted(set(player_ids))
+    if not player_ids:
+        return
+    moved = set()
+    with transaction.atomic():
+        _lock()
+        entries = PlayerRank.objects.in_bulk(player_ids)
+        players = eligible_players().only(
+            "id", "average_rating", "total_ratings", "position", "club_id"
+        ).in_bulk(player_ids)
+        for player_id in player_ids:
+            moved |= _reposition(entries.get(player_id), players.get(player_id))
+        _bump_ranked(moved)
+
+
+def remove_from_leaderboard(player_id):
+    from .models import PlayerRank
+
+    with transaction.atomic():
+        _lock()
+        entry = PlayerRank.objects.filter(player_id=player_id).first()
+        _bump_ranked(_reposition(entry, None))
+
+
+def request_leaderboard_update(player_id):
+    """
+    Marks the player for repositioning by the process_aggregate_refreshes
+    worker; the caller never waits for the leaderboard lock.
+    """
+    from core.models import PendingAggregateRefresh
+
+    from .rating_aggregates import mark_aggregate_dirty
+
+    mark_aggregate_dirty(PendingAggregateRefresh.KIND_LEADERBOARD, player_id)
+
+
+def rebuild_leaderboard(batch_size=1000):
+    """Recomputes the whole leaderboard from Player; returns the number of ranked players."""
+    from .models import PlayerRank
+
+    rows = eligible_players().annotate(
+        overall=Window(RowNumber(), order_by=LEADERBOARD_ORDERING),
+        in_position=Window(RowNumber(), partition_by=[F("position")], order_by=LEADERBOARD_ORDERING),
+        in_club=Window(RowNumber(), partition_by=[F("club_id")], order_by=LEADERBOARD_ORDERING),
+    ).values_list(
+        "id", "average_rating", "total_ratings", "position", "club_id", "overall", "in_position", "in_club"
+    )
+    with transaction.atomic():
+        _lock()
+        PlayerRank.objects.all().delete()
+        entries = [
+            PlayerRank(
+                player_id=player_id,
+                average_rating=average_rating,
+                total_ratings=total_ratings,
+                position=position,
+                club_id=club_id,
+                overall_rank=overall,
+                position_rank=in_position,
+                club_rank=in_club if club_id is not None else None,
+            )
+            for player_id, average_rating, total_ratings, position, club_id, overall, in_position, in_club in rows
+        ]
+        PlayerRank.objects.bulk_create(entries, batch_size=batch_size)
+    return len(entries)
+
+
+def leaderboard_scope_size(rank_field, scope=None):
+    """Number of ranked players in a scope: its highest rank, read from the (scope, rank) index."""
+    from .models import PlayerRank
+
+    return PlayerRank.objects.filter(**(scope or {})).aggregate(size=Max(rank_field))["size"] or 0
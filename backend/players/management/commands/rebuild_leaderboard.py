@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from core.response_cache import PLAYER, PLAYERS, bump_versions, entity_keys
+from players.leaderboard import rebuild_leaderboard
+from players.models import Player
+
+
+class Command(BaseCommand):
+    help = 'Przelicza od zera ranking zawodników (players.PlayerRank): ogólny, per pozycja i per klub'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rozmiar paczki dla bulk_create',
+        )
+
+    def handle(self, *args, **kwargs):
+        ranked = rebuild_leaderboard(batch_size=kwargs['batch_size'])
+        bump_versions(PLAYERS, *entity_keys(PLAYER, Player.objects.values_list('id', flat=True)))
+        self.stdout.write(self.style.SUCCESS(f'Sklasyfikowano {ranked} zawodników'))
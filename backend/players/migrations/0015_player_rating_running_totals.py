@@ -0,0 +1,89 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def average_rating(total_sum, total_count):
+    # Kopia players.rating_aggregates.compose_average_rating (migracje nie importują kodu aplikacji):
+    # połówka w górę, żeby backfill dawał te same średnie co zapisy w trakcie działania.
+    if not total_count:
+        return 0
+    return float((Decimal(total_sum) / Decimal(total_count)).quantize(Decimal("0.01"), ROUND_HALF_UP))
+
+
+def backfill_rating_running_totals(apps, schema_editor):
+    Player = apps.get_model("players", "Player")
+    Rating = apps.get_model("ratings", "Rating")
+    FixtureRating = apps.get_model("matches", "FixtureRating")
+
+    classic = {
+        row["player_id"]: row
+        for row in Rating.objects.values("player_id").annotate(total=Sum("value"), count=Count("id"))
+    }
+    fixture = {
+        row["player_id"]: row
+        for row in FixtureRating.objects.exclude(player_id=None)
+        .values("player_id")
+        .annotate(total=Sum("value"), count=Count("id"))
+    }
+
+    players = []
+    for player in Player.objects.filter(pk__in={*classic.keys(), *fixture.keys()}):
+        classic_row = classic.get(player.pk) or {}
+        fixture_row = fixture.get(player.pk) or {}
+        player.classic_ratings_sum = classic_row.get("total") or 0
+        player.classic_ratings_count = classic_row.get("count") or 0
+        player.fixture_ratings_sum = fixture_row.get("total") or 0
+        player.fixture_ratings_count = fixture_row.get("count") or 0
+        total_sum = player.classic_ratings_sum + player.fixture_ratings_sum
+        total_count = player.classic_ratings_count + player.fixture_ratings_count
+        player.total_ratings = total_count
+        player.average_rating = average_rating(total_sum, total_count)
+        players.append(player)
+
+    Player.objects.bulk_update(
+        players,
+        [
+            "classic_ratings_sum",
+            "classic_ratings_count",
+            "fixture_ratings_sum",
+            "fixture_ratings_count",
+            "total_ratings",
+            "average_rating",
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("players", "0014_player_card_updated_at"),
+        ("ratings", "0003_rating_user_player_idx"),
+        ("matches", "0002_seed_club_aliases"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="player",
+            name="classic_ratings_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="player",
+            name="classic_ratings_sum",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="player",
+            name="fixture_ratings_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="player",
+            name="fixture_ratings_sum",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_running_totals, migrations.RunPython.noop),
+    ]
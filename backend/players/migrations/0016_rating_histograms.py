@@ -0,0 +1,49 @@
+import django.contrib.postgres.fields
+from django.db import migrations, models
+from django.db.models import Count
+import players.rating_aggregates
+
+
+def backfill_rating_histograms(apps, schema_editor):
+    Player = apps.get_model("players", "Player")
+    Rating = apps.get_model("ratings", "Rating")
+    FixtureRating = apps.get_model("matches", "FixtureRating")
+
+    histograms = {}
+    for model in (Rating, FixtureRating):
+        rows = (
+            model.objects.exclude(player_id=None)
+            .values_list("player_id", "value")
+            .annotate(count=Count("id"))
+            .order_by()
+        )
+        for player_id, value, count in rows:
+            histograms.setdefault(player_id, [0] * 10)[value - 1] += count
+
+    players = []
+    for player in Player.objects.filter(pk__in=histograms.keys()):
+        player.rating_histogram = histograms[player.pk]
+        players.append(player)
+    Player.objects.bulk_update(players, ["rating_histogram"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("players", "0015_player_rating_running_totals"),
+        ("ratings", "0003_rating_user_player_idx"),
+        ("matches", "0003_fixtureplayer_rating_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="player",
+            name="rating_histogram",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.PositiveIntegerField(),
+                default=players.rating_aggregates.empty_rating_histogram,
+                size=10,
+            ),
+        ),
+        migrations.RunPython(backfill_rating_histograms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("players", "0016_rating_histograms"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="player",
+            index=models.Index(
+                fields=["-average_rating", "-id"], name="player_rating_rank_idx"
+            ),
+        ),
+    ]
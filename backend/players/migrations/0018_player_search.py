@@ -0,0 +1,51 @@
+from django.db import migrations, models
+
+from matches.utils import normalize_text
+
+
+def backfill_normalized_names(apps, schema_editor):
+    Player = apps.get_model("players", "Player")
+    players = list(Player.objects.only("id", "name"))
+    for player in players:
+        player.normalized_name = normalize_text(player.name)
+    Player.objects.bulk_update(players, ["normalized_name"], batch_size=500)
+
+
+def create_trigram_index(apps, schema_editor):
+    # Indeks trigramowy tylko tam, gdzie jest pg_trgm; bez niego wyszukiwarka
+    # korzysta ze zwykłego indeksu na normalized_name (players.search).
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS player_normalized_name_trgm "
+        "ON players_player USING gin (normalized_name gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS player_normalized_name_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("players", "0017_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="player",
+            name="normalized_name",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=100
+            ),
+        ),
+        migrations.RunPython(backfill_normalized_names, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
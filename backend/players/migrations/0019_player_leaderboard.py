@@ -0,0 +1,96 @@
+from django.db import migrations, models
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+import django.db.models.deletion
+
+
+def backfill_leaderboard(apps, schema_editor):
+    # Ta sama kolejność co players.leaderboard.LEADERBOARD_ORDERING.
+    Player = apps.get_model("players", "Player")
+    PlayerRank = apps.get_model("players", "PlayerRank")
+    ordering = (F("average_rating").desc(), F("total_ratings").desc(), F("id").asc())
+    rows = (
+        Player.objects.filter(total_ratings__gte=1)
+        .exclude(club__name="Loan")
+        .annotate(
+            overall=Window(RowNumber(), order_by=ordering),
+            in_position=Window(RowNumber(), partition_by=[F("position")], order_by=ordering),
+            in_club=Window(RowNumber(), partition_by=[F("club_id")], order_by=ordering),
+        )
+        .values_list(
+            "id", "average_rating", "total_ratings", "position", "club_id", "overall", "in_position", "in_club"
+        )
+    )
+    PlayerRank.objects.bulk_create(
+        [
+            PlayerRank(
+                player_id=player_id,
+                average_rating=average_rating,
+                total_ratings=total_ratings,
+                position=position,
+                club_id=club_id,
+                overall_rank=overall,
+                position_rank=in_position,
+                club_rank=in_club if club_id is not None else None,
+            )
+            for player_id, average_rating, total_ratings, position, club_id, overall, in_position, in_club in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("clubs", "0001_initial"),
+        ("players", "0018_player_search"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PlayerRank",
+            fields=[
+                (
+                    "player",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="leaderboard_entry",
+                        serialize=False,
+                        to="players.player",
+                    ),
+                ),
+                ("average_rating", models.FloatField()),
+                ("total_ratings", models.IntegerField()),
+                ("position", models.CharField(max_length=2)),
+                ("overall_rank", models.PositiveIntegerField()),
+                ("position_rank", models.PositiveIntegerField()),
+                ("club_rank", models.PositiveIntegerField(null=True)),
+                (
+                    "club",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="clubs.club",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["overall_rank"],
+                "indexes": [
+                    models.Index(
+                        fields=["overall_rank"], name="player_rank_overall_idx"
+                    ),
+                    models.Index(
+                        fields=["position", "position_rank"],
+                        name="player_rank_position_idx",
+                    ),
+                    models.Index(
+                        fields=["club", "club_rank"], name="player_rank_club_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_leaderboard, migrations.RunPython.noop),
+    ]
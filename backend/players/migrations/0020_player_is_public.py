@@ -0,0 +1,42 @@
+from django.db import migrations, models
+
+
+def backfill_is_public(apps, schema_editor):
+    Player = apps.get_model("players", "Player")
+    Player.objects.filter(club__is_loan_pool=True).update(is_public=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("players", "0019_player_leaderboard"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="player",
+            name="is_public",
+            field=models.BooleanField(default=True),
+        ),
+        migrations.RunPython(backfill_is_public, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="player",
+            index=models.Index(
+                fields=["is_public", "-average_rating", "-id"],
+                name="player_public_rating_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="player",
+            index=models.Index(
+                fields=["is_public", "name"], name="player_public_name_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="player",
+            index=models.Index(
+                fields=["is_public", "-card_updated_at", "-id"],
+                name="player_public_card_idx",
+            ),
+        ),
+    ]
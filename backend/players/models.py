@@ -1,3 +1,4 @@
+from django.contrib.postgres.fields import ArrayField
 from django.db import models
 from clubs.models import Club
 from django.contrib.auth.models import User
@@ -11,6 +12,11 @@ from django.core.files.base import ContentFile
 from io import BytesIO
 from PIL import Image, ImageOps
 
+from matches.utils import normalize_text
+
+from .leaderboard import remove_from_leaderboard, request_leaderboard_update
+from .rating_aggregates import empty_rating_histogram
+
 
 # Player model represents football players in the Ekstraklasa league
 # Each player belongs to a specific club (ForeignKey relationship with Club model)
@@ -31,6 +37,18 @@ def player_card_upload_to(instance, filename):
 
 
 class Player(models.Model):
+    # Maintained by rating signals with F() updates; a full save() of a stale
+    # instance must never overwrite them.
+    RATING_AGGREGATE_FIELDS = (
+        "average_rating",
+        "total_ratings",
+        "classic_ratings_sum",
+        "classic_ratings_count",
+        "fixture_ratings_sum",
+        "fixture_ratings_count",
+        "rating_histogram",
+    )
+
     POSITION_CHOICES = [
         ("GK", "Goalkeeper"),
         ("DF", "Defender"),
@@ -39,6 +57,10 @@ class Player(models.Model):
     ]
 
     name = models.CharField(max_length=100, db_index=True)  # Dodany indeks do wyszukiwania po nazwie
+    # False dla zawodników klubu-worka na wypożyczonych (Club.is_loan_pool); liczone w save().
+    is_public = models.BooleanField(default=True)
+    # Nazwa bez polskich znaków i wielkich liter (matches.utils.normalize_text), pod wyszukiwarkę.
+    normalized_name = models.CharField(max_length=100, db_index=True, editable=False, default="")
     slug = models.SlugField(max_length=150, unique=True, null=True, blank=True)  # Pole dla SEO-friendly URL
     position = models.CharField(max_length=2, choices=POSITION_CHOICES, db_index=True)  # Dodany indeks do filtrowania po pozycji
     club = models.ForeignKey(Club, on_delete=models.CASCADE, related_name='players', null=True, db_index=True)  # Zmieniono na CASCADE - usunięcie klubu usuwa jego piłkarzy
@@ -57,6 +79,14 @@ class Player(models.Model):
     gif_urls = models.JSONField(null=True, blank=True, default=list)  # List of GIF URLs to display
     average_rating = models.FloatField(default=0)  # Przechowuje średnią ocen
     total_ratings = models.IntegerField(default=0)  # Przechowuje liczbę ocen
+    # Running sums/counts per rating source, updated atomically on every vote
+    # (see players.rating_aggregates.apply_player_rating_delta).
+    classic_ratings_sum = models.BigIntegerField(default=0)
+    classic_ratings_count = models.IntegerField(default=0)
+    fixture_ratings_sum = models.BigIntegerField(default=0)
+    fixture_ratings_count = models.IntegerField(default=0)
+    # Liczba głosów dla każdej wartości 1..10 (oba źródła ocen).
+    rating_histogram = ArrayField(models.PositiveIntegerField(), size=10, default=empty_rating_histogram)
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
 
@@ -64,6 +94,19 @@ class Player(models.Model):
         # Generuj slug tylko jeśli nie istnieje
         if not self.slug:
             self.slug = self._generate_unique_slug()
+        self.normalized_name = normalize_text(self.name)
+        self.is_public = self.club_id is None or not self.club.is_loan_pool
+        if (
+            not self._state.adding
+            and self.pk is not None
+            and not kwargs.get("force_insert")
+            and kwargs.get("update_fields") is None
+        ):
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.RATING_AGGREGATE_FIELDS
+            ]
         super().save(*args, **kwargs)
     
     def _generate_unique_slug(self):
@@ -100,9 +143,45 @@ class Player(models.Model):
         indexes = [
             # Indeks złożony dla wyszukiwania zawodników po klubie i pozycji
             models.Index(fields=['club', 'position'], name='club_position_idx'),
+            # Kolejność rankingu i kursora paginacji (PlayerRankingPagination)
+            models.Index(fields=['-average_rating', '-id'], name='player_rating_rank_idx'),
+            # Publiczne listy: ranking, alfabet i ostatnie karty
+            models.Index(fields=['is_public', '-average_rating', '-id'], name='player_public_rating_idx'),
+            models.Index(fields=['is_public', 'name'], name='player_public_name_idx'),
+            models.Index(fields=['is_public', '-card_updated_at', '-id'], name='player_public_card_idx'),
         ]
 
 
+class PlayerRank(models.Model):
+    """
+    Materialized leaderboard row of a rated player, maintained incrementally
+    by players.leaderboard (overall, per-position and per-club rank).
+    """
+
+    player = models.OneToOneField(
+        Player, on_delete=models.CASCADE, primary_key=True, related_name='leaderboard_entry'
+    )
+    # Snapshot of the ordering key and the scopes at the last reposition.
+    average_rating = models.FloatField()
+    total_ratings = models.IntegerField()
+    position = models.CharField(max_length=2)
+    club = models.ForeignKey(Club, on_delete=models.CASCADE, null=True, related_name='+')
+    overall_rank = models.PositiveIntegerField()
+    position_rank = models.PositiveIntegerField()
+    club_rank = models.PositiveIntegerField(null=True)
+
+    class Meta:
+        ordering = ['overall_rank']
+        indexes = [
+            models.Index(fields=['overall_rank'], name='player_rank_overall_idx'),
+            models.Index(fields=['position', 'position_rank'], name='player_rank_position_idx'),
+            models.Index(fields=['club', 'club_rank'], name='player_rank_club_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.overall_rank} {self.player_id}"
+
+
 class PlayerMedia(models.Model):
     MEDIA_GIF = "gif"
     MEDIA_TWEET = "tweet"
@@ -142,6 +221,18 @@ def sync_player_media_lists(sender, instance, **kwargs):
     )
     Player.objects.filter(pk=player.pk).update(gif_urls=gif_urls, tweet_urls=tweet_urls)
 
+@receiver(post_save, sender=Player)
+def reposition_player_on_leaderboard(sender, instance, raw=False, **kwargs):
+    # Zmiana pozycji/klubu lub odświeżenie agregatów przesuwa gracza w rankingu.
+    if not raw:
+        request_leaderboard_update(instance.pk)
+
+
+@receiver(pre_delete, sender=Player)
+def remove_player_from_leaderboard(sender, instance, **kwargs):
+    remove_from_leaderboard(instance.pk)
+
+
 @receiver(pre_delete, sender=Player)
 def delete_player_photo(sender, instance, **kwargs):
     # Delete the file from S3 if it exists
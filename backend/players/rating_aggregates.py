@@ -1,56 +1,466 @@
-from django.db.models import Avg, Count
+import logging
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.contrib.postgres.fields import ArrayField
+from django.db.models import Count, F, FloatField, Func, IntegerField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+from django.utils import timezone
+
+from core.response_cache import FIXTURES, PLAYERS, bump_versions
+
+from .leaderboard import request_leaderboard_update, update_leaderboard
+
+logger = logging.getLogger(__name__)
+
+RATING_SOURCE_CLASSIC = "classic"
+RATING_SOURCE_FIXTURE = "fixture"
+
+# Player columns holding the running (sum, count) for each rating source.
+RATING_SOURCE_FIELDS = {
+    RATING_SOURCE_CLASSIC: ("classic_ratings_sum", "classic_ratings_count"),
+    RATING_SOURCE_FIXTURE: ("fixture_ratings_sum", "fixture_ratings_count"),
+}
+
+
+# Votes are whole numbers 1..10; histograms keep one counter per value.
+RATING_SCALE = tuple(range(1, 11))
+
+
+def empty_rating_histogram():
+    return [0] * len(RATING_SCALE)
+
+
+def histogram_update_expression(field_name, histogram_delta):
+    """
+    SQL expression rebuilding the histogram array from its current elements
+    plus ``histogram_delta`` (``{value: count_delta}``), so it can be used in
+    the same atomic UPDATE as the F() counters.
+    """
+    return Func(
+        *[
+            F(f"{field_name}__{index}") + histogram_delta.get(value, 0)
+            for index, value in enumerate(RATING_SCALE)
+        ],
+        template="ARRAY[%(expressions)s]",
+        output_field=ArrayField(IntegerField()),
+    )
+
+
+def histogram_median(histogram):
+    """Lower median of the votes described by ``histogram``, or None."""
+    total = sum(histogram or ())
+    if not total:
+        return None
+    cumulative = 0
+    for value, count in zip(RATING_SCALE, histogram):
+        cumulative += count
+        if cumulative * 2 >= total:
+            return value
+    return RATING_SCALE[-1]
+
+
+def histogram_percentile_rank(histogram, value):
+    """
+    Percentage of votes below ``value`` plus half of the votes equal to it.
+    """
+    total = sum(histogram or ())
+    if not total:
+        return None
+    below = sum(count for scale_value, count in zip(RATING_SCALE, histogram) if scale_value < value)
+    equal = sum(count for scale_value, count in zip(RATING_SCALE, histogram) if scale_value == value)
+    return round(100 * (below + equal / 2) / total, 1)
+
+
+def compose_average_rating(total_sum, total_count):
+    # Zaokrąglenie "połówka w górę", tak jak ROUND() na numeric w apply_player_rating_delta;
+    # round() na floacie (połówka do parzystej) dawałby np. 6.12 zamiast 6.13 dla 49/8.
+    if not total_count:
+        return 0
+    return float((Decimal(total_sum) / Decimal(total_count)).quantize(Decimal("0.01"), ROUND_HALF_UP))
+
+
+def apply_player_rating_delta(player_id, source, value_delta=0, count_delta=0, histogram_delta=None):
+    """
+    Applies a single vote change to the player's running totals in one UPDATE.
+
+    Every SET expression reads the pre-update row, so average_rating and
+    total_ratings are derived from exactly the totals being written and
+    concurrent votes never overwrite each other.
+    """
+    from players.models import Player
+
+    histogram_delta = {value: delta for value, delta in (histogram_delta or {}).items() if delta}
+    if not player_id or (not value_delta and not count_delta and not histogram_delta):
+        return
+
+    new_values = {}
+    total_sum = Value(0)
+    total_count = Value(0)
+    for field_source, (sum_field, count_field) in RATING_SOURCE_FIELDS.items():
+        source_sum = F(sum_field)
+        source_count = F(count_field)
+        if field_source == source:
+            source_sum = source_sum + value_delta
+            source_count = source_count + count_delta
+            new_values[sum_field] = source_sum
+            new_values[count_field] = source_count
+        total_sum = total_sum + source_sum
+        total_count = total_count + source_count
+    if histogram_delta:
+        new_values["rating_histogram"] = histogram_update_expression("rating_histogram", histogram_delta)
+
+    Player.objects.filter(pk=player_id).update(
+        **new_values,
+        total_ratings=total_count,
+        average_rating=Coalesce(
+            Round(
+                Cast(total_sum, FloatField()) / Cast(NullIf(total_count, Value(0)), FloatField()),
+                2,
+            ),
+            Value(0.0),
+        ),
+    )
+    request_leaderboard_update(player_id)
+
+
+def rating_transition_deltas(previous=None, current=None):
+    """
+    Translates a vote transition into
+    ``(key, value_delta, count_delta, histogram_delta)`` deltas.
+
+    ``previous`` and ``current`` are ``(key, value)`` pairs (or None for an
+    insert / delete respectively), where ``key`` is the aggregate owner id.
+    ``histogram_delta`` maps vote values to counter changes.
+    """
+    if previous and current and previous[0] == current[0]:
+        old_value, new_value = int(previous[1]), int(current[1])
+        histogram_delta = {} if old_value == new_value else {old_value: -1, new_value: 1}
+        return [(current[0], new_value - old_value, 0, histogram_delta)]
+
+    deltas = []
+    if previous:
+        deltas.append((previous[0], -int(previous[1]), -1, {int(previous[1]): -1}))
+    if current:
+        deltas.append((current[0], int(current[1]), 1, {int(current[1]): 1}))
+    return deltas
+
+
+def apply_player_rating_change(source, previous=None, current=None):
+    for player_id, value_delta, count_delta, histogram_delta in rating_transition_deltas(previous, current):
+        apply_player_rating_delta(player_id, source, value_delta, count_delta, histogram_delta)
+
+
+def apply_fixture_player_rating_delta(fixture_player_id, value_delta=0, count_delta=0, histogram_delta=None):
+    from matches.models import FixturePlayer
+
+    histogram_delta = {value: delta for value, delta in (histogram_delta or {}).items() if delta}
+    if not fixture_player_id or (not value_delta and not count_delta and not histogram_delta):
+        return
+    changes = {
+        "ratings_sum": F("ratings_sum") + value_delta,
+        "ratings_count": F("ratings_count") + count_delta,
+    }
+    if histogram_delta:
+        changes["ratings_histogram"] = histogram_update_expression("ratings_histogram", histogram_delta)
+    FixturePlayer.objects.filter(pk=fixture_player_id).update(**changes)
+
+
+def apply_fixture_player_rating_change(previous=None, current=None):
+    for fixture_player_id, value_delta, count_delta, histogram_delta in rating_transition_deltas(previous, current):
+        apply_fixture_player_rating_delta(fixture_player_id, value_delta, count_delta, histogram_delta)
+
+
+def rollup_bucket_start(moment, granularity):
+    from ratings.models import PlayerRatingRollup
+
+    moment = moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if granularity == PlayerRatingRollup.GRANULARITY_DAY:
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def apply_rating_rollup_delta(player_id, source, created_at, value_delta=0, count_delta=0):
+    """
+    Bumps the hourly and daily rollup rows of the bucket ``created_at`` falls in.
+    """
+    from ratings.models import PlayerRatingRollup
+
+    if not player_id or created_at is None or (not value_delta and not count_delta):
+        return
+
+    for granularity in (PlayerRatingRollup.GRANULARITY_HOUR, PlayerRatingRollup.GRANULARITY_DAY):
+        lookup = {
+            "player_id": player_id,
+            "source": source,
+            "granularity": granularity,
+            "bucket_start": rollup_bucket_start(created_at, granularity),
+        }
+        changes = {
+            "ratings_sum": F("ratings_sum") + value_delta,
+            "ratings_count": F("ratings_count") + count_delta,
+        }
+        if not PlayerRatingRollup.objects.filter(**lookup).update(**changes):
+            PlayerRatingRollup.objects.get_or_create(**lookup)
+            PlayerRatingRollup.objects.filter(**lookup).update(**changes)
+
+
+def apply_rating_rollup_change(source, created_at, previous=None, current=None):
+    for player_id, value_delta, count_delta, _ in rating_transition_deltas(previous, current):
+        apply_rating_rollup_delta(player_id, source, created_at, value_delta, count_delta)
+
+
+def _raw_rating_totals(start, end):
+    """``{player_id: (ratings_sum, ratings_count)}`` of both rating sources, read from the votes themselves."""
+    from matches.models import FixtureRating
+    from ratings.models import Rating
+
+    totals = {}
+    for model in (Rating, FixtureRating):
+        rows = (
+            model.objects.filter(created_at__gte=start, created_at__lt=end, player_id__isnull=False)
+            .values("player_id")
+            .annotate(total=Sum("value"), count=Count("id"))
+            .order_by()
+        )
+        for row in rows:
+            total, count = totals.get(row["player_id"], (0, 0))
+            totals[row["player_id"]] = (total + (row["total"] or 0), count + row["count"])
+    return totals
+
+
+def rollup_rating_totals(start, end):
+    """
+    Returns ``{player_id: (ratings_sum, ratings_count)}`` for votes created in
+    ``[start, end)``, summed over both rating sources.
+
+    The whole UTC hours inside the range are read from the rollups: day
+    buckets when both of their edges fall on UTC midnight, hour buckets
+    otherwise. Bounds that are not whole UTC hours (e.g. local midnight in a
+    half-hour-offset time zone) add the partial edge hours from the raw votes.
+    """
+    from ratings.models import PlayerRatingRollup
+
+    hour = PlayerRatingRollup.GRANULARITY_HOUR
+    inner_start = rollup_bucket_start(start, hour)
+    if inner_start < start:
+        inner_start += timedelta(hours=1)
+    inner_end = max(rollup_bucket_start(end, hour), inner_start)
+
+    totals = {}
+    if inner_start < inner_end:
+        day_aligned = all(
+            rollup_bucket_start(bound, PlayerRatingRollup.GRANULARITY_DAY) == bound
+            for bound in (inner_start, inner_end)
+        )
+        rows = (
+            PlayerRatingRollup.objects.filter(
+                granularity=PlayerRatingRollup.GRANULARITY_DAY if day_aligned else hour,
+                bucket_start__gte=inner_start,
+                bucket_start__lt=inner_end,
+            )
+            .values("player_id")
+            .annotate(total=Sum("ratings_sum"), count=Sum("ratings_count"))
+            .filter(count__gt=0)
+            .order_by()
+        )
+        totals = {row["player_id"]: (row["total"] or 0, row["count"]) for row in rows}
+    else:
+        # Zakres krótszy niż pełna godzina: całość z surowych głosów.
+        inner_start = inner_end = max(start, min(inner_start, end))
+
+    for edge_start, edge_end in ((start, inner_start), (inner_end, end)):
+        if edge_start < edge_end:
+            for player_id, (total, count) in _raw_rating_totals(edge_start, edge_end).items():
+                stored_total, stored_count = totals.get(player_id, (0, 0))
+                totals[player_id] = (stored_total + total, stored_count + count)
+    return totals
 
 
 def refresh_player_rating_snapshot(player):
+    """
+    Rebuilds the player's running totals from raw votes.
+
+    Votes keep the totals up to date incrementally; this is the repair path.
+    """
     from matches.models import FixtureRating
     from ratings.models import Rating
 
     rating_totals = Rating.objects.filter(player=player).aggregate(
         count=Count("id"),
-        avg=Avg("value"),
+        total=Sum("value"),
     )
     fixture_rating_totals = FixtureRating.objects.filter(player=player).aggregate(
         count=Count("id"),
-        avg=Avg("value"),
+        total=Sum("value"),
     )
 
-    classic_count = rating_totals["count"] or 0
-    fixture_count = fixture_rating_totals["count"] or 0
-    total_count = classic_count + fixture_count
+    histogram = empty_rating_histogram()
+    for queryset in (Rating.objects.filter(player=player), FixtureRating.objects.filter(player=player)):
+        for value, count in queryset.values_list("value").annotate(count=Count("id")).order_by():
+            histogram[RATING_SCALE.index(value)] += count
 
-    if total_count:
-        weighted_sum = (rating_totals["avg"] or 0) * classic_count
-        weighted_sum += (fixture_rating_totals["avg"] or 0) * fixture_count
-        average_rating = round(weighted_sum / total_count, 2)
-    else:
-        average_rating = 0
+    player.rating_histogram = histogram
+    player.classic_ratings_sum = rating_totals["total"] or 0
+    player.classic_ratings_count = rating_totals["count"] or 0
+    player.fixture_ratings_sum = fixture_rating_totals["total"] or 0
+    player.fixture_ratings_count = fixture_rating_totals["count"] or 0
 
-    player.average_rating = average_rating
+    total_sum = player.classic_ratings_sum + player.fixture_ratings_sum
+    total_count = player.classic_ratings_count + player.fixture_ratings_count
+    player.average_rating = compose_average_rating(total_sum, total_count)
     player.total_ratings = total_count
-    player.save(update_fields=["average_rating", "total_ratings"])
+    player.save(update_fields=list(player.RATING_AGGREGATE_FIELDS))
 
 
 def refresh_fixture_rating_summary(fixture):
-    from matches.models import FixtureRating
+    """
+    Rebuilds fixture-level averages from the per-FixturePlayer counters,
+    so the cost depends on the lineup size, not on the number of votes.
+    """
+    from matches.models import FixturePlayer
 
-    fixture_qs = FixtureRating.objects.filter(fixture=fixture)
-    grouped = fixture_qs.values("fixture_player__side").annotate(
-        count=Count("id"),
-        avg=Avg("value"),
+    grouped = (
+        FixturePlayer.objects.filter(fixture=fixture)
+        .values("side")
+        .annotate(total=Sum("ratings_sum"), count=Sum("ratings_count"))
+        .order_by()
     )
 
     home_avg = 0
     away_avg = 0
     total_count = 0
     for row in grouped:
-        side = row["fixture_player__side"]
-        total_count += row["count"] or 0
+        side = row["side"]
+        side_count = row["count"] or 0
+        total_count += side_count
         if side == "home":
-            home_avg = round(row["avg"] or 0, 2)
+            home_avg = compose_average_rating(row["total"] or 0, side_count)
         elif side == "away":
-            away_avg = round(row["avg"] or 0, 2)
+            away_avg = compose_average_rating(row["total"] or 0, side_count)
 
     fixture.ratings_count = total_count
     fixture.home_rating_avg = home_avg
     fixture.away_rating_avg = away_avg
     fixture.save(update_fields=["ratings_count", "home_rating_avg", "away_rating_avg"])
+
+
+def mark_aggregate_dirty(kind, object_id):
+    from core.models import PendingAggregateRefresh
+
+    if not object_id:
+        return
+    # Ponowne oznaczenie przesuwa requested_at: worker, który właśnie przelicza ten klucz,
+    # nie usunie wtedy znacznika i głos trafi do następnego przebiegu.
+    now = timezone.now()
+    PendingAggregateRefresh.objects.bulk_create(
+        [PendingAggregateRefresh(kind=kind, object_id=object_id, requested_at=now, first_requested_at=now)],
+        update_conflicts=True,
+        unique_fields=["kind", "object_id"],
+        update_fields=["requested_at"],
+    )
+
+
+def request_fixture_rating_summary_refresh(fixture):
+    """
+    Refreshes the fixture summary inline, or only marks it dirty when
+    DEFERRED_AGGREGATE_REFRESH is enabled and the worker is expected to run.
+    """
+    from core.models import PendingAggregateRefresh
+
+    if getattr(settings, "DEFERRED_AGGREGATE_REFRESH", False):
+        mark_aggregate_dirty(PendingAggregateRefresh.KIND_FIXTURE, fixture.pk)
+    else:
+        refresh_fixture_rating_summary(fixture)
+
+
+def _clear_aggregate_markers(markers):
+    """Deletes the claimed markers unless they were marked dirty again since the claim."""
+    from core.models import PendingAggregateRefresh
+
+    condition = Q()
+    for marker_id, requested_at in markers:
+        condition |= Q(id=marker_id, requested_at=requested_at)
+    if condition:
+        PendingAggregateRefresh.objects.filter(condition).delete()
+
+
+def _claim_aggregate_markers(limit):
+    """
+    Claims up to ``limit`` dirty keys, the longest-dirty first. Rows claimed by
+    a concurrent worker are skipped, so two workers never refresh the same key.
+    """
+    from core.models import PendingAggregateRefresh
+
+    now = timezone.now()
+    claim_seconds = getattr(settings, "AGGREGATE_REFRESH_CLAIM_SECONDS", 300)
+    with transaction.atomic():
+        claimed = list(
+            PendingAggregateRefresh.objects.select_for_update(skip_locked=True)
+            .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now))
+            .order_by("first_requested_at")
+            .values_list("id", "kind", "object_id", "requested_at")[:limit]
+        )
+        PendingAggregateRefresh.objects.filter(id__in=[row[0] for row in claimed]).update(
+            claimed_until=now + timedelta(seconds=claim_seconds)
+        )
+    return claimed
+
+
+def flush_pending_aggregate_refreshes(limit=500):
+    """
+    Recomputes up to ``limit`` dirty keys, each exactly once, in the order
+    they first became dirty; keys claimed by another worker are left to it.
+
+    Each marker is deleted in the same transaction as its refresh, so a failed
+    or interrupted refresh leaves the key dirty. A vote landing mid-refresh
+    moves the marker's requested_at, the delete skips it and the key is picked
+    up by the next pass. Returns the number of refreshed keys.
+    """
+    from core.models import PendingAggregateRefresh
+    from matches.models import Fixture
+
+    claimed = _claim_aggregate_markers(limit)
+
+    markers_by_kind = {}
+    for marker_id, kind, object_id, requested_at in claimed:
+        markers_by_kind.setdefault(kind, {})[object_id] = (marker_id, requested_at)
+
+    refreshed = 0
+    # Pozycje w rankingu przesuwamy jedną transakcją dla całej paczki.
+    leaderboard_markers = markers_by_kind.pop(PendingAggregateRefresh.KIND_LEADERBOARD, {})
+    if leaderboard_markers:
+        try:
+            with transaction.atomic():
+                update_leaderboard(list(leaderboard_markers))
+                _clear_aggregate_markers(leaderboard_markers.values())
+        except Exception:
+            logger.exception("Leaderboard update failed for %d players", len(leaderboard_markers))
+        else:
+            refreshed += len(leaderboard_markers)
+
+    refreshers = {
+        PendingAggregateRefresh.KIND_FIXTURE: (Fixture, refresh_fixture_rating_summary),
+    }
+    for kind, markers in markers_by_kind.items():
+        model, refresh = refreshers[kind]
+        instances = model.objects.in_bulk(list(markers))
+        # Znaczniki usuniętych obiektów nie mają czego odświeżać.
+        _clear_aggregate_markers(marker for object_id, marker in markers.items() if object_id not in instances)
+        for object_id, instance in instances.items():
+            try:
+                with transaction.atomic():
+                    refresh(instance)
+                    _clear_aggregate_markers([markers[object_id]])
+            except Exception:
+                logger.exception("Aggregate refresh failed for %s:%s", kind, object_id)
+            else:
+                refreshed += 1
+    # Znaczniki, które zostały (błąd albo nowy głos w trakcie), wracają do kolejki od razu.
+    PendingAggregateRefresh.objects.filter(id__in=[row[0] for row in claimed]).update(claimed_until=None)
+    if refreshed:
+        bump_versions(PLAYERS, FIXTURES)
+    return refreshed
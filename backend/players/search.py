@@ -0,0 +1,106 @@
+"""
+Accent-insensitive player search.
+
+Queries are compared with ``Player.normalized_name`` and
+``PlayerAlias.normalized_alias``, both produced by
+``matches.utils.normalize_text``, so "Lukasz" finds "Łukasz".
+
+With pg_trgm installed, candidates come from the trigram GIN indexes
+(substring or word-similarity match) and are ranked by trigram word
+similarity in SQL. Without it, the search falls back to a substring match
+on the normalized columns, ranked in Python with ``matches.utils.similarity``.
+"""
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import FloatField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from matches.models import PlayerAlias
+from matches.utils import normalize_text, similarity
+
+MIN_SEARCH_QUERY_LENGTH = 2
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+# Fallback: tylu kandydatów co najwyżej ocenia Python.
+FALLBACK_CANDIDATE_LIMIT = 200
+
+_trigram_available = {}
+
+
+def trigram_search_available():
+    if connection.vendor != "postgresql":
+        return False
+    if connection.alias not in _trigram_available:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_available[connection.alias] = cursor.fetchone() is not None
+    return _trigram_available[connection.alias]
+
+
+def search_players(queryset, query, limit=DEFAULT_SEARCH_LIMIT):
+    """
+    Returns up to ``limit`` players from ``queryset`` matching ``query`` by
+    name or alias, best match first. Each player gets ``search_rank``.
+    """
+    term = normalize_text(query)
+    if len(term) < MIN_SEARCH_QUERY_LENGTH:
+        return []
+    if trigram_search_available():
+        return list(_trigram_search(queryset, term, limit))
+    return _fallback_search(queryset, term, limit)
+
+
+def _trigram_search(queryset, term, limit):
+    aliases = PlayerAlias.objects.filter(
+        Q(normalized_alias__contains=term) | Q(normalized_alias__trigram_word_similar=term)
+    )
+    alias_rank = Subquery(
+        aliases.filter(player=OuterRef("pk"))
+        .annotate(rank=TrigramWordSimilarity(term, "normalized_alias"))
+        .order_by("-rank")
+        .values("rank")[:1],
+        output_field=FloatField(),
+    )
+    return (
+        queryset.filter(
+            Q(normalized_name__contains=term)
+            | Q(normalized_name__trigram_word_similar=term)
+            | Q(pk__in=aliases.values("player_id"))
+        )
+        .annotate(
+            search_rank=Greatest(
+                TrigramWordSimilarity(term, "normalized_name"),
+                Coalesce(alias_rank, Value(0.0)),
+            )
+        )
+        .order_by("-search_rank", "name", "id")[:limit]
+    )
+
+
+def _fallback_search(queryset, term, limit):
+    alias_names = {}
+    for player_id, alias in PlayerAlias.objects.filter(normalized_alias__contains=term).values_list(
+        "player_id", "normalized_alias"
+    ):
+        alias_names.setdefault(player_id, []).append(alias)
+
+    candidates = queryset.filter(
+        Q(normalized_name__contains=term) | Q(pk__in=list(alias_names))
+    ).order_by("name", "id")[:FALLBACK_CANDIDATE_LIMIT]
+
+    players = []
+    for player in candidates:
+        names = [player.normalized_name, *alias_names.get(player.pk, ())]
+        player.search_rank = max(_match_rank(term, name) for name in names)
+        players.append(player)
+    players.sort(key=lambda player: -player.search_rank)
+    return players[:limit]
+
+
+def _match_rank(term, name):
+    # Trafienie w początek słowa oceniamy względem tego słowa, nie całej nazwy.
+    prefixed = [word for word in name.split() if word.startswith(term)]
+    if prefixed:
+        return max(similarity(term, word) for word in prefixed)
+    return similarity(term, name)
@@ -1,6 +1,9 @@
 from rest_framework import serializers
+from core.fieldsets import SparseFieldsetSerializerMixin
+from core.loaders import BatchLoadingListSerializer, BatchLoadingSerializerMixin
 from clubs.models import Club
-from .models import Player, PlayerMedia
+from .models import Player, PlayerMedia, PlayerRank
+from .rating_aggregates import histogram_median
 from ratings.models import Rating
 from ratings.serializers import RatingSerializer
 from comments.models import Comment
@@ -21,7 +24,41 @@ class NullableImageField(serializers.ImageField):
         return super().to_internal_value(data)
 
 
-class PlayerSerializer(serializers.ModelSerializer):
+def load_player_media_urls(player_ids, context):
+    media = {}
+    rows = (
+        PlayerMedia.objects.filter(player_id__in=player_ids)
+        .order_by('-created_at')
+        .values_list('player_id', 'media_type', 'url')
+    )
+    for player_id, media_type, url in rows:
+        media.setdefault(player_id, {}).setdefault(media_type, []).append(url)
+    return media
+
+
+def load_user_ratings(player_ids, context):
+    request = context.get('request')
+    if not request or not request.user.is_authenticated:
+        return {}
+    ratings = (
+        Rating.objects.filter(user=request.user, player_id__in=player_ids)
+        .select_related('user')
+        .order_by('created_at')
+    )
+    return {rating.player_id: RatingSerializer(rating).data for rating in ratings}
+
+
+class PlayerSerializer(BatchLoadingSerializerMixin, SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    batch_loaders = {
+        'player_media_urls': (lambda player: player.pk, load_player_media_urls),
+        'player_user_rating': (lambda player: player.pk, load_user_ratings),
+    }
+    # Pola odpowiedzi korzystające z danego loadera.
+    loader_fields = {
+        'player_media_urls': ('gif_urls', 'tweet_urls'),
+        'player_user_rating': ('user_rating',),
+    }
+
     # Używamy pól modelu zamiast metod @property
     club_name = serializers.CharField(source='club.name', read_only=True)
     club_id = serializers.PrimaryKeyRelatedField(
@@ -40,6 +77,9 @@ class PlayerSerializer(serializers.ModelSerializer):
     rating_avg = serializers.FloatField(source='average_rating', read_only=True)  # Dla kompatybilności ze starym frontendem
     tweet_urls = serializers.SerializerMethodField()
     gif_urls = serializers.SerializerMethodField()
+    rating_histogram = serializers.ListField(child=serializers.IntegerField(), read_only=True)
+    rating_median = serializers.SerializerMethodField()
+    ranking = serializers.SerializerMethodField()
 
     class Meta:
         model = Player
@@ -48,8 +88,16 @@ class PlayerSerializer(serializers.ModelSerializer):
             'date_of_birth', 'height', 'weight', 'photo', 'photo_url', 'card_image', 'card_url',
             'summary', 'tweet_urls', 'gif_urls',
             'average_rating', 'rating_avg', 'total_ratings', 'recent_ratings',
-            'user_rating', 'recent_comments'
+            'rating_histogram', 'rating_median', 'ranking', 'user_rating', 'recent_comments'
+        ]
+        # Domyślna, lekka projekcja dla list (bez zapytań per piłkarz).
+        lean_fields = [
+            'id', 'slug', 'name', 'club_id', 'club_name', 'position',
+            'average_rating', 'rating_avg', 'total_ratings', 'photo_url', 'card_url',
         ]
+        # Zwracane tylko na żądanie: ?expand=recent_comments
+        expandable_fields = ['recent_comments']
+        list_serializer_class = BatchLoadingListSerializer
 
     def get_photo_url(self, obj):
         if obj.photo:
@@ -61,24 +109,42 @@ class PlayerSerializer(serializers.ModelSerializer):
             return obj.card_image.url
         return None
 
+    def get_rating_median(self, obj):
+        return histogram_median(obj.rating_histogram)
+
+    def get_ranking(self, obj):
+        # Pozycje z players.PlayerRank (select_related w apply_player_fieldset); None = bez ocen.
+        try:
+            entry = obj.leaderboard_entry
+        except PlayerRank.DoesNotExist:
+            return None
+        return {
+            'overall': entry.overall_rank,
+            'position': entry.position_rank,
+            'club': entry.club_rank,
+        }
+
+    def active_batch_loaders(self):
+        return [
+            name for name, fields in self.loader_fields.items()
+            if any(field in self.fields for field in fields)
+        ]
+
+    def register_batch_keys(self, instances):
+        super().register_batch_keys(instances)
+        # Zagnieżdżone komentarze: rejestrujemy klucze wszystkich piłkarzy naraz.
+        if 'recent_comments' in self.fields:
+            self.fields['recent_comments'].child.register_batch_keys(
+                [comment for player in instances for comment in player.comments.all()]
+            )
+
     def get_user_rating(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            try:
-                rating = Rating.objects.get(player=obj, user=request.user)
-                return RatingSerializer(rating).data
-            except Rating.DoesNotExist:
-                return None
-        return None
+        return self.load('player_user_rating', obj)
 
     def get_gif_urls(self, obj):
-        media_qs = obj.media.filter(media_type=PlayerMedia.MEDIA_GIF).order_by('-created_at')
-        if media_qs.exists():
-            return [media.url for media in media_qs]
-        return obj.gif_urls or []
+        urls = self.load('player_media_urls', obj, default={}).get(PlayerMedia.MEDIA_GIF)
+        return urls or obj.gif_urls or []
 
     def get_tweet_urls(self, obj):
-        media_qs = obj.media.filter(media_type=PlayerMedia.MEDIA_TWEET).order_by('-created_at')
-        if media_qs.exists():
-            return [media.url for media in media_qs]
-        return obj.tweet_urls or []
+        urls = self.load('player_media_urls', obj, default={}).get(PlayerMedia.MEDIA_TWEET)
+        return urls or obj.tweet_urls or []
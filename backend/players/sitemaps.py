@@ -6,7 +6,7 @@ class PlayerSitemap(Sitemap):
     priority = 0.8
 
     def items(self):
-        return Player.objects.exclude(club__name="Loan")
+        return Player.objects.filter(is_public=True)
 
     def location(self, obj):
         return f"/players/{obj.slug}/"
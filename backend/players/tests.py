@@ -1,9 +1,16 @@
+from unittest import mock
+
 from clubs.models import Club
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from ratings.models import Rating
 from rest_framework.test import APITestCase
 
-from .models import Player
+from .leaderboard import rebuild_leaderboard
+from .rating_aggregates import flush_pending_aggregate_refreshes
+from .models import Player, PlayerMedia, PlayerRank
 
 
 class PlayerApiListTest(APITestCase):
@@ -26,6 +33,242 @@ class PlayerApiListTest(APITestCase):
         self.assertIn("Test Player 2", names)
         print("Test: Players list contains:", names)
 
+    def test_list_returns_lean_projection_by_default(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(response.data['results'][0]),
+            {
+                'id', 'slug', 'name', 'club_id', 'club_name', 'position',
+                'average_rating', 'rating_avg', 'total_ratings', 'photo_url', 'card_url',
+            },
+        )
+
+    def test_fields_and_expand_select_the_representation(self):
+        response = self.client.get(self.url, {'fields': 'id,name,unknown'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name'})
+
+        response = self.client.get(self.url, {'fields': 'id', 'expand': 'recent_comments'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'recent_comments'})
+
+        player = Player.objects.get(name="Test Player 1")
+        detail = self.client.get(reverse("player-detail", args=[player.pk])).data
+        self.assertIn('summary', detail)
+        self.assertIn('recent_comments', detail)
+
+
+class PlayerKeysetPaginationTest(APITestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name="Test Club", city="Test City")
+        for index, rating in enumerate([7.5, 7.5, 7.5, 6.0, 9.0]):
+            Player.objects.create(
+                name=f"Player {index}", position="FW", club=self.club, nationality="PL", average_rating=rating
+            )
+
+    def test_cursor_walks_ranking_with_id_tie_breaker(self):
+        expected = list(Player.objects.order_by('-average_rating', '-id').values_list('id', flat=True))
+        seen = []
+        url = reverse("player-list") + "?pagination=cursor&page_size=2&fields=id"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            seen.extend(item['id'] for item in response.data['results'])
+            last_page = response.data
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+        previous = self.client.get(last_page['previous'])
+        self.assertEqual([item['id'] for item in previous.data['results']], expected[2:4])
+
+    def test_page_number_pagination_stays_the_default(self):
+        response = self.client.get(reverse("player-list"), {'page_size': 2, 'page': 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(reverse("player-list"), {'cursor': 'nie-kursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class PlayerBatchLoadingTest(APITestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name="Test Club", city="Test City")
+        self.user = User.objects.create_user(username="fan", password="secret")
+        self.client.force_authenticate(user=self.user)
+        self.params = {'fields': 'id,gif_urls,tweet_urls,user_rating'}
+
+    def add_players(self, count):
+        for _ in range(count):
+            index = Player.objects.count()
+            player = Player.objects.create(
+                name=f"Player {index}", position="FW", club=self.club, nationality="PL"
+            )
+            PlayerMedia.objects.create(player=player, media_type=PlayerMedia.MEDIA_GIF, url=f"https://x.test/{index}.gif")
+            Rating.objects.create(player=player, user=self.user, value=index % 10 + 1)
+
+    def test_page_of_players_costs_constant_queries(self):
+        self.add_players(2)
+        with CaptureQueriesContext(connection) as small_page:
+            self.client.get(reverse("player-list"), self.params)
+
+        self.add_players(5)
+        with CaptureQueriesContext(connection) as large_page:
+            response = self.client.get(reverse("player-list"), self.params)
+
+        self.assertEqual(len(small_page), len(large_page))
+        results = response.data['results']
+        self.assertEqual(len(results), 7)
+        self.assertTrue(all(len(item['gif_urls']) == 1 and item['user_rating'] for item in results))
+        self.assertEqual(results[0]['tweet_urls'], [])
+
+
+class PlayerSearchTest(APITestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name="Test Club", city="Test City")
+        self.lukasz = Player.objects.create(name="Łukasz Żółtek", position="DF", club=self.club, nationality="PL")
+        self.other = Player.objects.create(name="Jan Łukaszewski", position="MF", club=self.club, nationality="PL")
+        Player.objects.create(name="Adam Nowak", position="FW", club=self.club, nationality="PL")
+        self.url = reverse("player-search")
+
+    def test_search_ignores_accents_and_ranks_best_match_first(self):
+        response = self.client.get(self.url, {"q": "lukasz zoltek"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([player["id"] for player in response.data][0], self.lukasz.id)
+
+        names = {player["name"] for player in self.client.get(self.url, {"q": "Lukasz"}).data}
+        self.assertEqual(names, {"Łukasz Żółtek", "Jan Łukaszewski"})
+
+    def test_search_matches_player_aliases(self):
+        from matches.models import PlayerAlias
+
+        PlayerAlias.objects.create(player=self.other, club=self.club, alias="Łukaszek")
+
+        response = self.client.get(self.url, {"q": "lukaszek"})
+
+        self.assertEqual([player["id"] for player in response.data], [self.other.id])
+
+    def test_short_query_returns_no_results(self):
+        response = self.client.get(self.url, {"q": "l"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [])
+
+
+class PlayerLeaderboardTest(APITestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name="Test Club", city="Test City")
+        self.other_club = Club.objects.create(name="Other Club", city="Other City")
+        self.users = [User.objects.create_user(username=f"fan{index}", password="secret") for index in range(3)]
+        self.defender = Player.objects.create(name="Defender", position="DF", club=self.club, nationality="PL")
+        self.forward = Player.objects.create(name="Forward", position="FW", club=self.club, nationality="PL")
+        self.back = Player.objects.create(name="Back", position="DF", club=self.other_club, nationality="PL")
+
+    def ranks(self):
+        # Głosy tylko oznaczają zawodników; ranking przesuwa worker.
+        flush_pending_aggregate_refreshes()
+        return {
+            entry.player_id: (entry.overall_rank, entry.position_rank, entry.club_rank)
+            for entry in PlayerRank.objects.all()
+        }
+
+    def test_votes_reposition_players_like_a_full_rebuild(self):
+        Rating.objects.create(player=self.defender, user=self.users[0], value=6)
+        Rating.objects.create(player=self.forward, user=self.users[0], value=8)
+        back_vote = Rating.objects.create(player=self.back, user=self.users[0], value=9)
+        self.assertEqual(
+            self.ranks(),
+            {self.back.id: (1, 1, 1), self.forward.id: (2, 1, 1), self.defender.id: (3, 2, 2)},
+        )
+
+        Rating.objects.create(player=self.defender, user=self.users[1], value=10)
+        back_vote.value = 2
+        back_vote.save()
+        self.forward.club = self.other_club
+        self.forward.save()
+        incremental = self.ranks()
+
+        rebuild_leaderboard()
+        self.assertEqual(incremental, self.ranks())
+        self.assertEqual(incremental[self.back.id], (3, 2, 2))
+
+        back_vote.delete()
+        self.assertNotIn(self.back.id, self.ranks())
+        self.assertEqual(self.ranks()[self.defender.id], (1, 1, 1))
+
+    def test_vote_only_queues_the_repositioning(self):
+        from core.models import PendingAggregateRefresh
+
+        flush_pending_aggregate_refreshes()
+        with mock.patch("players.leaderboard._lock") as lock:
+            Rating.objects.create(player=self.defender, user=self.users[0], value=6)
+
+        lock.assert_not_called()
+        self.assertFalse(PlayerRank.objects.exists())
+        self.assertTrue(
+            PendingAggregateRefresh.objects.filter(
+                kind=PendingAggregateRefresh.KIND_LEADERBOARD, object_id=self.defender.id
+            ).exists()
+        )
+        self.assertEqual(self.ranks(), {self.defender.id: (1, 1, 1)})
+
+    def test_leaderboard_pages_and_rank_lookup(self):
+        for player, value in ((self.defender, 7), (self.forward, 9), (self.back, 5)):
+            Rating.objects.create(player=player, user=self.users[0], value=value)
+        flush_pending_aggregate_refreshes()
+
+        response = self.client.get(reverse("player-leaderboard"), {"position": "df", "page_size": 1})
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual([player["id"] for player in response.data["results"]], [self.defender.id])
+        self.assertEqual(response.data["results"][0]["ranking"], {"overall": 2, "position": 1, "club": 2})
+        self.assertIsNotNone(response.data["next"])
+
+        rank = self.client.get(reverse("player-rank", args=[self.back.slug])).data
+        self.assertEqual(rank["overall"], {"rank": 3, "total": 3})
+        self.assertEqual(rank["position"], {"code": "DF", "rank": 2, "total": 2})
+        self.assertEqual(rank["club"], {"id": self.other_club.id, "rank": 1, "total": 1})
+
+        top = self.client.get(reverse("player-top-rated"), {"min_ratings": 1, "limit": 2}).data
+        self.assertEqual([player["id"] for player in top], [self.forward.id, self.defender.id])
+
+
+class PlayerVisibilityTest(APITestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name="Test Club", city="Test City")
+        self.loan = Club.objects.create(name="Loan", city="")
+        self.user = User.objects.create_user(username="fan", password="secret")
+        self.regular = Player.objects.create(name="Regular", position="FW", club=self.club, nationality="PL")
+        self.loaned = Player.objects.create(name="Loaned", position="FW", club=self.loan, nationality="PL")
+
+    def test_loan_pool_players_are_not_public(self):
+        self.assertTrue(self.loan.is_loan_pool)
+        self.assertFalse(self.loaned.is_public)
+        self.assertTrue(self.regular.is_public)
+
+        response = self.client.get(reverse("player-list"))
+        self.assertEqual([player["id"] for player in response.data["results"]], [self.regular.id])
+
+        self.loaned.club = self.club
+        self.loaned.save()
+        self.assertTrue(Player.objects.get(pk=self.loaned.pk).is_public)
+
+    def test_marking_club_as_loan_pool_hides_its_players(self):
+        Rating.objects.create(player=self.regular, user=self.user, value=8)
+        flush_pending_aggregate_refreshes()
+        self.assertTrue(PlayerRank.objects.filter(player=self.regular).exists())
+
+        self.club.is_loan_pool = True
+        self.club.save()
+
+        self.assertFalse(Player.objects.get(pk=self.regular.pk).is_public)
+        self.assertFalse(PlayerRank.objects.filter(player=self.regular).exists())
+        self.assertEqual(self.client.get(reverse("player-list")).data["results"], [])
+
 
 class PlayerPermissionsTest(APITestCase):
     def setUp(self):
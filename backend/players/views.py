@@ -1,26 +1,78 @@
 from datetime import datetime
 from typing import Optional
+from comments.ai_replies import enqueue_ai_reply
 from comments.models import Comment
 from comments.serializers import CommentSerializer
-from core.pagination import StandardResultsSetPagination
-from django.db.models import Case, When
+from core.pagination import (
+    CommentCursorPagination,
+    CursorOptInPaginationMixin,
+    PlayerCommentsPagination,
+    PlayerListPagination,
+    PlayerRankingPagination,
+    RankRangePagination,
+    wants_cursor_pagination,
+)
+from django.db import transaction
+from django.db.models import Case, IntegerField, When
 from django.http import Http404
+from django.utils.decorators import method_decorator
 from django.utils import timezone
 from django.utils.dateparse import parse_date, parse_datetime
 from django_filters import rest_framework as filters
 from ratings.models import Rating
 from ratings.serializers import RatingSerializer
-from ratings.utils import check_rating_throttle
 from rest_framework import permissions, status, viewsets
+from rest_framework.exceptions import ValidationError
 from rest_framework.decorators import action
 from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.response import Response
-from core.ai import generate_comment_response
+from core.fieldsets import SparseFieldsetViewMixin
+from core.ratelimit import check_rate_limit, rate_limited_response, with_rate_limit_headers
+from core.response_cache import CLUBS, COMMENTS, MEDIA, PLAYER, PLAYERS, RATINGS, cache_response
  
-from .models import Player, PlayerMedia
+from .leaderboard import leaderboard_scope_size
+from .models import Player, PlayerMedia, PlayerRank
+from .search import DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT, search_players
 from .serializers import PlayerSerializer
 
 
+# Dane, od których zależą publiczne odpowiedzi o piłkarzach.
+cache_player_response = method_decorator(cache_response(PLAYERS, CLUBS, RATINGS, COMMENTS, MEDIA))
+# Szczegóły jednego piłkarza zależą tylko od jego własnej wersji.
+cache_player_detail = method_decorator(cache_response(entity=(PLAYER, "pk")))
+
+
+# Kolumny potrzebne tylko polom spoza lekkiej projekcji.
+HEAVY_PLAYER_COLUMNS = {
+    "summary": "summary",
+    "tweet_urls": "tweet_urls",
+    "gif_urls": "gif_urls",
+    "rating_histogram": "rating_histogram",
+    "rating_median": "rating_histogram",
+}
+
+
+def apply_player_fieldset(queryset, field_names):
+    """
+    Dopasowuje zapytanie do pól odpowiedzi: pomija ciężkie kolumny, których
+    nikt nie zwróci, i dociąga komentarze tylko, gdy odpowiedź je zawiera
+    (szczegóły piłkarza albo ?expand=recent_comments na liście).
+    field_names=None oznacza pełną reprezentację.
+    """
+    queryset = queryset.select_related("club")
+    if field_names is None or "ranking" in field_names:
+        queryset = queryset.select_related("leaderboard_entry")
+    if field_names is None:
+        return queryset
+    needed = {HEAVY_PLAYER_COLUMNS[name] for name in field_names if name in HEAVY_PLAYER_COLUMNS}
+    deferred = set(HEAVY_PLAYER_COLUMNS.values()) - needed
+    if deferred:
+        queryset = queryset.defer(*sorted(deferred))
+    if "recent_comments" in field_names:
+        queryset = queryset.prefetch_related("comments__user")
+    return queryset
+
+
 class PlayerFilter(filters.FilterSet):
     club = filters.NumberFilter(field_name="club__id")
     position = filters.CharFilter(lookup_expr="iexact")
@@ -31,17 +83,19 @@ class PlayerFilter(filters.FilterSet):
         fields = ["club", "position", "name"]
 
 
-class PlayerViewSet(viewsets.ModelViewSet):
-    queryset = Player.objects.exclude(club__name="Loan")
+class PlayerViewSet(CursorOptInPaginationMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
+    queryset = Player.objects.filter(is_public=True)
     serializer_class = PlayerSerializer
     filterset_class = PlayerFilter
-    pagination_class = StandardResultsSetPagination
+    pagination_class = PlayerListPagination
+    cursor_pagination_class = PlayerRankingPagination
     parser_classes = (MultiPartParser, FormParser, JSONParser)
     lookup_field = "pk"  # Domyślnie wyszukujemy po pk
     lookup_value_regex = "[^/]+"  # Pozwala na dopasowanie zarówno ID jak i slugów
+    lean_actions = {"list", "top_rated", "search", "leaderboard"}
 
     def get_permissions(self):
-        if self.action in {"list", "retrieve", "top_rated", "comments"}:
+        if self.action in {"list", "retrieve", "top_rated", "search", "leaderboard", "rank", "comments"}:
             permission_classes = [permissions.AllowAny]
         elif self.action in {"rate", "comment"}:
             permission_classes = [permissions.IsAuthenticated]
@@ -49,6 +103,14 @@ class PlayerViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAdminUser]
         return [permission() for permission in permission_classes]
 
+    @cache_player_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_player_detail
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def get_object(self):
         """
         Pozwala na wyszukiwanie zarówno po ID jak i po slugu.
@@ -74,7 +136,7 @@ class PlayerViewSet(viewsets.ModelViewSet):
         return obj
 
     def get_queryset(self):
-        queryset = super().get_queryset().select_related("club")
+        queryset = apply_player_fieldset(super().get_queryset(), self.get_response_field_names())
         # If filtering by club, order by position in the sequence: GK, DF, MF, FW
         if "club" in self.request.query_params:
             position_order = Case(
@@ -83,26 +145,22 @@ class PlayerViewSet(viewsets.ModelViewSet):
                 When(position="MF", then=3),
                 When(position="FW", then=4),
                 default=5,
+                output_field=IntegerField(),
             )
-            queryset = queryset.order_by(position_order, "name")
-        else:
-            # For all players view (no club filter), sort by average rating from highest to lowest
-            queryset = queryset.order_by("-average_rating")
-        return queryset
+            queryset = queryset.annotate(position_rank=position_order)
+        return queryset.order_by(*self.get_keyset_ordering())
+
+    def get_keyset_ordering(self):
+        # Kolejność musi być jednoznaczna (id na końcu), bo po niej idzie kursor paginacji.
+        if "club" in self.request.query_params:
+            return ("position_rank", "name", "id")
+        # For all players view (no club filter), sort by average rating from highest to lowest
+        return ("-average_rating", "-id")
 
     @action(detail=True, methods=["post"])
     def rate(self, request, pk=None):
         player = self.get_object()
 
-        # Sprawdź czy użytkownik może dodać nową ocenę używając funkcji pomocniczej
-        can_rate, error_message = check_rating_throttle(request.user)
-        if not can_rate:
-            return Response(
-                {"detail": error_message},
-                status=status.HTTP_429_TOO_MANY_REQUESTS,
-                headers={"X-Error-Type": "throttled"},
-            )
-
         # Jawnie ustawiamy player_id w danych wejściowych
         data = {
             "player": player.id,  # Używamy ID zawodnika, niezależnie czy URL zawiera ID czy slug
@@ -110,27 +168,21 @@ class PlayerViewSet(viewsets.ModelViewSet):
         }
 
         serializer = RatingSerializer(data=data, context={"request": request})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Limit sprawdzamy dopiero dla poprawnej oceny, żeby błędne żądanie nie zużywało limitu
+        rate_limit = check_rate_limit(request, "player_rating")
+        if not rate_limit.allowed:
+            return rate_limited_response(rate_limit)
 
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        serializer.save()
+        return with_rate_limit_headers(Response(serializer.data), rate_limit)
 
     @action(detail=True, methods=["post"])
     def comment(self, request, pk=None):
         player = self.get_object()
 
-        # Sprawdź czy użytkownik może dodać nowy komentarz
-        from ratings.utils import check_comment_throttle
-
-        can_comment, error_message = check_comment_throttle(request.user)
-        if not can_comment:
-            return Response(
-                {"detail": error_message},
-                status=status.HTTP_429_TOO_MANY_REQUESTS,
-                headers={"X-Error-Type": "throttled"},
-            )
-
         # Jawnie ustawiamy player_id w danych wejściowych
         data = {
             "player_id": player.id,  # Używamy ID zawodnika, niezależnie czy URL zawiera ID czy slug
@@ -138,30 +190,22 @@ class PlayerViewSet(viewsets.ModelViewSet):
         }
 
         serializer = CommentSerializer(data=data, context={"request": request})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        if serializer.is_valid():
-            # Generate AI response
-            user_comment = request.data.get("content")
+        # Sprawdź czy użytkownik może dodać nowy komentarz (dopiero po walidacji)
+        rate_limit = check_rate_limit(request, "comment")
+        if not rate_limit.allowed:
+            return rate_limited_response(rate_limit)
 
-            # Provide a bit of discussion context for the LLM: last 3 comments for this player.
-            recent_comments = list(
-                Comment.objects.filter(player=player)
-                .order_by("-created_at")
-                .values_list("content", flat=True)[:3]
-            )
-            
-            ai_text = generate_comment_response(
-                user_comment=user_comment,
-                player_name=player.name,
-                user_name=request.user.username,
-                recent_comments=recent_comments,
-            )
-            
-            serializer.save(user=request.user, ai_response=ai_text)
-            return Response(serializer.data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        # Odpowiedź AI generuje worker (process_ai_replies); komentarz wraca od razu.
+        with transaction.atomic():
+            comment = serializer.save(user=request.user)
+            enqueue_ai_reply(comment)
+        return with_rate_limit_headers(Response(serializer.data), rate_limit)
 
     @action(detail=False, methods=["get"])
+    @cache_player_response
     def top_rated(self, request):
         """
         Zwraca listę najlepiej ocenianych piłkarzy.
@@ -172,48 +216,145 @@ class PlayerViewSet(viewsets.ModelViewSet):
         limit = int(request.query_params.get("limit", 5))
         min_ratings = int(request.query_params.get("min_ratings", 3))
 
-        # Pobierz piłkarzy z minimalną liczbą ocen i posortuj wg średniej
-        players = Player.objects.filter(total_ratings__gte=min_ratings).order_by(
-            "-average_rating", "name"
-        )[:limit]
+        # Kolejność z utrzymywanego rankingu (players.PlayerRank), bez sortowania całej tabeli
+        players = apply_player_fieldset(
+            Player.objects.filter(leaderboard_entry__total_ratings__gte=min_ratings),
+            self.get_response_field_names(),
+        ).order_by("leaderboard_entry__overall_rank")[:limit]
 
         serializer = self.get_serializer(players, many=True)
         return Response(serializer.data)
 
+    def get_rank_field(self):
+        if "club" in self.request.query_params:
+            return "leaderboard_entry__club_rank"
+        if "position" in self.request.query_params:
+            return "leaderboard_entry__position_rank"
+        return "leaderboard_entry__overall_rank"
+
+    @action(detail=False, methods=["get"], pagination_class=RankRangePagination)
+    @cache_player_response
+    def leaderboard(self, request):
+        """
+        Ranking piłkarzy z utrzymywanej tabeli pozycji (players.PlayerRank).
+        Parametry query:
+        - position: kod pozycji (GK/DF/MF/FW) - ranking w obrębie pozycji
+        - club: id klubu - ranking w obrębie klubu
+        - page, page_size: strona rankingu (domyślnie 50, maks. 200)
+        """
+        position = request.query_params.get("position")
+        club = request.query_params.get("club")
+        if position and club:
+            raise ValidationError({"detail": "Podaj position albo club, nie oba naraz."})
+
+        queryset = Player.objects.all()
+        if club:
+            if not club.isdigit():
+                raise ValidationError({"club": "Nieprawidłowe id klubu."})
+            queryset = queryset.filter(leaderboard_entry__club_id=club)
+        elif position:
+            queryset = queryset.filter(leaderboard_entry__position=position.upper())
+
+        options = self.get_fieldset_options()
+        fields = options["fields"] or [*PlayerSerializer.Meta.lean_fields, "ranking"]
+        queryset = apply_player_fieldset(
+            queryset, PlayerSerializer.resolve_field_names(fields=fields, expand=options["expand"])
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True, fields=fields)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=["get"])
+    @cache_player_response
+    def rank(self, request, pk=None):
+        """
+        Pozycja piłkarza w rankingu ogólnym, na swojej pozycji i w klubie,
+        razem z liczbą sklasyfikowanych w każdym z tych rankingów.
+        """
+        player = self.get_object()
+        entry = PlayerRank.objects.filter(player=player).first()
+        if entry is None:
+            return Response({"player_id": player.id, "overall": None, "position": None, "club": None})
+
+        club = None
+        if entry.club_rank is not None:
+            club = {
+                "id": entry.club_id,
+                "rank": entry.club_rank,
+                "total": leaderboard_scope_size("club_rank", {"club_id": entry.club_id}),
+            }
+        return Response({
+            "player_id": player.id,
+            "overall": {"rank": entry.overall_rank, "total": leaderboard_scope_size("overall_rank")},
+            "position": {
+                "code": entry.position,
+                "rank": entry.position_rank,
+                "total": leaderboard_scope_size("position_rank", {"position": entry.position}),
+            },
+            "club": club,
+        })
+
+    @action(detail=False, methods=["get"])
+    @cache_player_response
+    def search(self, request):
+        """
+        Wyszukiwarka piłkarzy po nazwisku i aliasach, bez względu na polskie znaki.
+        Parametry query:
+        - q: szukana fraza (min. 2 znaki)
+        - limit: liczba wyników (domyślnie 10, maks. 50)
+        """
+        try:
+            limit = int(request.query_params.get("limit", DEFAULT_SEARCH_LIMIT))
+        except (TypeError, ValueError):
+            limit = DEFAULT_SEARCH_LIMIT
+        limit = min(max(limit, 1), MAX_SEARCH_LIMIT)
+
+        queryset = apply_player_fieldset(
+            Player.objects.filter(is_public=True),
+            self.get_response_field_names(),
+        )
+        players = search_players(queryset, request.query_params.get("q", ""), limit=limit)
+        serializer = self.get_serializer(players, many=True)
+        return Response(serializer.data)
+
     @action(detail=True, methods=["get"])
     def comments(self, request, pk=None):
         """
         Zwraca listę komentarzy dla piłkarza z paginacją.
         Parametry query:
         - page: numer strony (domyślnie 1)
-        - page_size: liczba komentarzy na stronę (domyślnie zgodnie z StandardResultsSetPagination)
+        - page_size: liczba komentarzy na stronę (domyślnie 20, maks. 100)
         - sort_by: pole do sortowania (domyślnie '-created_at', opcje: 'created_at', 'likes_count')
+        - cursor / pagination=cursor: paginacja kursorowa (bez COUNT i OFFSET) dla nieskończonego przewijania
         """
         player = self.get_object()
 
         # Określ pole sortowania
         sort_by = request.query_params.get("sort_by", "-created_at")
-        # Walidacja poprawności pola sortowania
-        valid_sort_fields = ["-created_at", "created_at", "-likes_count", "likes_count"]
-        if sort_by not in valid_sort_fields:
+        # Kolejność dla każdego sortowania, jednoznaczna dzięki id na końcu
+        orderings = {
+            "-created_at": ("-created_at", "-id"),
+            "created_at": ("created_at", "id"),
+            # created_at jako drugorzędne sortowanie
+            "-likes_count": ("-likes_count", "-created_at", "-id"),
+            "likes_count": ("likes_count", "-created_at", "-id"),
+        }
+        if sort_by not in orderings:
             sort_by = "-created_at"  # Domyślne sortowanie, jeśli nieprawidłowe pole
 
-        # Sortowanie po liczbie polubień wymaga dodatkowej logiki
-        if "likes_count" in sort_by:
-            # Musimy użyć annotate, aby móc sortować po liczbie polubień
-            from django.db.models import Count
-
-            prefix = "-" if sort_by.startswith("-") else ""
-            comments = (
-                Comment.objects.filter(player=player)
-                .annotate(likes_count_val=Count("likes"))
-                .order_by(f"{prefix}likes_count_val", "-created_at")
-            )  # dodajemy created_at jako drugorzędne sortowanie
-        else:
-            comments = Comment.objects.filter(player=player).order_by(sort_by)
+        # Sortowanie po Comment.likes_count idzie indeksem comment_player_likes_idx
+        comments = (
+            Comment.objects.filter(player=player)
+            .select_related("user", "player")
+            .order_by(*orderings[sort_by])
+        )
 
         # Utwórz instancję paginatora
-        paginator = StandardResultsSetPagination()
+        if wants_cursor_pagination(request):
+            paginator = CommentCursorPagination()
+            paginator.ordering = orderings[sort_by]
+        else:
+            paginator = PlayerCommentsPagination()
         paginated_comments = paginator.paginate_queryset(comments, request)
 
         # Serializuj wyniki
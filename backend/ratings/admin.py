@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Rating
+from .models import Rating, RatingRecalculationJob
 
 @admin.register(Rating)
 class RatingAdmin(admin.ModelAdmin):
@@ -8,3 +8,10 @@ class RatingAdmin(admin.ModelAdmin):
     search_fields = ("player__name", "user__username")
     raw_id_fields = ("player", "user")
     date_hierarchy = "created_at"
+
+
+@admin.register(RatingRecalculationJob)
+class RatingRecalculationJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "status", "player", "check_only", "processed_players", "total_players", "mismatched_players", "created_at")
+    list_filter = ("status", "check_only")
+    raw_id_fields = ("player", "requested_by")
@@ -0,0 +1,57 @@
+from datetime import timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Trunc
+
+from matches.models import FixtureRating
+from players.rating_aggregates import RATING_SOURCE_CLASSIC, RATING_SOURCE_FIXTURE
+from ratings.models import PlayerRatingRollup, Rating
+
+
+class Command(BaseCommand):
+    help = 'Odbudowuje godzinowe i dzienne agregaty ocen zawodników (PlayerRatingRollup) z surowych ocen'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rozmiar paczki dla bulk_create',
+        )
+
+    def handle(self, *args, **kwargs):
+        sources = (
+            (RATING_SOURCE_CLASSIC, Rating.objects.all()),
+            (RATING_SOURCE_FIXTURE, FixtureRating.objects.exclude(player_id=None)),
+        )
+        granularities = (PlayerRatingRollup.GRANULARITY_HOUR, PlayerRatingRollup.GRANULARITY_DAY)
+
+        with transaction.atomic():
+            PlayerRatingRollup.objects.all().delete()
+            created = 0
+            for source, queryset in sources:
+                for granularity in granularities:
+                    rows = (
+                        queryset.annotate(bucket=Trunc('created_at', granularity, tzinfo=dt_timezone.utc))
+                        .values('player_id', 'bucket')
+                        .annotate(total=Sum('value'), count=Count('id'))
+                        .order_by()
+                    )
+                    rollups = [
+                        PlayerRatingRollup(
+                            player_id=row['player_id'],
+                            source=source,
+                            granularity=granularity,
+                            bucket_start=row['bucket'],
+                            ratings_sum=row['total'] or 0,
+                            ratings_count=row['count'],
+                        )
+                        for row in rows.iterator()
+                    ]
+                    PlayerRatingRollup.objects.bulk_create(rollups, batch_size=kwargs['batch_size'])
+                    created += len(rollups)
+                    self.stdout.write(f'  {source}/{granularity}: {len(rollups)}')
+
+        self.stdout.write(self.style.SUCCESS(f'Utworzono {created} agregatów ocen'))
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ratings.utils import process_rating_recalculation_jobs
+
+
+class Command(BaseCommand):
+    help = "Worker: wykonuje zlecone przez API przeliczenia ocen (ratings.RatingRecalculationJob)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1,
+            help="Maksymalna liczba zadań wykonywanych w jednym przebiegu.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=5.0,
+            help="Przerwa w sekundach, gdy kolejka jest pusta.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Wykonaj jeden przebieg i zakończ (np. z crona).",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        if options["once"]:
+            completed, failed = process_rating_recalculation_jobs(limit=batch_size)
+            self.stdout.write(f"[process_rating_recalculations] completed: {completed}, failed: {failed}")
+            return
+
+        self.stdout.write("[process_rating_recalculations] started")
+        try:
+            while True:
+                close_old_connections()
+                completed, failed = process_rating_recalculation_jobs(limit=batch_size)
+                if completed or failed:
+                    self.stdout.write(f"[process_rating_recalculations] completed: {completed}, failed: {failed}")
+                else:
+                    time.sleep(options["poll_interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("[process_rating_recalculations] stopped")
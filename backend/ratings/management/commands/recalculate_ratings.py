@@ -1,10 +1,8 @@
 from django.core.management.base import BaseCommand
-from players.models import Player
-from ratings.models import Rating
-from django.db.models import Avg, Count
+from ratings.utils import RECALCULATION_BATCH_SIZE, recalculate_player_ratings
 
 class Command(BaseCommand):
-    help = 'Przelicza średnie ocen i liczbę ocen dla wszystkich piłkarzy'
+    help = 'Przelicza średnie ocen i liczbę ocen (Rating + FixtureRating) dla wszystkich piłkarzy'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -12,30 +10,50 @@ class Command(BaseCommand):
             type=int,
             help='ID piłkarza, dla którego chcesz przeliczyć oceny (opcjonalne)',
         )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Tylko raportuje piłkarzy z rozbieżnymi agregatami, niczego nie zapisuje',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=RECALCULATION_BATCH_SIZE,
+            help='Rozmiar paczki dla odczytu i bulk_update',
+        )
 
     def handle(self, *args, **kwargs):
         player_id = kwargs.get('player_id')
-        
+        check_only = kwargs.get('check')
+
         if player_id:
-            players = Player.objects.filter(id=player_id)
             self.stdout.write(f'Przeliczanie ocen dla piłkarza o ID={player_id}')
         else:
-            players = Player.objects.all()
-            self.stdout.write(f'Przeliczanie ocen dla wszystkich {players.count()} piłkarzy')
-        
-        updated_count = 0
-        
-        for player in players:
-            # Pobieramy agregaty bezpośrednio z bazy danych
-            rating_data = Rating.objects.filter(player=player).aggregate(
-                avg_rating=Avg('value'),
-                count=Count('id')
+            self.stdout.write('Przeliczanie ocen dla wszystkich piłkarzy')
+
+        def report_progress(processed, total):
+            self.stdout.write(f'  {processed}/{total}')
+
+        result = recalculate_player_ratings(
+            player_id=player_id,
+            check_only=check_only,
+            batch_size=kwargs['batch_size'],
+            progress=report_progress,
+        )
+
+        for mismatch in result['mismatches']:
+            details = ', '.join(
+                f"{field}: {values['stored']} -> {values['expected']}"
+                for field, values in mismatch['fields'].items()
             )
-            
-            player.average_rating = rating_data['avg_rating'] or 0
-            player.total_ratings = rating_data['count'] or 0
-            player.save(update_fields=['average_rating', 'total_ratings'])
-            
-            updated_count += 1
-            
-        self.stdout.write(self.style.SUCCESS(f'Pomyślnie zaktualizowano oceny dla {updated_count} piłkarzy'))
+            self.stdout.write(f"  #{mismatch['player_id']} {mismatch['player_name']}: {details}")
+
+        if check_only:
+            style = self.style.WARNING if result['mismatched_players'] else self.style.SUCCESS
+            self.stdout.write(style(
+                f"Rozbieżności: {result['mismatched_players']} z {result['processed_players']} piłkarzy (bez zapisu)"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Pomyślnie zaktualizowano oceny dla {result['updated_players']} z {result['processed_players']} piłkarzy"
+            ))
@@ -0,0 +1,108 @@
+# Generated by Django 4.2.20 on 2026-10-18 16:40
+
+from datetime import timezone as dt_timezone
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import Trunc
+import django.db.models.deletion
+
+
+def backfill_rating_rollups(apps, schema_editor):
+    PlayerRatingRollup = apps.get_model("ratings", "PlayerRatingRollup")
+    Rating = apps.get_model("ratings", "Rating")
+    FixtureRating = apps.get_model("matches", "FixtureRating")
+
+    sources = (
+        ("classic", Rating.objects.all()),
+        ("fixture", FixtureRating.objects.exclude(player_id=None)),
+    )
+    for source, queryset in sources:
+        for granularity in ("hour", "day"):
+            rows = (
+                queryset.annotate(bucket=Trunc("created_at", granularity, tzinfo=dt_timezone.utc))
+                .values("player_id", "bucket")
+                .annotate(total=Sum("value"), count=Count("id"))
+                .order_by()
+            )
+            PlayerRatingRollup.objects.bulk_create(
+                [
+                    PlayerRatingRollup(
+                        player_id=row["player_id"],
+                        source=source,
+                        granularity=granularity,
+                        bucket_start=row["bucket"],
+                        ratings_sum=row["total"] or 0,
+                        ratings_count=row["count"],
+                    )
+                    for row in rows
+                ],
+                batch_size=1000,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("players", "0015_player_rating_running_totals"),
+        ("ratings", "0004_ratingrecalculationjob"),
+        ("matches", "0003_fixtureplayer_rating_counters"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PlayerRatingRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[("classic", "Classic"), ("fixture", "Fixture")],
+                        max_length=16,
+                    ),
+                ),
+                (
+                    "granularity",
+                    models.CharField(
+                        choices=[("hour", "Hour"), ("day", "Day")], max_length=8
+                    ),
+                ),
+                ("bucket_start", models.DateTimeField()),
+                ("ratings_sum", models.BigIntegerField(default=0)),
+                ("ratings_count", models.IntegerField(default=0)),
+                (
+                    "player",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rating_rollups",
+                        to="players.player",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-bucket_start"],
+                "indexes": [
+                    models.Index(
+                        fields=["granularity", "bucket_start"],
+                        name="rollup_granularity_bucket_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="playerratingrollup",
+            constraint=models.UniqueConstraint(
+                fields=("player", "source", "granularity", "bucket_start"),
+                name="unique_player_rating_rollup",
+            ),
+        ),
+        migrations.RunPython(backfill_rating_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ratings", "0005_playerratingrollup"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ratingrecalculationjob",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
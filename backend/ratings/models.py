@@ -1,10 +1,15 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from players.models import Player
-from players.rating_aggregates import refresh_player_rating_snapshot
+from players.rating_aggregates import (
+    RATING_SOURCE_CLASSIC,
+    RATING_SOURCE_FIXTURE,
+    apply_player_rating_change,
+    apply_rating_rollup_change,
+)
 
 class Rating(models.Model):
     # Dodajemy db_index=True do pola player, ponieważ będziemy często filtrować po piłkarzach
@@ -28,23 +33,112 @@ class Rating(models.Model):
         return f"{self.user.username} rated {self.player.name}: {self.value}"
 
 # Sygnały do aktualizacji średniej ocen piłkarza
+@receiver(pre_save, sender=Rating)
+def remember_previous_rating(sender, instance, **kwargs):
+    """
+    Zapamiętuje poprzedni stan oceny, żeby po zapisie przesunąć sumy o różnicę
+    """
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = (
+            Rating.objects.filter(pk=instance.pk).values_list("player_id", "value").first()
+        )
+
+
 @receiver(post_save, sender=Rating)
 def update_player_rating_on_save(sender, instance, **kwargs):
     """
     Aktualizuje średnią ocen piłkarza po zapisaniu nowej oceny lub aktualizacji istniejącej
     """
-    update_player_rating(instance.player)
+    previous = getattr(instance, "_previous_rating", None)
+    current = (instance.player_id, instance.value)
+    apply_player_rating_change(RATING_SOURCE_CLASSIC, previous=previous, current=current)
+    apply_rating_rollup_change(RATING_SOURCE_CLASSIC, instance.created_at, previous=previous, current=current)
+    instance._previous_rating = None
+
 
 @receiver(post_delete, sender=Rating)
 def update_player_rating_on_delete(sender, instance, **kwargs):
     """
     Aktualizuje średnią ocen piłkarza po usunięciu oceny
     """
-    update_player_rating(instance.player)
+    previous = (instance.player_id, instance.value)
+    apply_player_rating_change(RATING_SOURCE_CLASSIC, previous=previous)
+    apply_rating_rollup_change(RATING_SOURCE_CLASSIC, instance.created_at, previous=previous)
+
+
+class RatingRecalculationJob(models.Model):
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
 
-def update_player_rating(player):
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_COMPLETED, "Completed"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    player = models.ForeignKey(Player, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    check_only = models.BooleanField(default=False)  # Tylko raport rozbieżności, bez zapisu
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    total_players = models.PositiveIntegerField(default=0)
+    processed_players = models.PositiveIntegerField(default=0)
+    mismatched_players = models.PositiveIntegerField(default=0)
+    updated_players = models.PositiveIntegerField(default=0)
+    mismatches = models.JSONField(default=list, blank=True)  # Próbka rozbieżności do podglądu
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # Ostatni postęp workera; stare zadania przejmuje inny worker
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Rating recalculation #{self.pk} ({self.status})"
+
+
+class PlayerRatingRollup(models.Model):
     """
-    Aktualizuje średnią ocen i liczbę ocen dla danego piłkarza
-    Zaokrągla średnią do dwóch miejsc po przecinku
+    Suma i liczba ocen zawodnika w przedziale czasu (godzina / dzień UTC) per źródło ocen.
+    Utrzymywane przyrostowo przez sygnały ocen; backfill: manage.py backfill_rating_rollups.
     """
-    refresh_player_rating_snapshot(player)
+
+    GRANULARITY_HOUR = "hour"
+    GRANULARITY_DAY = "day"
+
+    GRANULARITY_CHOICES = [
+        (GRANULARITY_HOUR, "Hour"),
+        (GRANULARITY_DAY, "Day"),
+    ]
+
+    SOURCE_CHOICES = [
+        (RATING_SOURCE_CLASSIC, "Classic"),
+        (RATING_SOURCE_FIXTURE, "Fixture"),
+    ]
+
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='rating_rollups')
+    source = models.CharField(max_length=16, choices=SOURCE_CHOICES)
+    granularity = models.CharField(max_length=8, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    ratings_sum = models.BigIntegerField(default=0)
+    ratings_count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-bucket_start']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['player', 'source', 'granularity', 'bucket_start'],
+                name='unique_player_rating_rollup',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['granularity', 'bucket_start'], name='rollup_granularity_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.player_id} {self.source} {self.granularity} {self.bucket_start:%Y-%m-%d %H:%M}"
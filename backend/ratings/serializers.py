@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Rating
+from .models import Rating, RatingRecalculationJob
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -20,3 +20,14 @@ class RatingSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
+
+
+class RatingRecalculationJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RatingRecalculationJob
+        fields = [
+            'id', 'status', 'player', 'check_only', 'total_players', 'processed_players',
+            'mismatched_players', 'updated_players', 'mismatches', 'error',
+            'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
@@ -1,11 +1,18 @@
 
+from datetime import timedelta
+from io import StringIO
+
 from django.test import TestCase
 from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from players.models import Player
+from players.rating_aggregates import histogram_median, histogram_percentile_rank
 from clubs.models import Club
-from .models import Rating
+from .models import PlayerRatingRollup, Rating, RatingRecalculationJob
+from .utils import process_rating_recalculation_jobs, recalculate_player_ratings
 
 class RatingModelTest(TestCase):
     def setUp(self):
@@ -29,6 +36,64 @@ class RatingModelTest(TestCase):
         self.assertEqual(self.player.total_ratings, 2)
         print(f"Test: Average rating for player is {self.player.average_rating} (should be 7.0)")
 
+    def test_running_totals_follow_value_change_and_delete(self):
+        user2 = User.objects.create_user(username="testuser2", password="testpass2")
+        rating = Rating.objects.create(player=self.player, user=self.user, value=4)
+        Rating.objects.create(player=self.player, user=user2, value=9)
+
+        rating.value = 7
+        rating.save()
+        self.player.refresh_from_db()
+        self.assertEqual(self.player.classic_ratings_sum, 16)
+        self.assertEqual(self.player.classic_ratings_count, 2)
+        self.assertEqual(self.player.average_rating, 8.0)
+
+        rating.delete()
+        self.player.refresh_from_db()
+        self.assertEqual(self.player.classic_ratings_sum, 9)
+        self.assertEqual(self.player.classic_ratings_count, 1)
+        self.assertEqual(self.player.total_ratings, 1)
+        self.assertEqual(self.player.average_rating, 9.0)
+
+    def test_rating_histogram_follows_writes(self):
+        user2 = User.objects.create_user(username="testuser2", password="testpass2")
+        rating = Rating.objects.create(player=self.player, user=self.user, value=4)
+        Rating.objects.create(player=self.player, user=user2, value=9)
+        rating.value = 7
+        rating.save()
+
+        self.player.refresh_from_db()
+        self.assertEqual(self.player.rating_histogram, [0, 0, 0, 0, 0, 0, 1, 0, 1, 0])
+        self.assertEqual(histogram_median(self.player.rating_histogram), 7)
+        self.assertEqual(histogram_percentile_rank(self.player.rating_histogram, 9), 75.0)
+
+        rating.delete()
+        self.player.refresh_from_db()
+        self.assertEqual(self.player.rating_histogram, [0, 0, 0, 0, 0, 0, 0, 0, 1, 0])
+        self.assertIsNone(histogram_median([0] * 10))
+
+    def test_stale_player_save_keeps_running_totals(self):
+        stale_player = Player.objects.get(pk=self.player.pk)
+        Rating.objects.create(player=self.player, user=self.user, value=8)
+
+        stale_player.nationality = "DE"
+        stale_player.save()
+        self.player.refresh_from_db()
+        self.assertEqual(self.player.nationality, "DE")
+        self.assertEqual(self.player.total_ratings, 1)
+        self.assertEqual(self.player.average_rating, 8.0)
+
+    def test_incremental_and_repair_averages_round_the_same_way(self):
+        # 49 / 8 = 6.125: SQL ROUND() i ścieżka naprawcza muszą dać 6.13.
+        for index, value in enumerate((7, 6, 6, 6, 6, 6, 6, 6)):
+            user = User.objects.create_user(username=f"fan{index}", password="testpass")
+            Rating.objects.create(player=self.player, user=user, value=value)
+        self.player.refresh_from_db()
+        self.assertEqual(self.player.average_rating, 6.13)
+
+        report = recalculate_player_ratings(player_id=self.player.pk, check_only=True)
+        self.assertEqual(report["mismatched_players"], 0)
+
 
 class RatingPermissionsTest(APITestCase):
     def setUp(self):
@@ -57,3 +122,132 @@ class RatingPermissionsTest(APITestCase):
         response = self.client.delete(reverse('rating-detail', args=[rating.id]))
 
         self.assertEqual(response.status_code, 204)
+
+
+class RatingRecalculationTest(APITestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name="Test Club", city="Test City")
+        self.player = Player.objects.create(name="Test Player", position="FW", club=self.club, nationality="PL")
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.admin = User.objects.create_user(username="admin", password="testpass", is_staff=True)
+        Rating.objects.create(player=self.player, user=self.user, value=6)
+        Player.objects.filter(pk=self.player.pk).update(
+            average_rating=2,
+            total_ratings=5,
+            classic_ratings_sum=10,
+            rating_histogram=[0] * 10,
+        )
+
+    def test_check_only_reports_drift_without_writing(self):
+        result = recalculate_player_ratings(check_only=True)
+
+        self.assertEqual(result["mismatched_players"], 1)
+        self.assertEqual(result["updated_players"], 0)
+        self.assertEqual(result["mismatches"][0]["fields"]["average_rating"], {"stored": 2, "expected": 6.0})
+        self.player.refresh_from_db()
+        self.assertEqual(self.player.total_ratings, 5)
+
+    def test_recalculation_repairs_drift(self):
+        result = recalculate_player_ratings()
+
+        self.assertEqual(result["updated_players"], 1)
+        self.player.refresh_from_db()
+        self.assertEqual(self.player.classic_ratings_sum, 6)
+        self.assertEqual(self.player.total_ratings, 1)
+        self.assertEqual(self.player.average_rating, 6.0)
+        self.assertEqual(self.player.rating_histogram, [0, 0, 0, 0, 0, 1, 0, 0, 0, 0])
+        self.assertEqual(recalculate_player_ratings(check_only=True)["mismatched_players"], 0)
+
+    def test_admin_recalculate_queues_background_job(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(reverse('rating-recalculate'), {"check_only": True}, format='json')
+
+        self.assertEqual(response.status_code, 202)
+        job = RatingRecalculationJob.objects.get(pk=response.data["id"])
+        self.assertEqual(job.status, RatingRecalculationJob.STATUS_PENDING)
+        self.assertTrue(job.check_only)
+
+        status_response = self.client.get(reverse('rating-recalculate-status', args=[job.id]))
+        self.assertEqual(status_response.status_code, 200)
+        self.assertEqual(status_response.data["status"], RatingRecalculationJob.STATUS_PENDING)
+
+        self.assertEqual(process_rating_recalculation_jobs(), (1, 0))
+        job.refresh_from_db()
+        self.assertEqual(job.status, RatingRecalculationJob.STATUS_COMPLETED)
+        self.assertEqual(job.processed_players, 1)
+        self.assertEqual(job.mismatched_players, 1)
+        self.assertEqual(job.updated_players, 0)
+        self.assertEqual(process_rating_recalculation_jobs(), (0, 0))
+
+    def test_admin_recalculate_rejects_non_integer_player_id(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(reverse('rating-recalculate'), {"player_id": "abc"}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(RatingRecalculationJob.objects.exists())
+
+    def test_worker_reclaims_stale_running_job(self):
+        stale = timezone.now() - timedelta(hours=1)
+        job = RatingRecalculationJob.objects.create(
+            status=RatingRecalculationJob.STATUS_RUNNING, started_at=stale, heartbeat_at=stale
+        )
+        fresh = RatingRecalculationJob.objects.create(
+            status=RatingRecalculationJob.STATUS_RUNNING, started_at=timezone.now(), heartbeat_at=timezone.now()
+        )
+
+        self.assertEqual(process_rating_recalculation_jobs(limit=5), (1, 0))
+        job.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual(job.status, RatingRecalculationJob.STATUS_COMPLETED)
+        self.assertEqual(job.updated_players, 1)
+        self.assertEqual(fresh.status, RatingRecalculationJob.STATUS_RUNNING)
+
+
+class PlayerRatingRollupTest(TestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name="Test Club", city="Test City")
+        self.player = Player.objects.create(name="Test Player", position="FW", club=self.club, nationality="PL")
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.other_user = User.objects.create_user(username="testuser2", password="testpass")
+
+    def rollups(self):
+        return {
+            (row.granularity, row.ratings_sum, row.ratings_count)
+            for row in PlayerRatingRollup.objects.filter(player=self.player)
+        }
+
+    def test_rollups_follow_inserts_changes_and_deletes(self):
+        rating = Rating.objects.create(player=self.player, user=self.user, value=5)
+        Rating.objects.create(player=self.player, user=self.other_user, value=9)
+        self.assertEqual(self.rollups(), {("hour", 14, 2), ("day", 14, 2)})
+
+        rating.value = 3
+        rating.save()
+        rating.delete()
+        self.assertEqual(self.rollups(), {("hour", 9, 1), ("day", 9, 1)})
+
+    def test_backfill_command_rebuilds_rollups(self):
+        Rating.objects.create(player=self.player, user=self.user, value=5)
+        PlayerRatingRollup.objects.all().delete()
+
+        call_command("backfill_rating_rollups", stdout=StringIO())
+        self.assertEqual(self.rollups(), {("hour", 5, 1), ("day", 5, 1)})
+
+    def test_totals_for_bounds_off_the_hour_add_raw_edge_votes(self):
+        from players.rating_aggregates import rollup_rating_totals
+
+        third_user = User.objects.create_user(username="testuser3", password="testpass")
+        day = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+        # Głosy o 9:10, 10:40 i 12:20 UTC.
+        votes = ((self.user, 4, 9 + 1 / 6), (self.other_user, 6, 10 + 2 / 3), (third_user, 8, 12 + 1 / 3))
+        for user, value, hours in votes:
+            rating = Rating.objects.create(player=self.player, user=user, value=value)
+            Rating.objects.filter(pk=rating.pk).update(created_at=day + timedelta(hours=hours))
+        call_command("backfill_rating_rollups", stdout=StringIO())
+
+        def totals(start_hour, end_hour):
+            return rollup_rating_totals(day + timedelta(hours=start_hour), day + timedelta(hours=end_hour))
+
+        self.assertEqual(totals(9.5, 12.5), {self.player.id: (14, 2)})
+        self.assertEqual(totals(10.25, 10.75), {self.player.id: (6, 1)})
+        self.assertEqual(totals(0, 24), {self.player.id: (18, 3)})
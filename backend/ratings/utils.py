@@ -1,63 +1,220 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
 from django.utils import timezone
-from django.db.models import Avg, Count
+from django.db import transaction
+from django.db.models import Count, Q, Sum
 
-def check_rating_throttle(user):
-    """
-    Sprawdza czy użytkownik może dodać nową ocenę (nie częściej niż raz na minutę).
-    Zwraca (może_oceniać, wiadomość_o_błędzie)
-    """
-    from ratings.models import Rating
-    
-    last_rating = Rating.objects.filter(
-        user=user
-    ).order_by('-created_at').first()
-    
-    if last_rating and timezone.now() - last_rating.created_at < timezone.timedelta(minutes=1):
-        return False, "Możesz oceniać tylko raz na minutę"
-    
-    return True, None
+from core.response_cache import PLAYER, PLAYERS, bump_versions, entity_keys
+
+logger = logging.getLogger(__name__)
+
+RECALCULATION_BATCH_SIZE = 500
+MAX_REPORTED_MISMATCHES = 200
 
-def recalculate_player_ratings(player_id=None):
+
+def _grouped_rating_totals(queryset, player_ids):
+    rows = (
+        queryset.filter(player_id__in=player_ids)
+        .values("player_id")
+        .annotate(total=Sum("value"), count=Count("id"))
+        .order_by()
+    )
+    return {row["player_id"]: (row["total"] or 0, row["count"] or 0) for row in rows}
+
+
+def _grouped_rating_histograms(querysets, player_ids):
+    from players.rating_aggregates import RATING_SCALE, empty_rating_histogram
+
+    histograms = {}
+    for queryset in querysets:
+        rows = (
+            queryset.filter(player_id__in=player_ids)
+            .values_list("player_id", "value")
+            .annotate(count=Count("id"))
+            .order_by()
+        )
+        for row_player_id, value, count in rows:
+            histogram = histograms.setdefault(row_player_id, empty_rating_histogram())
+            histogram[RATING_SCALE.index(value)] += count
+    return histograms
+
+
+def recalculate_player_ratings(player_id=None, check_only=False, batch_size=RECALCULATION_BATCH_SIZE, progress=None):
     """
-    Przeliczyć średnie ocen dla wszystkich piłkarzy lub wybranego piłkarza.
-    Użyteczne przy migracji danych lub naprawianiu niespójności.
+    Przelicza sumy, liczby, średnie i histogramy ocen piłkarzy z obu źródeł (Rating i FixtureRating).
+    Piłkarze są przetwarzani paczkami: każda paczka w osobnej transakcji blokuje swoje wiersze
+    (select_for_update), liczy agregaty zgrupowanymi zapytaniami i zapisuje przez bulk_update.
+    Głos oddany w trakcie czeka na blokadę, więc jego przyrost F() nie zostanie nadpisany.
+    check_only=True tylko raportuje rozbieżności, nic nie blokuje i nie zapisuje.
+    progress(processed, total) jest wołane po każdej paczce.
+    Zwraca słownik z podsumowaniem.
     """
+    from matches.models import FixtureRating
+    from players.leaderboard import update_leaderboard
     from players.models import Player
+    from players.rating_aggregates import compose_average_rating, empty_rating_histogram
     from ratings.models import Rating
-    
+
+    player_ids = Player.objects.order_by("id").values_list("id", flat=True)
     if player_id:
-        players = Player.objects.filter(id=player_id)
+        player_ids = player_ids.filter(id=player_id)
+    player_ids = list(player_ids)
+    total_players = len(player_ids)
+
+    fields = list(Player.RATING_AGGREGATE_FIELDS)
+    processed = 0
+    updated = 0
+    mismatches = []
+    mismatched_count = 0
+
+    def recalculate_chunk(chunk):
+        nonlocal mismatched_count
+        players = Player.objects.only("id", "name", *fields).filter(id__in=chunk).order_by("id")
+        if not check_only:
+            players = players.select_for_update(of=("self",))
+        players = list(players)
+
+        classic_totals = _grouped_rating_totals(Rating.objects.all(), chunk)
+        fixture_totals = _grouped_rating_totals(FixtureRating.objects.all(), chunk)
+        histograms = _grouped_rating_histograms([Rating.objects.all(), FixtureRating.objects.all()], chunk)
+
+        pending = []
+        for player in players:
+            classic_sum, classic_count = classic_totals.get(player.id, (0, 0))
+            fixture_sum, fixture_count = fixture_totals.get(player.id, (0, 0))
+            total_count = classic_count + fixture_count
+            expected = {
+                "classic_ratings_sum": classic_sum,
+                "classic_ratings_count": classic_count,
+                "fixture_ratings_sum": fixture_sum,
+                "fixture_ratings_count": fixture_count,
+                "total_ratings": total_count,
+                "average_rating": compose_average_rating(classic_sum + fixture_sum, total_count),
+                "rating_histogram": histograms.get(player.id) or empty_rating_histogram(),
+            }
+            drift = {
+                field: {"stored": getattr(player, field), "expected": value}
+                for field, value in expected.items()
+                if getattr(player, field) != value
+            }
+            if drift:
+                mismatched_count += 1
+                if len(mismatches) < MAX_REPORTED_MISMATCHES:
+                    mismatches.append({"player_id": player.id, "player_name": player.name, "fields": drift})
+                for field, value in expected.items():
+                    setattr(player, field, value)
+                pending.append(player)
+
+        if pending and not check_only:
+            Player.objects.bulk_update(pending, fields, batch_size=batch_size)
+            update_leaderboard(player.pk for player in pending)
+            bump_versions(PLAYERS, *entity_keys(PLAYER, (player.pk for player in pending)))
+        return len(players), 0 if check_only else len(pending)
+
+    if progress:
+        progress(processed, total_players)
+
+    for start in range(0, total_players, batch_size):
+        chunk = player_ids[start:start + batch_size]
+        with transaction.atomic():
+            chunk_processed, chunk_updated = recalculate_chunk(chunk)
+        processed += chunk_processed
+        updated += chunk_updated
+        if progress:
+            progress(processed, total_players)
+
+    return {
+        "total_players": total_players,
+        "processed_players": processed,
+        "mismatched_players": mismatched_count,
+        "updated_players": updated,
+        "mismatches": mismatches,
+    }
+
+
+def claim_rating_recalculation_job():
+    """
+    Oznacza najstarsze oczekujące zadanie jako uruchomione przez tego workera i je zwraca.
+    Zadanie "running", którego worker nie raportował postępu dłużej niż
+    RATING_RECALCULATION_JOB_TIMEOUT_SECONDS, uznajemy za porzucone i przejmujemy.
+    """
+    from ratings.models import RatingRecalculationJob
+
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.RATING_RECALCULATION_JOB_TIMEOUT_SECONDS)
+    with transaction.atomic():
+        job = (
+            RatingRecalculationJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=RatingRecalculationJob.STATUS_PENDING)
+                | Q(status=RatingRecalculationJob.STATUS_RUNNING, heartbeat_at__lt=stale)
+            )
+            .order_by("created_at", "id")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = RatingRecalculationJob.STATUS_RUNNING
+        job.started_at = now
+        job.heartbeat_at = now
+        job.save(update_fields=["status", "started_at", "heartbeat_at"])
+    return job
+
+
+def run_rating_recalculation_job(job_id):
+    """
+    Wykonuje zlecone przeliczenie ocen i zapisuje postęp w RatingRecalculationJob.
+    """
+    from ratings.models import RatingRecalculationJob
+
+    jobs = RatingRecalculationJob.objects.filter(pk=job_id)
+    job = jobs.first()
+    if job is None:
+        return
+
+    now = timezone.now()
+    jobs.update(status=RatingRecalculationJob.STATUS_RUNNING, started_at=job.started_at or now, heartbeat_at=now)
+
+    def report_progress(processed, total):
+        jobs.update(processed_players=processed, total_players=total, heartbeat_at=timezone.now())
+
+    try:
+        result = recalculate_player_ratings(
+            player_id=job.player_id,
+            check_only=job.check_only,
+            progress=report_progress,
+        )
+    except Exception as exc:
+        jobs.update(
+            status=RatingRecalculationJob.STATUS_FAILED,
+            error=str(exc),
+            finished_at=timezone.now(),
+        )
+        raise
     else:
-        players = Player.objects.all()
-    
-    for player in players:
-        # Pobieramy agregaty bezpośrednio z bazy danych
-        rating_data = Rating.objects.filter(player=player).aggregate(
-            avg_rating=Avg('value'),
-            count=Count('id')
+        jobs.update(
+            status=RatingRecalculationJob.STATUS_COMPLETED,
+            finished_at=timezone.now(),
+            **result,
         )
-        
-        avg_rating = rating_data['avg_rating'] or 0
-        # Zaokrąglamy średnią do dwóch miejsc po przecinku
-        player.average_rating = round(avg_rating, 2)
-        player.total_ratings = rating_data['count'] or 0
-        player.save(update_fields=['average_rating', 'total_ratings'])
-        
-    return True
-
-def check_comment_throttle(user):
-    """
-    Sprawdza czy użytkownik może dodać nowy komentarz (nie częściej niż raz na minutę).
-    Zwraca (możesz_komentować, wiadomość_o_błędzie)
-    """
-    from django.utils import timezone
-    from comments.models import Comment
-    
-    last_comment = Comment.objects.filter(
-        user=user
-    ).order_by('-created_at').first()
-    
-    if last_comment and timezone.now() - last_comment.created_at < timezone.timedelta(minutes=1):
-        return False, "Możesz komentować tylko raz na minutę"
-    
-    return True, None
+
+
+def process_rating_recalculation_jobs(limit=1):
+    """
+    Przebieg workera: pobiera i wykonuje do ``limit`` zadań. Zwraca (completed, failed).
+    """
+    completed = failed = 0
+    for _ in range(limit):
+        job = claim_rating_recalculation_job()
+        if job is None:
+            break
+        try:
+            run_rating_recalculation_job(job.pk)
+        except Exception:
+            logger.exception("Rating recalculation job %s failed", job.pk)
+            failed += 1
+        else:
+            completed += 1
+    return completed, failed
@@ -1,13 +1,13 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.utils import timezone
 from core.permissions import IsOwnerOrStaff
-from .models import Rating
-from .serializers import RatingSerializer
+from .models import Rating, RatingRecalculationJob
+from .serializers import RatingRecalculationJobSerializer, RatingSerializer
 from players.models import Player
-from .utils import check_rating_throttle, recalculate_player_ratings
+from core.ratelimit import check_rate_limit, rate_limited_response, with_rate_limit_headers
 
 class RatingViewSet(viewsets.ModelViewSet):
     queryset = Rating.objects.all()
@@ -23,7 +23,7 @@ class RatingViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
     def get_queryset(self):
-        queryset = super().get_queryset().exclude(player__club__name="Loan")
+        queryset = super().get_queryset().filter(player__is_public=True)
         player_id = self.request.query_params.get('player', None)
         
         if player_id:
@@ -37,21 +37,12 @@ class RatingViewSet(viewsets.ModelViewSet):
         return queryset
     
     def create(self, request, *args, **kwargs):
-        # Sprawdź czy użytkownik może dodać nową ocenę używając funkcji pomocniczej
-        can_rate, error_message = check_rating_throttle(request.user)
-        if not can_rate:
-            return Response(
-                {"detail": error_message},
-                status=status.HTTP_429_TOO_MANY_REQUESTS,
-                headers={"X-Error-Type": "throttled"}
-            )
-        
         # Block Loan players (they can exist in DB, but must not be visible/rateable publicly).
         player_id = request.data.get("player")
         if player_id:
             try:
-                player = Player.objects.select_related("club").get(pk=player_id)
-                if player.club and player.club.name == "Loan":
+                player = Player.objects.only("is_public").get(pk=player_id)
+                if not player.is_public:
                     return Response(
                         {"detail": "Nie można oceniać zawodników z klubu Loan."},
                         status=status.HTTP_400_BAD_REQUEST,
@@ -61,21 +52,53 @@ class RatingViewSet(viewsets.ModelViewSet):
 
         # Zawsze tworzymy nową ocenę, gdy użytkownik ocenia piłkarza
         serializer = self.get_serializer(data=request.data)
-            
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Limit sprawdzamy dopiero dla poprawnej oceny (limit w cache, bez zapytania do bazy)
+        rate_limit = check_rate_limit(request, "player_rating")
+        if not rate_limit.allowed:
+            return rate_limited_response(rate_limit)
+
+        serializer.save()
+        return with_rate_limit_headers(Response(serializer.data, status=status.HTTP_201_CREATED), rate_limit)
     
     @action(detail=False, methods=['post'], permission_classes=[permissions.IsAdminUser])
     def recalculate(self, request):
         """
         Endpoint dla administratorów do przeliczenia średnich ocen dla wszystkich lub wybranego piłkarza.
+        Zadanie wykonuje worker (manage.py process_rating_recalculations); odpowiedź zawiera zadanie,
+        którego postęp można śledzić pod recalculate/<job_id>/. Parametr check_only=true tylko raportuje rozbieżności.
         """
         player_id = request.data.get('player_id', None)
-        recalculate_player_ratings(player_id)
-        
-        return Response({
-            "status": "success",
-            "message": f"Rating recalculation {'for player ' + str(player_id) if player_id else 'for all players'} completed."
-        }, status=status.HTTP_200_OK)
+        player = None
+        if player_id:
+            try:
+                player_id = int(player_id)
+            except (TypeError, ValueError):
+                return Response({"detail": "player_id musi być liczbą całkowitą."}, status=status.HTTP_400_BAD_REQUEST)
+            player = Player.objects.filter(pk=player_id).first()
+            if player is None:
+                return Response({"detail": "Nie znaleziono zawodnika."}, status=status.HTTP_404_NOT_FOUND)
+
+        check_only = str(request.data.get('check_only', '')).lower() in {'1', 'true', 'yes'}
+        job = RatingRecalculationJob.objects.create(
+            player=player,
+            check_only=check_only,
+            requested_by=request.user,
+        )
+
+        return Response(RatingRecalculationJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[permissions.IsAdminUser],
+        url_path=r'recalculate/(?P<job_id>[0-9]+)',
+    )
+    def recalculate_status(self, request, job_id=None):
+        """
+        Zwraca stan i postęp zadania przeliczania ocen.
+        """
+        job = get_object_or_404(RatingRecalculationJob, pk=job_id)
+        return Response(RatingRecalculationJobSerializer(job).data)
@@ -5,7 +5,7 @@ import Link from 'next/link';
 import Button from '@/app/components/common/Button';
 import { useAuth } from '@/app/hooks/useAuth';
 import { deleteFixtureRating, submitFixtureRating } from '@/app/services/matches-service';
-import { MatchFixtureDetail, MatchLineupPlayer } from '@/app/types/match';
+import { MatchFixtureDetail, MatchLineupPlayer, MatchRatingResponse } from '@/app/types/match';
 
 type MatchRatingBoardProps = {
   fixture: MatchFixtureDetail;
@@ -532,10 +532,12 @@ export default function MatchRatingBoard({ fixture }: MatchRatingBoardProps) {
 
   const selectedRating = selectedPlayer ? ratings[selectedPlayer.player.id] ?? DEFAULT_RATING : DEFAULT_RATING;
 
-  const applyPlayerUpdate = (side: Side, updatedPlayer: MatchLineupPlayer) => {
+  const applyPlayerUpdate = (side: Side, updatedPlayer: NonNullable<MatchRatingResponse['player_summary']>) => {
     setLineup((current) => ({
       ...current,
-      [side]: (current[side] ?? []).map((player) => (player.id === updatedPlayer.id ? updatedPlayer : player)),
+      [side]: (current[side] ?? []).map((player) =>
+        player.id === updatedPlayer.id ? { ...player, ...updatedPlayer } : player
+      ),
     }));
   };
 
@@ -14,14 +14,20 @@ export const metadata: Metadata = {
 
 async function getPlayers(clubId?: string) {
   const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
-  const url = clubId
-    ? `${API_BASE_URL}/api/players/?club=${clubId}`
-    : `${API_BASE_URL}/api/players/`;
-  const res = await fetch(url, { cache: 'no-store' });
-  const data = await res.json();
-  if (Array.isArray(data)) return data;
-  if (Array.isArray(data.results)) return data.results;
-  return [];
+  let url: string | null = clubId
+    ? `${API_BASE_URL}/api/players/?club=${clubId}&page_size=200`
+    : `${API_BASE_URL}/api/players/?page_size=200`;
+  const players = [];
+  // Lista jest stronicowana - pobieramy kolejne strony (next) aż do końca.
+  while (url) {
+    const res = await fetch(url, { cache: 'no-store' });
+    const data = await res.json();
+    if (Array.isArray(data)) return data;
+    if (!Array.isArray(data.results)) break;
+    players.push(...data.results);
+    url = data.next;
+  }
+  return players;
 }
 
 async function getClubs() {
@@ -77,7 +77,7 @@ export async function submitFixtureRating(
   value: number,
   token?: string
 ): Promise<MatchRatingResponse> {
-  const res = await fetch(`${getApiBaseUrl()}/api/matches/fixtures/${slug}/ratings/`, {
+  const res = await fetch(`${getApiBaseUrl()}/api/matches/fixtures/${slug}/ratings/?response=delta`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
@@ -111,7 +111,7 @@ export async function deleteFixtureRating(
   fixturePlayerId: number,
   token?: string
 ): Promise<MatchRatingResponse> {
-  const res = await fetch(`${getApiBaseUrl()}/api/matches/fixtures/${slug}/ratings/`, {
+  const res = await fetch(`${getApiBaseUrl()}/api/matches/fixtures/${slug}/ratings/?response=delta`, {
     method: 'DELETE',
     headers: {
       'Content-Type': 'application/json',
@@ -13,6 +13,7 @@ export interface Comment {
   likes_count: number;
   is_liked_by_user: boolean;
   ai_response?: string;
+  ai_response_status?: 'pending' | 'running' | 'completed' | 'failed' | null;
   created_at: string;
   updated_at: string;
 }
@@ -11,6 +11,8 @@ export interface MatchLineupPlayer {
   captain: boolean;
   rating_avg?: number;
   ratings_count?: number;
+  rating_histogram?: number[];
+  rating_median?: number | null;
 }
 
 export interface MatchFixture {
@@ -64,7 +66,7 @@ export interface MatchRatingResponse {
   fixture_player_id: number;
   value?: number | null;
   deleted?: boolean;
-  player_summary: MatchLineupPlayer | null;
+  player_summary: (Partial<MatchLineupPlayer> & Pick<MatchLineupPlayer, 'id'>) | null;
   fixture_ratings_count: number;
   home_rating_avg: number;
   away_rating_avg: number;
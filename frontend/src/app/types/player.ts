@@ -17,6 +17,14 @@ export interface Player {
   average_rating: number;
   rating_avg?: number; // Dla kompatybilności ze starym kodem
   total_ratings: number;
+  rating_histogram?: number[]; // Liczba głosów dla ocen 1..10
+  rating_median?: number | null;
+  // Pozycje w rankingu: ogólnym, wśród zawodników na tej pozycji i w klubie (null = brak ocen)
+  ranking?: {
+    overall: number;
+    position: number;
+    club: number | null;
+  } | null;
   recent_ratings: number;
   user_rating: {
     id: number;